@@ -7,12 +7,18 @@ Created on Thu Jun 17 15:20:13 2021
 @Author: Didier Paillard. Adapted by Olivier Marti
 """
 
-import copy
-import time
 from typing import Any, Self, Type
 import numpy as np
 import xarray as xr
 
+from options_base import Options
+from options_base import Tracer
+from options_base import profile_reset
+from options_base import profile_stats
+from options_base import profile_report
+from options_base import profile_events
+from options_base import profile_export
+
 ## Astronomical parameters
 ECC     =   0.0167024   # Excentricity 0kBP (1950 CE)
 OBL     =  23.4393      # Obliquity 0kBP (degrees)
@@ -38,9 +44,10 @@ NITER = 7
 PREC  = 1.0E-7
 
 # daily inso internal options
-DEFAULT_OPTIONS = { 'Debug':False, 'Trace':False, 'Timing':False, 't0':None, 'Depth':0, 'Stack':[] }
+DEFAULT_OPTIONS = { 'Debug':False, 'Trace':False, 'Timing':False, 'TimingMemory':False, 't0':None, 'Depth':0, 'Stack':[] }
 
-OPTIONS: dict[str, Any] = copy.deepcopy(DEFAULT_OPTIONS)
+## Call stack, depth and timers are context-local, see options_base.Options
+OPTIONS: Options = Options (DEFAULT_OPTIONS, __name__)
 
 class set_options :
     '''
@@ -100,54 +107,15 @@ def return_stack() -> list[str]|str|int|bool|None:
     '''
     return OPTIONS['Stack']
 
-def push_stack (string:str) -> None :
-    '''Push a string on the stack of function calls for libIGCM
-    See Also :
-    ----------
-    set_options, get_options, reset_options, return_stack, pop_stack
-    '''
-    OPTIONS['Depth'] += 1
-    if OPTIONS['Trace'] :
-        print ( '  '*(OPTIONS['Depth']-1), f'-->{__name__}.{string}' )
-    #
-    OPTIONS['Stack'].append (string)
-    #
-    if OPTIONS['Timing'] :
-        if OPTIONS['t0'] :
-            OPTIONS['t0'].append (time.time())
-        else :
-            OPTIONS['t0'] = [time.time(),]
-
-def pop_stack (string:str) -> None :
-    '''
-    Pop a string from the stack of function calls for libIGCM
-    See Also :
-    ----------
-    set_options, get_options, reset_options, return_stack, push_stack
-    '''
-    if OPTIONS['Timing'] :
-        dt = time.time() - OPTIONS['t0'][-1]
-        OPTIONS['t0'].pop()
-    else :
-        dt = None
-    if OPTIONS['Trace'] or dt :
-        if dt :
-            if dt < 1e-3 :
-                print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1e6:5.1f} micro s')
-            else :
-                if dt < 1 :
-                    print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1e3:5.1f} milli s')
-                else :
-                    print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1:5.1f} second')
-        else :
-            print ( '  '*(OPTIONS['Depth']-1), f'<--{__name__}.{string}')
-    #
-    OPTIONS['Depth'] -= 1
-    OPTIONS['Stack'].pop ()
-    #
+## ============================================================================
+## Call stack and tracing decorator : options_base.Tracer. Timing goes to
+## the profiler of options_base (profile_report, profile_export, ...),
+## shared by all modules, so that call paths form a single call tree.
+_TRACER = Tracer (OPTIONS, __name__)
+push_stack      = _TRACER.push_stack
+pop_stack       = _TRACER.pop_stack
+traced          = _TRACER.traced
+trace_benchmark = _TRACER.benchmark
 
 # Astronomical functions
 def daily_inso_longitude (lat:float|xr.DataArray, lon:float|xr.DataArray,
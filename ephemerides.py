@@ -29,14 +29,20 @@ personal.
 
 '''
 
-import time
-import copy
 from typing import Self, Any
 
 import numpy as np
 import xarray as xr
 import cftime
 
+from options_base import Options
+from options_base import Tracer
+from options_base import profile_reset
+from options_base import profile_stats
+from options_base import profile_report
+from options_base import profile_events
+from options_base import profile_export
+
 deg2rad = np.deg2rad (1.0)
 rad2deg = np.rad2deg (1.0)
 
@@ -87,14 +93,16 @@ SliceTS = { 'JAN':slice(0,None,12), 'FEB':slice( 1,None,12), 'MAR':slice( 2,None
 SOLAR = 1365.0          # Solar constant (W/m^2)
 
 # Ephemerides internal options
-DEFAULT_OPTIONS = { "Debug"  : False,
-                    "Trace"  : False,
-                    "Timing" : False,
-                    "t0"     : [],
-                    "Depth"  : 0,
-                    "Stack"  : []}
+DEFAULT_OPTIONS = { "Debug"        : False,
+                    "Trace"        : False,
+                    "Timing"       : False,
+                    "TimingMemory" : False,
+                    "t0"           : [],
+                    "Depth"        : 0,
+                    "Stack"        : []}
 
-OPTIONS: dict[str, Any] = copy.deepcopy(DEFAULT_OPTIONS)
+## Call stack, depth and timers are context-local, see options_base.Options
+OPTIONS: Options = Options (DEFAULT_OPTIONS, __name__)
 
 class set_options : # pylint: disable=too-few-public-methods
     '''
@@ -148,52 +156,20 @@ def return_stack() -> list[str]|str|int|bool|None:
     '''
     return OPTIONS['Stack']
 
-def push_stack (string:str) -> None :
-    '''
-    Push a function label on the internal stack and optionally trace/timestamp it.
-    '''
-    OPTIONS['Depth'] += 1
-    if OPTIONS['Trace'] :
-        print ( '  '*(OPTIONS['Depth']-1), f'-->{__name__}.{string}' )
-    #
-    OPTIONS['Stack'].append (string)
-    #
-    if OPTIONS['Timing'] :
-        if OPTIONS['t0'] :
-            OPTIONS['t0'].append (time.time())
-        else :
-            OPTIONS['t0'] = [time.time(),]
+## ============================================================================
+## Call stack and tracing decorator : options_base.Tracer. Timing goes to
+## the profiler of options_base (profile_report, profile_export, ...),
+## shared by all modules, so that call paths form a single call tree.
+_TRACER = Tracer (OPTIONS, __name__)
+push_stack      = _TRACER.push_stack
+pop_stack       = _TRACER.pop_stack
+traced          = _TRACER.traced
+trace_benchmark = _TRACER.benchmark
 
-def pop_stack (string:str) -> None :
-    '''
-    Pop a function label from the internal stack and optionally report elapsed time.
-    '''
-    if OPTIONS['Timing'] :
-        dt = time.time() - OPTIONS['t0'][-1]
-        OPTIONS['t0'].pop()
-    else :
-        dt = None
-    if OPTIONS['Trace'] or dt :
-        if dt :
-            if dt < 1e-3 :
-                print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1e6:5.1f} micro s')
-            else :
-                if dt < 1 :
-                    print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1e3:5.1f} milli s')
-                else :
-                    print ( '  '*(OPTIONS['Depth']-1), \
-                        f'<--{__name__}.{string} : time: {dt*1:5.1f} second')
-        else :
-            print ( '  '*(OPTIONS['Depth']-1), f'<--{__name__}.{string}')
-    #
-    OPTIONS['Depth'] -= 1
-    OPTIONS['Stack'].pop ()
-    #
 
 
 ## ============================================================================
+@traced
 def time2float (time_coord, unit:str='year',
                 year0:int=0, month0:int=1, day0:int=0, hour0:int=0,
                 Debug:bool=False) :
@@ -205,7 +181,6 @@ def time2float (time_coord, unit:str='year',
 
     Approximate calculation for plots
     '''
-    push_stack ( f'time2float (time, {unit=}, {year0=}, {month0=}, {day0=}, {hour0=})' )
 
     ldebug = OPTIONS['Debug'] or Debug
 
@@ -269,9 +244,9 @@ def time2float (time_coord, unit:str='year',
             result.attrs.update (
                 {'unit':'Year' , 'Comment':f'Year after {year0:04d}-{month0:02d}-{day0:02d}'})
 
-    pop_stack ( 'time2float' )
     return result.astype(np.float64)
 
+@traced
 def time2BP (time_coord, unit:str='year',
              year0:int=7999, month0:int=7, day0:int=0, hour0:int=0, Debug:bool=False) :
     '''
@@ -282,7 +257,6 @@ def time2BP (time_coord, unit:str='year',
 
     Approximate calculation for plots
     '''
-    push_stack ( f'time2BP (time_coord, {unit=}, {year0=}, {month0=}, {day0=}, {hour0=})' )
     ldebug = OPTIONS['Debug'] or Debug
 
     if ldebug :
@@ -347,7 +321,6 @@ def time2BP (time_coord, unit:str='year',
             result.attrs.update (
                 {'unit':'Year BP' , 'Comment':f'Year before {year0:04d}-{month0:02d}-{day0:02d}'})
 
-    pop_stack ('time2BP')
     return result
 
 def time_BP (var, time_name:str='time_counter', unit:str='year',
@@ -371,15 +344,15 @@ def time_f (var, time_name:str='time_counter') :
     ztimef = xr.DataArray (ztimef, dims=('Year'), coords=(ztimef,), attrs={'units':'Model Year'})
     return ztimef
 
+@traced
 def mthday2day (month, day) :
     '''
     From month and day, compute day of year
     '''
-    push_stack ( 'mthday2day (month, day)' )
     days = np.sum ( mth_length[:np.mod (month-1, 12)] ) + day
-    pop_stack ( 'mthday2day' )
     return days
 
+@traced
 def declinaison (day) :
     '''
     Computes declinaison of the Sun (deg)
@@ -387,7 +360,6 @@ def declinaison (day) :
     Input :
     day : number of the day of the year. May be > 366
     '''
-    push_stack ( 'declinaison (day)' )
     zm = np.mod (357.0 + DAY2DEG*day, 360)
     zc= 1.914 * np.sin (np.deg2rad(zm)) + 0.02 * np.sin (2.0 * deg2rad*zm)
     zl = np.mod (280.0 + zc + DAY2DEG*day , 360)
@@ -398,9 +370,9 @@ def declinaison (day) :
             {'units':'degrees_north', 'standard_name':'declinaison',
               'long_name':'Sun declinaison',} )
 
-    pop_stack (zdeclinaison)
     return zdeclinaison
 
+@traced
 def equation_temps (day) :
     '''
     Computes equation of time (minutes)
@@ -409,7 +381,6 @@ def equation_temps (day) :
     Input :
     day : number of the day of the year. Maybe > 366
     '''
-    push_stack ( 'equation_temps (day)' )
     zm = np.mod (357.0 + DAY2DEG*day, 360.)
     zc = 1.914 * np.sin (deg2rad*zm) + 0.02 * np.sin (2.0 * deg2rad*zm)
     zl = np.mod (280.0 + zc + DAY2DEG*day, 360.)
@@ -422,9 +393,9 @@ def equation_temps (day) :
               'long_name':'Equation du temps',
               'comment':'Time between 12:00 GMT and '+\
               'the passage of the Sun at the Greenwich meridian'} )
-    push_stack ( 'equation_temps' )
     return zequation_temps
 
+@traced
 def equation_temps_smooth (day) :
     '''
     Computes equation of time (minutes)
@@ -435,7 +406,6 @@ def equation_temps_smooth (day) :
 
     This version takes a real version of day 1.0 is day 1, 0h, 1.5 is day 1, 12h, etc ....
     '''
-    push_stack ( 'equation_temps (day)' )
     zm = np.mod (357.0 + DAY2DEG*(day-0.5), 360.)
     zc = 1.914 * np.sin (deg2rad*zm) + 0.02 * np.sin (2.0 * deg2rad*zm)
     zl = np.mod (280.0 + zc + DAY2DEG*day, 360.)
@@ -448,9 +418,9 @@ def equation_temps_smooth (day) :
               'long_name':'Equation du temps',
              'comment':'Time between 12:00 GMT and ' +\
              'the passage of the Sun at the Greenwich meridian'} )
-    push_stack ( 'equation_temps' )
     return zequation_temps
 
+@traced
 def H0 (day, lat) :
     '''
     Computes H0 : maximum height of the Sun above horizon
@@ -460,7 +430,6 @@ def H0 (day, lat) :
     day : number of the day of the year. May be > 366
     lat ; latitude in degrees
     '''
-    push_stack ( 'H0(day, lat)' )
     dec = declinaison (day)
     arg = (-0.01454 - np.sin (deg2rad*dec) * np.sin (deg2rad*lat)) \
           / (np.cos (deg2rad*dec) * np.cos (deg2rad*lat) )
@@ -471,20 +440,19 @@ def H0 (day, lat) :
              'comment':'maximum height of the Sun above horizon '+\
              'for a given day (passage at the local meridian)'})
 
-    pop_stack ('H0')
     return zH0
 
+@traced
 def argH0 (day, lat) :
     '''
     Return the argument used in the sunrise/sunset hour-angle computation.
     '''
-    push_stack ( 'argH0(day, lat)' )
     dec = declinaison (day)
     arg = (-0.01454 - np.sin (deg2rad*dec) * np.sin (deg2rad*lat)) \
           / (np.cos (deg2rad*dec) * np.cos (deg2rad*lat) )
-    pop_stack ('argH0')
     return arg
 
+@traced
 def hour_angle (Hour) :
     '''
     omega : hour angle, second equatorial coordinate of the Sun,
@@ -501,14 +469,13 @@ def hour_angle (Hour) :
 
     hour_angle is computed in degrees
     '''
-    push_stack ( 'hour_angle(Hour)' )
     omega = 180.0 * (1 - Hour/12.)
     if isinstance (omega, xr.DataArray) :
         omega.attrs.update ( {'units':'degrees_east', 'long_name':'angle horaire'} )
 
-    pop_stack ( 'hour_angle')
     return omega
 
+@traced
 def sun_height (delta, lat, omega) :
     '''
     Height of the sun above the horizon
@@ -517,7 +484,6 @@ def sun_height (delta, lat, omega) :
       lambda : latitude
       omega  : hour angle
     '''
-    push_stack ('sun_height (delta, lat, omega)')
     sin_h = np.sin(deg2rad*delta)*np.sin(deg2rad*lat) \
           + np.cos(deg2rad*delta)*np.cos(deg2rad*lat)*np.cos(deg2rad*omega)
     zsun_height = rad2deg * np.arcsin(sin_h)
@@ -525,9 +491,9 @@ def sun_height (delta, lat, omega) :
     if isinstance (zsun_height, xr.DataArray) :
         zsun_height.attrs.update ( {'units':'degrees', 'long_name':'sun_height',
                                     'comment':'Sun height above horizon'} )
-    pop_stack ( 'sun_height' )
     return sun_height
 
+@traced
 def insol (delta, lat, omega) :
     '''
     Solar radiation
@@ -536,7 +502,6 @@ def insol (delta, lat, omega) :
       lambda : latitude
       omega  : hour angle
     '''
-    push_stack ( 'insol (delta, lat, omega)')
     sin_h = np.sin(deg2rad*delta)*np.sin(deg2rad*lat) \
           + np.cos(deg2rad*delta)*np.cos(deg2rad*lat)*np.cos(deg2rad*omega)
 
@@ -544,9 +509,9 @@ def insol (delta, lat, omega) :
     if isinstance (zinsol, xr.DataArray) :
         zinsol.attrs.update ( {'units':'W m^-2', 'standard_name':'tops',
                                'comment':'Insolation at top of atm'} )
-    pop_stack ('insol')
     return insol
 
+@traced
 def SunRiseGMT (day, lat, lon) :
     '''
     Hour of the Sun rise : in fraction of GMT hour
@@ -556,7 +521,6 @@ def SunRiseGMT (day, lat, lon) :
     lat ; latitude in degrees
     lon : longitude in degrees
     '''
-    push_stack ( 'SunRiseGMT (day, lat, lon) ')
     h0 = H0 (day, lat)
     eq = equation_temps (day)
     h1 = 12. - h0/15. + eq/60. - lon/15.
@@ -564,9 +528,9 @@ def SunRiseGMT (day, lat, lon) :
     if isinstance (day, xr.DataArray) :
         SunRise.attrs.update ( {'units':'hours',
                                 'comment':'Hour of the Sun rise in fraction of GMT hour'})
-    pop_stack ( 'SunRiseGMT' )
     return SunRise
 
+@traced
 def SunSetGMT (day, lat, lon) :
     '''
     Hour of the Sun set : in fraction of GMT hour
@@ -576,7 +540,6 @@ def SunSetGMT (day, lat, lon) :
     lat ; latitude in degrees
     lon : longitude in degrees
     '''
-    push_stack ('SunSetGMT (day, lat, lon)')
     h0 = H0 (day, lat)
     eq = equation_temps (day)
     h1 = 12. + h0/15. + eq/60. - lon/15.
@@ -584,9 +547,9 @@ def SunSetGMT (day, lat, lon) :
     if isinstance (day, xr.DataArray) :
         SunSet.attrs.update ( {'units':'hours',
                                'comment':'Hour of the Sun set in fraction of GMT hour'})
-    pop_stack ( 'SunSetGMT' )
     return SunSet
 
+@traced
 def DayLength (day, lat) :
     '''
     Hour of the Sun rise : in fraction of GMT hour
@@ -596,7 +559,6 @@ def DayLength (day, lat) :
     lat ; latitude in degrees
     lon : longitude in degrees
     '''
-    push_stack ( 'DayLength (day, lat)' )
     h0  = H0    (day, lat)
     arg = argH0 (day, lat)
     h0  = xr.where ( arg < -1.,  180., h0)
@@ -629,9 +591,9 @@ def DayLength (day, lat) :
         zDayLength.attrs.update ( {'units':'hours',
                                    'comment':'Length of the day, from sun rise to sun set'})
 
-    pop_stack ( 'DayLength' )
     return zDayLength
 
+@traced
 def SunRiseLocal (day, lat) :
     '''
     Hour of the Sun rise : in fraction of local hour
@@ -640,11 +602,10 @@ def SunRiseLocal (day, lat) :
     day : number of the day of the year. May be > 366
     lat ; latitude in degrees
     '''
-    push_stack ( 'SunRiseLocal (day, lat)')
     zval =  SunRiseGMT (day, lat, lon=0)
-    pop_stack ( 'SunRiseLocal' )
     return zval
 
+@traced
 def SunSetLocal (day, lat) :
     '''
     Hour of the Sun set : in fraction of local hour
@@ -653,11 +614,10 @@ def SunSetLocal (day, lat) :
     day : number of the day of the year. May be > 366
     lat ; latitude in degrees
     '''
-    push_stack ( 'SunSetLocal (day, lat)' )
     zval =  SunSetGMT (day, lat, lon=0)
-    pop_stack ( 'SunSetLocal' )
     return zval
 
+@traced
 def date2day (pdate, t0=np.datetime64 ('1955-01-01T00:00:00')) :
     '''
     Gives day from a date in np.datetime64 format : integer
@@ -666,7 +626,6 @@ def date2day (pdate, t0=np.datetime64 ('1955-01-01T00:00:00')) :
     pdate : date in np.datetime64, or string
     t0    : reference date in np.datetime64 01-JAN of any year, time 00:00
     '''
-    push_stack ( f'date2day (pdate, {t0=})' )
 
     if isinstance (t0, str) :
         zdate = np.datetime64 (pdate)
@@ -678,9 +637,9 @@ def date2day (pdate, t0=np.datetime64 ('1955-01-01T00:00:00')) :
 
     if isinstance (pdate, xr.DataArray) :
         day.attrs.update ( {'units':'days'} )
-    pop_stack ( 'date2day' )
     return day
 
+@traced
 def date2daydec (pdate, t0=np.datetime64 ('1955-01-01T00:00:00'), _out_int:bool=True) :
     '''
     Gives day from a date in np.datetime64 format : day and  fraction of day
@@ -689,16 +648,15 @@ def date2daydec (pdate, t0=np.datetime64 ('1955-01-01T00:00:00'), _out_int:bool=
     pdate : date in np.datetime64
     t0    : reference date in np.datetime64 01-JAN of any year, time 00:00
     '''
-    push_stack ( f'date2day (pdate, {t0=})' )
 
     ts = (pdate - t0) / np.timedelta64 (1, 'D')
     day = ts%365 + 1
 
     if isinstance (pdate, xr.DataArray) :
         day.attrs.update ( {'units':'days'} )
-    pop_stack ( 'date2day' )
     return day
 
+@traced
 def date2hour (pdate, t0=np.datetime64 ('1955-01-01T00:00:00')) :
     '''
     Gives hour from a date in np.datetime64, format : integer
@@ -707,14 +665,13 @@ def date2hour (pdate, t0=np.datetime64 ('1955-01-01T00:00:00')) :
     pdate : date in np.datetime64
     t0    : reference date in np.datetime64 01-JAN of any year, time 00:00
     '''
-    push_stack ( f'date2hour (pdate, {t0=})' )
     ts   = (pdate - t0) / np.timedelta64 (1, 'h')
     hour = np.floor (ts%24)
     if isinstance (pdate, xr.DataArray) :
         hour.attrs.update ( {'units':'hours' } )
-    pop_stack ('date2hour')
     return hour
 
+@traced
 def date2hourdec (pdate:np.datetime64|xr.DataArray,
                   t0:np.datetime64|xr.DataArray, Debug:bool=False) -> xr.DataArray :
     '''
@@ -724,7 +681,6 @@ def date2hourdec (pdate:np.datetime64|xr.DataArray,
 
     t0    : reference date in np.datetime64 01-JAN of any year, time 00:00
     '''
-    push_stack ( f'date2hourdec (pdate, {t0=})' )
     if OPTIONS['Debug'] or Debug :
         print ( f'{pdate=} {t0=}')
     if isinstance (pdate, xr.DataArray) :
@@ -740,17 +696,16 @@ def date2hourdec (pdate:np.datetime64|xr.DataArray,
     if OPTIONS['Debug'] or Debug :
         print ( f'{ts=}')
 
-    pop_stack ( 'date2hourdec' )
     if OPTIONS['Debug'] or Debug :
         print ( f'{ts=} {hourdec=} {pdate=}')
     return hourdec
 
+@traced
 def pseudo_local_time (ptime, lat=0, lon=0, t0=np.datetime64 ('1955-01-01T00:00:00'), Debug=False) :
     '''
     Converts time to local Roman time
     Stretch & compress local time to have 6h=SunRise/18h=SunSet
     '''
-    push_stack ( f'pseudo_local_time (ptime, {lat=}, {lon=}, {t0=})' )
     day       = date2day     (ptime, t0)
     hourGMT   = date2hourdec (ptime, t0)
     hour      = np.mod (hourGMT + lon/15.0, 24.0)
@@ -792,5 +747,4 @@ implementation and diagnostics in IPSL-CM6-SW-VLR. Geosci. Model Dev.,
             {'units':'hours', 'comment':'pseudo local time, roman definition',
             'reference':tref} )
 
-    pop_stack ( 'pseudo_local_time' )
     return zpseudo_local_time
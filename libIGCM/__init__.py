@@ -33,6 +33,12 @@ from libIGCM.options import reset_options
 from libIGCM.options import push_stack
 from libIGCM.options import pop_stack
 from libIGCM.options import return_stack
+from libIGCM.options import traced
+from libIGCM.options import profile_reset
+from libIGCM.options import profile_stats
+from libIGCM.options import profile_report
+from libIGCM.options import profile_events
+from libIGCM.options import profile_export
 
 from libIGCM import options
 from libIGCM import date
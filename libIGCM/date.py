@@ -38,12 +38,11 @@ personal.
 '''
 
 import copy
-from typing import Literal, Tuple
+from typing import Literal, Tuple, Any
 import numpy as np
 
 from libIGCM.options import OPTIONS
-from libIGCM.options import push_stack
-from libIGCM.options import pop_stack
+from libIGCM.options import traced
 
 
 # Characteristics of the gregorian calender
@@ -85,15 +84,121 @@ DA_name = [ 'DA', 'DAYS'  , 'Days'  , 'days'  , 'DAY'  , 'Day'  , 'day'  ,
 # function IGCM_date_DaysInPreviousPeriod
 
 ## ==========================================================================
+## Ordinal day engine
+##   Dates are converted to a number of days since 0001-01-01 (day 0), and back,
+##   with closed formulae : no loop over days or months.
 
+# Day of year of the first day of each month (and length of the year)
+mth_cumul365 = np.concatenate ( ([0], np.cumsum (mth_length365)) )
+mth_cumul366 = np.concatenate ( ([0], np.cumsum (mth_length366)) )
+mth_cumul360 = np.concatenate ( ([0], np.cumsum (mth_length360)) )
+
+# Number of days in 400, 100, 4 gregorian years
+DAYS_400Y = 146097
+DAYS_100Y = 36524
+DAYS_4Y   = 1461
+
+def CalendarKind (Calendar:CALENDAR_TYPE|None=None) -> str :
+    '''
+    Returns the kind of a calendar : '360d', 'noleap', 'allleap' or 'gregorian'
+    '''
+    if not Calendar :
+        Calendar=OPTIONS['DefaultCalendar'] # type: ignore
+    if Calendar in Calendar_360d      :
+        return '360d'
+    if Calendar in Calendar_noleap    :
+        return 'noleap'
+    if Calendar in Calendar_allleap   :
+        return 'allleap'
+    if Calendar in Calendar_gregorian :
+        return 'gregorian'
+    raise ValueError ( f"Unknown value for {Calendar=}")
+
+def _is_leap_gregorian (ye:np.ndarray|int) -> np.ndarray|bool :
+    '''Gregorian leap years, works on arrays'''
+    return (np.mod (ye, 4) == 0) & ( (np.mod (ye, 100) != 0) | (np.mod (ye, 400) == 0) )
+
+def _days_from_ymd (ye:np.ndarray|int, mo:np.ndarray|int, da:np.ndarray|int,
+                    kind:str) -> np.ndarray|int :
+    '''
+    Number of days since 0001-01-01, works on arrays. kind is given by CalendarKind
+    '''
+    ye, mo, da = np.asarray (ye, dtype=np.int64), np.asarray (mo, dtype=np.int64), np.asarray (da, dtype=np.int64)
+    zy = ye - 1
+    if kind == '360d'    :
+        ndays = zy*360 + mth_cumul360[mo-1] + da - 1
+    elif kind == 'noleap'  :
+        ndays = zy*365 + mth_cumul365[mo-1] + da - 1
+    elif kind == 'allleap' :
+        ndays = zy*366 + mth_cumul366[mo-1] + da - 1
+    elif kind == 'gregorian' :
+        ndays = ( zy*365 + zy//4 - zy//100 + zy//400
+                  + np.where (_is_leap_gregorian (ye), mth_cumul366[mo-1], mth_cumul365[mo-1])
+                  + da - 1 )
+    else :
+        raise ValueError ( f"Unknown calendar {kind=}")
+    return ndays
+
+def _ymd_from_days (ndays:np.ndarray|int, kind:str) -> Tuple[np.ndarray, np.ndarray, np.ndarray] :
+    '''
+    Year, month, day from a number of days since 0001-01-01, works on arrays.
+    kind is given by CalendarKind
+    '''
+    ndays = np.asarray (ndays, dtype=np.int64)
+    if kind == '360d' :
+        ye, doy = ndays//360 + 1, np.mod (ndays, 360)
+        leap    = np.zeros_like (ye, dtype=bool)
+    elif kind == 'noleap' :
+        ye, doy = ndays//365 + 1, np.mod (ndays, 365)
+        leap    = np.zeros_like (ye, dtype=bool)
+    elif kind == 'allleap' :
+        ye, doy = ndays//366 + 1, np.mod (ndays, 366)
+        leap    = np.ones_like (ye, dtype=bool)
+    elif kind == 'gregorian' :
+        n400, zr = ndays//DAYS_400Y, np.mod (ndays, DAYS_400Y)
+        n100     = np.minimum (zr//DAYS_100Y, 3)
+        zr       = zr - n100*DAYS_100Y
+        n4, zr   = zr//DAYS_4Y, np.mod (zr, DAYS_4Y)
+        n1       = np.minimum (zr//365, 3)
+        doy      = zr - n1*365
+        ye       = 400*n400 + 100*n100 + 4*n4 + n1 + 1
+        leap     = _is_leap_gregorian (ye)
+    else :
+        raise ValueError ( f"Unknown calendar {kind=}")
+
+    if kind == '360d' :
+        mo = doy//30 + 1
+        da = np.mod (doy, 30) + 1
+    else :
+        mo = np.where (leap, np.searchsorted (mth_cumul366, doy, side='right'),
+                             np.searchsorted (mth_cumul365, doy, side='right'))
+        da = doy - np.where (leap, mth_cumul366[mo-1], mth_cumul365[mo-1]) + 1
+    return ye, mo, da
+
+def DateToDays (date:str|int, Calendar:CALENDAR_TYPE|None=None) -> int :
+    '''
+    Number of days between 0001-01-01 and a date in format [yy]yymmdd or [yy]yy-mm-dd
+    '''
+    ye, mo, da = GetYearMonthDay (date)
+    return int (_days_from_ymd (ye, max (mo, 1), max (da, 1), CalendarKind (Calendar)))
+
+def DaysToDate (ndays:int, Calendar:CALENDAR_TYPE|None=None, pformat:str='Gregorian') -> str :
+    '''
+    Date at ndays after 0001-01-01, in format 'Gregorian' (yyyymmdd) or 'Human' (yyyy-mm-dd)
+    '''
+    ye, mo, da = _ymd_from_days (ndays, CalendarKind (Calendar))
+    return PrintDate (int (ye), int (mo), int (da), pformat)
+
+## ==========================================================================
+
+@traced
 def GetMonthsLengths (year:int, Calendar:CALENDAR_TYPE|None=None,
                       Debug:bool=False) -> np.ndarray :
     '''
     Returns the month lengths for a given year and calendar type
     '''
-    push_stack ( f'GetMonthsLengths ( {year=}, {Calendar=} )' )
 
-    if Calendar is not None :
+    if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
     if OPTIONS['Debug'] or Debug :
@@ -115,9 +220,9 @@ def GetMonthsLengths (year:int, Calendar:CALENDAR_TYPE|None=None,
             zlengths = mth_length365
     else :
         raise ValueError (f"Unknown Calendar = {Calendar}")
-    pop_stack ( f'GetMonthsLengths : {zlengths}' )
     return zlengths
 
+@traced
 def DaysInMonth (yy:int, mm:int|None=None, Calendar:CALENDAR_TYPE|None=None) -> int :
     '''
     Returns the number of days in a month
@@ -125,7 +230,6 @@ def DaysInMonth (yy:int, mm:int|None=None, Calendar:CALENDAR_TYPE|None=None) ->
     Usage:  DaysInMonth ( yyyy    , mm, [Calendar] )
          or DaysInMonth ( yyyymmdd, [Calendar] )
          '''
-    push_stack ( f'DaysInMonth ( {yy=}, {mm=}, {Calendar=} )' )
 
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
@@ -137,72 +241,34 @@ def DaysInMonth (yy:int, mm:int|None=None, Calendar:CALENDAR_TYPE|None=None) ->
 
     length = GetMonthsLengths ( year, Calendar=Calendar)[ np.mod(month-1, 12) ].item()
 
-    pop_stack ( f'DaysInMonth : {length}' )
     return length
 
-def DaysSinceJC (date:str, Calendar:CALENDAR_TYPE|None=None) -> int : # pylint: disable=too-many-branches
+@traced
+def DaysSinceJC (date:str, Calendar:CALENDAR_TYPE|None=None) -> int :
     '''
     Calculate the days difference between a date and 00010101
 
+    Same origin as the previous implementation for years after 500 : the number
+    of days since 0001-01-01, minus the length of a regular year of the calendar
     '''
-    push_stack ( f'DaysSinceJC ( {date=}, {Calendar=} )' )
 
-    if not Calendar :
-        Calendar=OPTIONS['DefaultCalendar'] # type: ignore
+    kind = CalendarKind (Calendar)
 
     yy, _, _ = GetYearMonthDay (date)
-
-    ## Computation is splitted in three case for the sake of speed
-    if yy :
-        if yy < 500 :
-            date0 = '0101-01-01'
-            if   Calendar in Calendar_360d      :
-                aux = -360
-            elif Calendar in Calendar_noleap    :
-                aux = -365
-            elif Calendar in Calendar_allleap   :
-                aux = -366
-            elif Calendar in Calendar_gregorian :
-                aux = -366
-            else :
-                raise ValueError ( f"Unknown value for {Calendar=}")
-        elif yy < 1500 :
-            date0 = '1001-01-01'
-            if   Calendar in Calendar_360d      :
-                aux = 359640
-            elif Calendar in Calendar_noleap    :
-                aux = 364635
-            elif Calendar in Calendar_allleap   :
-                aux = 365634
-            elif Calendar in Calendar_gregorian :
-                aux = 364877
-            else :
-                raise ValueError ( f"Unknown value for {Calendar=}")
-        else :
-            date0 = '1901-01-01'
-            if   Calendar in Calendar_360d      :
-                aux = 683640
-            elif Calendar in Calendar_noleap    :
-                aux = 693135
-            elif Calendar in Calendar_allleap   :
-                aux = 695034
-            elif Calendar in Calendar_gregorian :
-                aux = 693595
-            else :
-                raise ValueError ( f"Unknown value for {Calendar=}")
-
-        ndays = DaysBetweenDate (date, date0) + aux
-    else :
+    if not yy :
         raise ValueError (f"Wrong year {yy=}")
-    pop_stack ( f'DaysSinceJC : {ndays}' )
+
+    aux   = {'360d':-360, 'noleap':-365, 'allleap':-366, 'gregorian':-365}[kind]
+    ndays = DateToDays (date, Calendar=Calendar) + aux
+
     return ndays
 
+@traced
 def IsLeapYear (year:int, Calendar:CALENDAR_TYPE|None=None, # pylint: disable=too-many-branches
                 Debug:bool=False) -> bool :
     '''
     True if year is a leap year
     '''
-    push_stack ( f'IsLeapYear ( {year=}, {Calendar=} )' )
 
     yy = int ( year )
     zis_leap_year = False
@@ -232,24 +298,21 @@ def IsLeapYear (year:int, Calendar:CALENDAR_TYPE|None=None, # pylint: disable=to
         # but not evenly divisible by 100
         # unless it is evenly divisible by 400
 
-        # if it is evenly divisible by 400 it must be a leap year
-        if not zis_leap_year and np.mod ( yy, 400 ) == 0 :
+        # if it is evenly divisible by 4 it may be a leap year
+        if np.mod ( yy, 4 ) == 0 :
             zis_leap_year = True
 
         # if it is evenly divisible by 100 it must not be a leap year
-        if not zis_leap_year and np.mod ( yy, 100 ) == 0 :
+        if np.mod ( yy, 100 ) == 0 :
             zis_leap_year = False
 
-        # if it is evenly divisible by 4 it must be a leap year
-        if not zis_leap_year and np.mod ( yy, 4 ) == 0 :
+        # if it is evenly divisible by 400 it must be a leap year
+        if np.mod ( yy, 400 ) == 0 :
             zis_leap_year = True
 
-        if not zis_leap_year :
-            zis_leap_year = False
-
-    pop_stack ( f'IsLeapYear : {zis_leap_year}' )
     return zis_leap_year
 
+@traced
 def DateFormat (date:str, Debug:bool=False) -> str :
     '''
     Get date format. Could be 'Human' or 'Gregorian'
@@ -257,7 +320,6 @@ def DateFormat (date:str, Debug:bool=False) -> str :
       [yy]yymmdd   is Gregorian
       [yy]yy-mm-dd is Human
     '''
-    push_stack ( f'DateFormat ( {date=} )' )
 
     if OPTIONS['Debug'] or Debug :
         print ( f'{type(date)=}' )
@@ -269,14 +331,13 @@ def DateFormat (date:str, Debug:bool=False) -> str :
             zdate_format = 'Gregorian'
     #if isinstance (date, int) : zdate_format = 'Gregorian'
 
-    pop_stack ( f'DateFormat : {zdate_format}' )
     return zdate_format
 
+@traced
 def PrintDate (ye:int, mo:int, da:int, pformat:str) -> str :
     '''
     Return a date in the requested format
     '''
-    push_stack ( f'PrintDate ( {ye=}, {mo=}, {da=}, {pformat=} )' )
 
     zPrintDate = ''
     if pformat == 'Human'     :
@@ -284,32 +345,29 @@ def PrintDate (ye:int, mo:int, da:int, pformat:str) -> str :
     if pformat == 'Gregorian' :
         zPrintDate = f'{ye:04d}{mo:02d}{da:02d}'
 
-    pop_stack ( f'PrintDate : {zPrintDate}' )
     return zPrintDate
 
+@traced
 def ConvertFormatToGregorian (date:str) -> str :
     '''
     From a yyyy-mm-dd or yyymmdd date format returns a yyymmdd date format
     '''
-    push_stack ( f'ConvertFormatToGregorian ( {date=} )' )
     zz = PrintDate (*GetYearMonthDay (date), 'Gregorian' )
-    pop_stack ( f'ConvertFormatToGregorian : {zz}' )
     return zz
 
+@traced
 def ConvertFormatToHuman (date:str) -> str :
     '''
     From a yyyymmdd or yyymmdd date format returns a yyy-mm-dd date format
     '''
-    push_stack ( f'ConvertFormatToHuman ( {date=} )' )
     zz = PrintDate ( *GetYearMonthDay (date), 'Human' )
-    pop_stack ( f'ConvertFormatToHuman : {zz}' )
     return zz
 
+@traced
 def GetYearMonthDay (date:str|int, Debug:bool=False) -> Tuple[int, int, int] :  # pylint: disable=too-many-branches
     '''
     Split Date in format [yy]yymmdd or [yy]yy-mm-dd to yy, mm, dd
     '''
-    push_stack ( f'GetYearMonthDay ( {date=} )' )
 
     if OPTIONS['Debug'] or Debug :
         print ( f'{date=}' )
@@ -347,57 +405,48 @@ def GetYearMonthDay (date:str|int, Debug:bool=False) -> Tuple[int, int, int] :
     if OPTIONS['Debug'] or Debug :
         print ( f'{ye=} {type(ye)=} {mo=} {type(mo)=} {da=} {type(da)}')
 
-    pop_stack ( f'GetYearMonthDay : {ye}, {mo}, {da}' )
     return ye, mo, da
 
+@traced
 def GetYearMonth (date:str) -> Tuple[int, int] :
     '''
     Split Date in format [yy]yymmdd or [yy]yy-mm-dd to yy, mm
     '''
-    push_stack ( f'GetYearMonth ( {date=} )' )
 
     ye, mo, _ = GetYearMonthDay (date)
 
-    pop_stack ( f'GetYearMonth : {ye}, {mo}' )
     return ye, mo
 
+@traced
 def DateAddYear (date:str, year_inc:int=1) -> str :
     '''
     Add year(s) to date in format [yy]yymmdd or [yy]yy-mm-dd
     '''
-    push_stack ( f'DateAddYear ( {date=}, {year_inc=} )' )
     zformat = DateFormat (date)
     ye, mo, da = GetYearMonthDay ( date )
 
     ye_new = ye + year_inc
     zz = PrintDate (ye_new, mo, da, zformat)
 
-    pop_stack ( f'DateAddYear : {zz}' )
     return zz
 
+@traced
 def CorrectYearMonth (ye:int, mo:int) -> tuple[int, int] :
     '''
     Correct month values outside [1,12]
     '''
-    push_stack ( f'CorrectYearMonth ( {ye=}, {mo=} )' )
 
-    mo_new, ye_new = mo, ye
+    zy, zm = divmod (mo - 1, 12)
+    ye_new, mo_new = ye + zy, zm + 1
 
-    while mo_new > 12 :
-        mo_new, ye_new = mo_new - 12, ye_new + 1
-
-    while mo_new < 1 :
-        mo_new, ye_new = mo_new + 12, ye_new - 1
-
-    pop_stack ( 'CorrectYearMonth : {ye_new}, {mo_new}' )
     return ye_new, mo_new
 
+@traced
 def CorrectYearMonthDay (ye:int, mo:int, da:int,
                          Calendar:CALENDAR_TYPE|None=None) -> Tuple[int, int, int] :
     '''
     Correct month values outside [1,12] and day outside month length
     '''
-    push_stack ( f'CorrectYearMonthDay ( {ye=}, {mo=}, {da=}, {Calendar=} )' )
 
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
@@ -419,16 +468,15 @@ def CorrectYearMonthDay (ye:int, mo:int, da:int,
         ye_new, mo_new = CorrectYearMonth ( ye_new, mo_new)
         num_day = DaysInMonth (ye, mo, Calendar)
 
-    pop_stack ( f'CorrectYearMonthDay : {ye_new}, {mo_new}, {da_new}' )
     return ye_new, mo_new, da_new
 
+@traced
 def DateAddMonth (date:str, month_inc:int=1,  # pylint: disable=too-many-locals
                   Calendar:CALENDAR_TYPE|None=None,
                   Debug:bool=False) -> str :
     '''
     Add on year(s) to date in format [yy]yymmdd or [yy]yy-mm-dd
     '''
-    push_stack ( f'DateAddMonth ( {date=}, {month_inc=}, {Calendar=} )' )
 
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
@@ -443,18 +491,11 @@ def DateAddMonth (date:str, month_inc:int=1,  # pylint: disable=too-many-locals
         else :
             raise AttributeError ( f'Parameter {month_inc=} is not a month period' )
 
-    if month_inc < 0 :
-        ye_inc = -( -month_inc // 12)
-    else             :
-        ye_inc = month_inc // 12
-
-    ye_new = ye + ye_inc
-    mo_new = mo + month_inc # - ye_inc*12
-    ye_new, mo_new = CorrectYearMonth (ye_new, mo_new)
+    ye_new, mo_new = CorrectYearMonth (ye, mo + month_inc)
     lday1 = DaysInMonth ( ye    , mo    , Calendar=Calendar )
     lday2 = DaysInMonth ( ye_new, mo_new, Calendar=Calendar )
     if OPTIONS['Debug'] or Debug :
-        print ( f'{ye=} {mo=} {da=} {ye_inc=} {month_inc=} {ye_new=} {mo_new=} {lday1=} {lday2=}' )
+        print ( f'{ye=} {mo=} {da=} {month_inc=} {ye_new=} {mo_new=} {lday1=} {lday2=}' )
     da_new = da
     if da == lday1 :
         da_new = lday2
@@ -463,14 +504,13 @@ def DateAddMonth (date:str, month_inc:int=1,  # pylint: disable=too-many-locals
     if OPTIONS['Debug'] or Debug :
         print ( f'{ye=} {mo=} {da=} {ye_new=} {mo_new=} {lday1=} {lday2=} {da_new=}' )
 
-    pop_stack ( 'DateAddMonth : {ye_new}, {mo_new, {da_new}, {zformat}' )
     return PrintDate (ye_new, mo_new, da_new, zformat)
 
+@traced
 def DateAddPeriod (date:str, period:str='1YE', Calendar:CALENDAR_TYPE|None=None ) -> str :
     '''
     Add a period to date in format [yy]yymmdd or [yy]yy-mm-dd
     '''
-    push_stack ( f'DateAddPeriod ( {date=}, {period=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
@@ -490,14 +530,13 @@ def DateAddPeriod (date:str, period:str='1YE', Calendar:CALENDAR_TYPE|None=None
     ye, mo, da = GetYearMonthDay (new_date)
     zz = PrintDate (ye, mo, da, zformat)
 
-    pop_stack ( f'DateAddPeriod : {zz}' )
     return zz
 
+@traced
 def SubOneDayToDate (date:str, Calendar:CALENDAR_TYPE|None=None) -> str :
     '''
     Substracts one day to date in format [yy]yymmdd or [yy]yy-mm-dd
     '''
-    push_stack ( f'SubOneDayToDate ( {date=}, {Calendar=} )' )
 
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
@@ -516,14 +555,13 @@ def SubOneDayToDate (date:str, Calendar:CALENDAR_TYPE|None=None) -> str :
         da_new, mo_new, ye_new = da - 1, mo, ye
 
     zz = PrintDate ( ye_new, mo_new, da_new, zformat)
-    pop_stack ( f'SubOneDayToDate : {zz}' )
     return zz
 
+@traced
 def AddOneDayToDate (date:str, Calendar:CALENDAR_TYPE|None=None, Debug:bool=False) -> str :
     '''
     Add one day to date in format [yy]yymmdd or [yy]yy-mm-dd
     '''
-    push_stack ( f'AddOneDayToDate ( {date=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
@@ -542,23 +580,27 @@ def AddOneDayToDate (date:str, Calendar:CALENDAR_TYPE|None=None, Debug:bool=Fals
             ye_new += 1
 
     zz = PrintDate ( ye_new, mo_new, da_new, zformat )
-    pop_stack ( 'AddOneDayToDate : {zz}' )
     return zz
 
+@traced
 def AddDaysToDate (date, day_inc:int=1, Calendar:CALENDAR_TYPE|None=None ) -> str :
     '''
     Add days to date in format [yy]yymmdd or [yy]yy-mm-dd
     Number of days migth be negative
     '''
-    push_stack ( f'AddDaysToDate ( {date=}, {day_inc=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
     zformat = DateFormat (date)
+    zz = DaysToDate (DateToDays (date, Calendar) + int (day_inc), Calendar, zformat)
 
-    # Break it into pieces
-    yy, mm, dd = GetYearMonthDay ( date )
+    return zz
 
+def _AddDaysToDate_loop (date, day_inc:int=1, Calendar:CALENDAR_TYPE|None=None ) -> str :
+    '''
+    Day by day version of AddDaysToDate. Reference for CheckDateEngine
+    '''
+    zformat = DateFormat (date)
     zdate0 = copy.copy(date)
 
     if day_inc > 0 :
@@ -570,17 +612,14 @@ def AddDaysToDate (date, day_inc:int=1, Calendar:CALENDAR_TYPE|None=None ) -> st
             zdate0 = SubOneDayToDate (zdate0, Calendar )
 
     yy, mm, dd = GetYearMonthDay (zdate0)
+    return PrintDate (yy, mm, dd, zformat)
 
-    zz = PrintDate (yy, mm, dd, zformat)
-    pop_stack ( f'AddDaysToDate : {zz}' )
-    return zz
-
+@traced
 def AddPeriodToDate (date:str, period:str, Calendar:CALENDAR_TYPE|None=None ) -> str :
     '''
     Add a period to a date.
     period is specified as '1D', '5YE', '3DA', etc ...
     '''
-    push_stack ( f'AddPeriodToDate ( {date=}, {period=}, {Calendar=} )' )
 
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
@@ -592,14 +631,13 @@ def AddPeriodToDate (date:str, period:str, Calendar:CALENDAR_TYPE|None=None ) ->
         raise RuntimeError (
             f'libIGCM.date.AddPeriodToDate : can not process {date=} {period=} {Calendar=}' )
 
-    pop_stack ( f'AddPeriodToDate : {new_date}' )
     return new_date
 
+@traced
 def DaysInYear (year:int, Calendar:CALENDAR_TYPE|None=None) -> int :
     '''
     Return the number of days in a year
     '''
-    push_stack ( f'DaysInYear ( {year=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
@@ -613,64 +651,68 @@ def DaysInYear (year:int, Calendar:CALENDAR_TYPE|None=None) -> int :
         ndays = 366 if IsLeapYear (year, Calendar) else 365
     else :
         raise ValueError ( f"Unknown value for {Calendar=}")
-    pop_stack ( 'DaysInYear : {ndays}' )
     return ndays
 
+@traced
 def DaysBetweenDate (pdate1, pdate2, Calendar:CALENDAR_TYPE|None=None) -> int :
     '''
     Calculates the days difference between two dates
 
-    This process subtracts pdate2 from pdate1. If pdate2 is larger
-    than pdate1 then reverse the arguments. The calculations are done
-    and then the sign is reversed.
+    Result is positive if pdate1 is after pdate2
     '''
-    push_stack ( f'DaysBetweenDate ( {pdate1=}, {pdate2=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
-    if   int(ConvertFormatToGregorian(pdate1)) < int(ConvertFormatToGregorian(pdate2)) :
+    res = DateToDays (pdate1, Calendar) - DateToDays (pdate2, Calendar)
+
+    # and output the results
+    return res
+
+def _DaysBetweenDate_loop (pdate1, pdate2, Calendar:CALENDAR_TYPE|None=None) -> int :
+    '''
+    Day by day version of DaysBetweenDate. Reference for CheckDateEngine
+
+    This process subtracts pdate2 from pdate1. If pdate2 is larger
+    than pdate1 then reverse the arguments. The calculations are done
+    and then the sign is reversed.
+    '''
+    if int(ConvertFormatToGregorian(pdate1)) < int(ConvertFormatToGregorian(pdate2)) :
         zdate1, zdate2 = pdate2, pdate1
-    elif int(ConvertFormatToGregorian(pdate1)) > int(ConvertFormatToGregorian(pdate2)) :
-        zdate1, zdate2 = pdate1, pdate2
     else :
-        res = 0
         zdate1, zdate2 = pdate1, pdate2
 
     res = 0
-    while int(ConvertFormatToGregorian(zdate1)) < int(ConvertFormatToGregorian(zdate2))  :
-        zdate1 = AddOneDayToDate (zdate1, Calendar)
+    while int(ConvertFormatToGregorian(zdate2)) < int(ConvertFormatToGregorian(zdate1))  :
+        zdate2 = AddOneDayToDate (zdate2, Calendar)
         res += 1
 
     # if argument 2 was larger than argument 1 then
     # the arguments were reversed before calculating
     # adjust by reversing the sign
-    if pdate1 < pdate2 :
+    if int(ConvertFormatToGregorian(pdate1)) < int(ConvertFormatToGregorian(pdate2)) :
         res = -res
 
-    # and output the results
-    pop_stack ( 'DaysBetweenDate : {res}' )
     return res
 
+@traced
 def ConvertGregorianDateToJulian (date:str, Calendar:CALENDAR_TYPE|None=None) -> str :
     '''
     Convert yyyymmdd to yyyyddd
     '''
-    push_stack ( f'ConvertGregorianDateToJulian ( {date=}, {Calendar} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
     ye, mo, da = GetYearMonthDay (date)
-    ndays = DaysBetweenDate (PrintDate (ye,mo,da, 'Human'),
-                             PrintDate (ye, 1, 1, 'Human'), Calendar=Calendar )
+    kind  = CalendarKind (Calendar)
+    ndays = int (_days_from_ymd (ye, mo, da, kind) - _days_from_ymd (ye, 1, 1, kind))
     zz = f'{ye}{ndays+1:03d}'
-    pop_stack ( '--> ConvertGregorianDateToJulian' )
     return zz
 
+@traced
 def ConvertJulianDateToGregorian (date:str, Calendar:CALENDAR_TYPE|None=None) -> str :
     '''
     Convert yyyyddd to yyyymmdd
     '''
-    push_stack ( f'ConvertJulianDateToGregorian ( {date=}, {Calendar} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
@@ -678,13 +720,25 @@ def ConvertJulianDateToGregorian (date:str, Calendar:CALENDAR_TYPE|None=None) ->
     zdate = int (date)
     yy, dd = zdate // 1000, zdate%1000
 
+    kind = CalendarKind (Calendar)
+    zz   = DaysToDate (int (_days_from_ymd (yy, 1, 1, kind)) + dd - 1, Calendar, 'Gregorian')
+
+    return zz
+
+def _ConvertJulianDateToGregorian_loop (date:str, Calendar:CALENDAR_TYPE|None=None) -> str :
+    '''
+    Month by month version of ConvertJulianDateToGregorian. Reference for CheckDateEngine
+    '''
+    # Break apart the year and the days
+    zdate = int (date)
+    yy, dd = zdate // 1000, zdate%1000
+
     # subtract the number of days in each month starting from 1
     # from the days in the date. When the day goes below 1, you
     # have the current month. Add back the number of days in the
     # month to get the correct day of the month
     mm=1
     while dd > 0 :
-        #print ( f'ConvertJulianDateToGregorian {yy=} {mm=} {dd=}' )
         md = DaysInMonth (yy, mm, Calendar=Calendar)
         dd, mm = dd - md, mm + 1
 
@@ -692,16 +746,63 @@ def ConvertJulianDateToGregorian (date:str, Calendar:CALENDAR_TYPE|None=None) ->
     dd, mm = dd + md, mm - 1
 
     # Assemble the results into a gregorian date
-    zz = PrintDate ( yy, mm, dd, 'Gregorian')
+    return PrintDate ( yy, mm, dd, 'Gregorian')
 
-    push_stack ( f'ConvertJulianDateToGregorian : {zz}' )
-    return zz
+def CheckDateEngine (ntest:int=200, max_inc:int=1500, seed:int=0,
+                     Calendars:list|None=None) -> int :
+    '''
+    Property check of the ordinal day engine against the day by day loops
+
+    For ntest random dates and increments in each calendar, checks that
+    AddDaysToDate, DaysBetweenDate and the julian date conversions agree
+    with the loop versions, and that DaysToDate inverts DateToDays.
 
+    Returns the number of mismatches (printed)
+    '''
+    if Calendars is None :
+        Calendars = ['360d', 'noleap', 'all_leap', 'gregorian']
+
+    # yyyymmdd dates with year < 100 are read as shorter formats : years are
+    # drawn far enough above 100 that no increment of max_inc days (at least
+    # 360 days per year) goes below year 100
+    ye_min = 100 + max_inc//360 + 1
+    rng    = np.random.default_rng (seed)
+    nerror = 0
+    for Calendar in Calendars :
+        for _ in range (ntest) :
+            ye  = int (rng.integers (ye_min, 3000))
+            mo  = int (rng.integers (1, 13))
+            da  = int (rng.integers (1, DaysInMonth (ye, mo, Calendar)+1))
+            inc = int (rng.integers (-max_inc, max_inc+1))
+            date  = PrintDate (ye, mo, da, 'Gregorian')
+
+            checks = [
+                ('DaysToDate'  , DaysToDate (DateToDays (date, Calendar), Calendar), date),
+                ('AddDaysToDate', AddDaysToDate (date, inc, Calendar),
+                                  _AddDaysToDate_loop (date, inc, Calendar)), ]
+            date2 = checks[-1][-1]
+            checks.append ( ('DaysBetweenDate', DaysBetweenDate (date2, date, Calendar),
+                                                _DaysBetweenDate_loop (date2, date, Calendar)) )
+            julian = ConvertGregorianDateToJulian (date, Calendar)
+            checks.append ( ('ConvertGregorianDateToJulian', julian,
+                             f'{ye}{_DaysBetweenDate_loop (date, PrintDate (ye, 1, 1, "Gregorian"), Calendar)+1:03d}') )
+            checks.append ( ('ConvertJulianDateToGregorian',
+                             ConvertJulianDateToGregorian (julian, Calendar),
+                             _ConvertJulianDateToGregorian_loop (julian, Calendar)) )
+
+            for name, new, ref in checks :
+                if new != ref :
+                    nerror += 1
+                    print ( f'CheckDateEngine : {Calendar=} {date=} {inc=} {name} : {new=} {ref=}' )
+
+    print ( f'CheckDateEngine : {nerror} mismatch(es)' )
+    return nerror
+
+@traced
 def DaysInCurrentPeriod (startdate:str, period:str, Calendar:CALENDAR_TYPE|None=None) -> int :
     '''
     Give the numbers of days during the period from startdate date
     '''
-    push_stack ( f'DaysInCurrentPeriod ( {startdate=}, {period=}, {Calendar=} )' )
     if not Calendar :
         Calendar=OPTIONS['DefaultCalendar'] # type: ignore
 
@@ -735,15 +836,177 @@ def DaysInCurrentPeriod (startdate:str, period:str, Calendar:CALENDAR_TYPE|None=
              'libIGCM.dateDaysInCurrentPeriod : can not analyze :',\
             f'{startdate=} {period=} {Calendar=}' )
 
-    pop_stack ( 'DaysInCurrentPeriod : {Length}' )
     return Length
 
+## ==========================================================================
+## Array versions
+##   Work on whole time axes at once. Dates are given as numpy arrays of
+##   yyyymmdd integers, yyyy-mm-dd strings, datetime64, or cftime/datetime objects
+##   (xarray DataArray are accepted). Dates are returned as arrays of yyyymmdd integers.
+##   No stack, debug or timing : these functions are meant to be called on large arrays
+
+def _calendar_of_dates (dates:np.ndarray, Calendar:CALENDAR_TYPE|None=None) -> str :
+    '''
+    Kind of calendar (see CalendarKind). If Calendar is not given, use
+    the calendar of cftime dates, or the default calendar
+    '''
+    if not Calendar and dates.dtype == object and dates.size > 0 :
+        zcal = getattr (dates.flat[0], 'calendar', None)
+        if zcal in ['standard', 'proleptic_gregorian'] :
+            zcal = 'gregorian'
+        if zcal :
+            Calendar = zcal
+    return CalendarKind (Calendar)
+
+def GetYearMonthDayArray (dates:Any) -> Tuple[np.ndarray, np.ndarray, np.ndarray] :
+    '''
+    Year, month and day arrays of an array of dates
+    '''
+    zdates = np.asarray (getattr (dates, 'values', dates))
+
+    if np.issubdtype (zdates.dtype, np.datetime64) :
+        zmonth = zdates.astype ('datetime64[M]')
+        ye = zdates.astype ('datetime64[Y]').astype (np.int64) + 1970
+        mo = np.mod (zmonth.astype (np.int64), 12) + 1
+        da = (zdates.astype ('datetime64[D]') - zmonth.astype ('datetime64[D]')).astype (np.int64) + 1
+    elif zdates.dtype == object :
+        ye = np.array ( [ zd.year  for zd in zdates.flat ], dtype=np.int64).reshape (zdates.shape)
+        mo = np.array ( [ zd.month for zd in zdates.flat ], dtype=np.int64).reshape (zdates.shape)
+        da = np.array ( [ zd.day   for zd in zdates.flat ], dtype=np.int64).reshape (zdates.shape)
+    else :
+        if zdates.dtype.kind in 'US' :
+            zdates = np.char.replace (zdates.astype (str), '-', '')
+        zdates = zdates.astype (np.int64)
+        ye, mo, da = zdates//10000, np.mod (zdates//100, 100), np.mod (zdates, 100)
+
+    return ye, mo, da
+
+def YearMonthDayToDateArray (ye:Any, mo:Any, da:Any) -> np.ndarray :
+    '''Arrays of year, month, day to yyyymmdd integers'''
+    return np.asarray (ye, dtype=np.int64)*10000 + np.asarray (mo, dtype=np.int64)*100 \
+        + np.asarray (da, dtype=np.int64)
+
+def IsLeapYearArray (years:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    True for leap years
+    '''
+    kind = CalendarKind (Calendar)
+    zye  = np.asarray (years, dtype=np.int64)
+    if kind == 'gregorian' :
+        return _is_leap_gregorian (zye)
+    return np.full (zye.shape, kind == 'allleap')
+
+def DaysInYearArray (years:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Number of days in each year
+    '''
+    kind = CalendarKind (Calendar)
+    if kind == '360d' :
+        return np.full (np.shape (years), 360, dtype=np.int64)
+    return np.where (IsLeapYearArray (years, Calendar), 366, 365)
+
+def DaysInMonthArray (ye:Any, mo:Any|None=None, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Number of days in each month
+
+    Usage:  DaysInMonthArray ( years, months, [Calendar] )
+         or DaysInMonthArray ( dates, Calendar=Calendar )
+    '''
+    if mo is None :
+        zdates = np.asarray (getattr (ye, 'values', ye))
+        kind   = _calendar_of_dates (zdates, Calendar)
+        ye, mo, _ = GetYearMonthDayArray (zdates)
+    else :
+        kind = CalendarKind (Calendar)
+    zye  = np.asarray (ye, dtype=np.int64)
+    zmo  = np.mod (np.asarray (mo, dtype=np.int64) - 1, 12)
+
+    if kind == '360d' :
+        return mth_length360[zmo]
+    if kind == 'noleap' :
+        return mth_length365[zmo]
+    if kind == 'allleap' :
+        return mth_length366[zmo]
+    return np.where (_is_leap_gregorian (zye), mth_length366[zmo], mth_length365[zmo])
+
+def DateToDaysArray (dates:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Number of days since 0001-01-01 of each date
+    '''
+    zdates = np.asarray (getattr (dates, 'values', dates))
+    kind   = _calendar_of_dates (zdates, Calendar)
+    return _days_from_ymd (*GetYearMonthDayArray (zdates), kind)
+
+def DaysToDateArray (ndays:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Dates (yyyymmdd integers) at ndays after 0001-01-01
+    '''
+    return YearMonthDayToDateArray (*_ymd_from_days (ndays, CalendarKind (Calendar)))
+
+def AddDaysToDateArray (dates:Any, day_inc:Any=1, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Add days to dates. Number of days migth be negative, and may be an array
+    '''
+    zdates = np.asarray (getattr (dates, 'values', dates))
+    kind   = _calendar_of_dates (zdates, Calendar)
+    ndays  = _days_from_ymd (*GetYearMonthDayArray (zdates), kind) + np.asarray (day_inc, dtype=np.int64)
+    return YearMonthDayToDateArray (*_ymd_from_days (ndays, kind))
+
+def DaysBetweenDateArray (dates1:Any, dates2:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Days difference between two arrays of dates. Positive if dates1 are after dates2
+    '''
+    zdates1 = np.asarray (getattr (dates1, 'values', dates1))
+    kind    = _calendar_of_dates (zdates1, Calendar)
+    zdates2 = np.asarray (getattr (dates2, 'values', dates2))
+    return _days_from_ymd (*GetYearMonthDayArray (zdates1), kind) \
+         - _days_from_ymd (*GetYearMonthDayArray (zdates2), kind)
+
+def DateAddMonthArray (dates:Any, month_inc:Any=1, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Add months to dates, with the same rules as DateAddMonth : the last day of
+    a month gives the last day of the new month, and days are limited to the month length
+    '''
+    zdates = np.asarray (getattr (dates, 'values', dates))
+    kind   = _calendar_of_dates (zdates, Calendar)
+    ye, mo, da = GetYearMonthDayArray (zdates)
+
+    zy, zm = np.divmod (mo - 1 + np.asarray (month_inc, dtype=np.int64), 12)
+    ye_new, mo_new = ye + zy, zm + 1
+
+    lday1 = DaysInMonthArray (ye    , mo    , Calendar=kind)
+    lday2 = DaysInMonthArray (ye_new, mo_new, Calendar=kind)
+    da_new = np.where (da == lday1, lday2, np.minimum (da, lday2))
+
+    return YearMonthDayToDateArray (ye_new, mo_new, da_new)
+
+def ConvertGregorianDateToJulianArray (dates:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Convert dates to yyyyddd integers
+    '''
+    zdates = np.asarray (getattr (dates, 'values', dates))
+    kind   = _calendar_of_dates (zdates, Calendar)
+    ye, mo, da = GetYearMonthDayArray (zdates)
+    doy = _days_from_ymd (ye, mo, da, kind) - _days_from_ymd (ye, 1, 1, kind) + 1
+    return ye*1000 + doy
+
+def ConvertJulianDateToGregorianArray (dates:Any, Calendar:CALENDAR_TYPE|None=None) -> np.ndarray :
+    '''
+    Convert yyyyddd integers to yyyymmdd integers
+    '''
+    kind   = CalendarKind (Calendar)
+    zdates = np.asarray (getattr (dates, 'values', dates), dtype=np.int64)
+    ye, doy = zdates//1000, np.mod (zdates, 1000)
+    return YearMonthDayToDateArray (*_ymd_from_days (_days_from_ymd (ye, 1, 1, kind) + doy - 1, kind))
+
+## ==========================================================================
+
+@traced
 def AnaPeriod (period:str) -> tuple[str, int] :
     '''
     Decodes a period definition like '1Y', ''1MO', 'DA', etc ...
     Return period types (string) and period length (integer)
     '''
-    push_stack ( f'AnaPeriod ( {period=} )' )
 
     periodName   = rmDigits  (period)
     periodLength = getDigits (period)
@@ -770,19 +1033,16 @@ def AnaPeriod (period:str) -> tuple[str, int] :
     if Neg :
         PeriodLength = -PeriodLength
 
-    pop_stack ( 'AnaPeriod' )
     return PeriodType, PeriodLength
 
+@traced
 def getDigits (s: str) -> str :
     '''Extract digits in a string'''
-    push_stack ( f'getDigits ( {s=} )' )
     zz = ''.join (i for i in s if i.isdigit())
-    pop_stack ( f'getDigits : {zz}' )
     return zz
 
+@traced
 def rmDigits (s:str) -> str :
     '''Removes digits from a string'''
-    push_stack ( f'rmDigits ( {s=} )' )
     zz =  ''.join (i for i in s if not i.isdigit())
-    pop_stack ( f'rmDigits : {zz}' )
     return zz
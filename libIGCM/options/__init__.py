@@ -19,15 +19,22 @@ data loss, or any other consequences caused directly or indirectly by
 the usage of his software by incorrectly or partially configured
 personal. Be warned that the author himself may not respect the prerequisites.
 '''
-import time
-import copy
 from typing import Self, Any, Optional, Type
 
+from options_base import Options
+from options_base import Tracer
+from options_base import profile_reset
+from options_base import profile_stats
+from options_base import profile_report
+from options_base import profile_events
+from options_base import profile_export
+
 ## ============================================================================
 DEFAULT_OPTIONS ={
     'Debug'               : False,
     'Trace'               : False,
     'Timing'              : None,
+    'TimingMemory'        : False,
     't0'                  : None,
     'Depth'               : 0,
     'Stack'               : [],
@@ -51,7 +58,7 @@ DEFAULT_OPTIONS ={
     'IGCM_Catalog_list'   : [ 'IGCM_Catalog.json', ],
 }
 
-OPTIONS: dict[str, Any] = copy.deepcopy(DEFAULT_OPTIONS)
+OPTIONS: Options = Options (DEFAULT_OPTIONS, __name__)
 
 class set_options : # pylint: disable=invalid-name
     '''
@@ -117,43 +124,8 @@ def return_stack() -> list[str]|str|int|bool|None:
     '''Return the current call stack stored in OPTIONS.'''
     return OPTIONS['Stack']
 
-def push_stack (string:str) -> None :
-    '''Push a function name on the trace stack and start timing if enabled.'''
-    OPTIONS['Depth'] += 1
-    if OPTIONS['Trace'] :
-        print ( '  '*(OPTIONS['Depth']-1), f'-->{__name__}.{string}' )
-    #
-    OPTIONS['Stack'].append (string)
-    #
-    if OPTIONS['Timing'] :
-        if OPTIONS['t0'] :
-            OPTIONS['t0'].append (time.time())
-        else :
-            OPTIONS['t0'] = [time.time(),]
-
-def pop_stack (string:str) -> None :
-    '''Pop a function name from the trace stack and print elapsed time if enabled.'''
-    if OPTIONS['Timing'] :
-        dt = time.time() - OPTIONS['t0'][-1]
-        OPTIONS['t0'].pop()
-    else :
-        dt = None
-    if OPTIONS['Trace'] or dt :
-        if dt :
-            if dt < 1e-3 :
-                print ( '  '*(OPTIONS['Depth']-1),
-                    f'<--{__name__}.{string} : time: {dt*1e6:5.1f} micro s')
-            else :
-                if dt < 1 :
-                    print ( '  '*(OPTIONS['Depth']-1),
-                        f'<--{__name__}.{string} : time: {dt*1e3:5.1f} milli s')
-                else :
-                    print ( '  '*(OPTIONS['Depth']-1),
-                        f'<--{__name__}.{string} : time: {dt*1:5.1f} second')
-        else :
-            print (     '  '*(OPTIONS['Depth']-1),
-                        f'<--{__name__}.{string}')
-    #
-    OPTIONS['Depth'] -= 1
-    OPTIONS['Stack'].pop ()
-    #
+_TRACER = Tracer (OPTIONS, __name__)
+push_stack      = _TRACER.push_stack
+pop_stack       = _TRACER.pop_stack
+traced          = _TRACER.traced
+trace_benchmark = _TRACER.benchmark
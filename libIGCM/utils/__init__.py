@@ -21,10 +21,11 @@ data loss, or any other consequences caused directly or indirectly by
 the usage of his software by incorrectly or partially configured           
 personal. Be warned that the author himself may not respect the prerequisites.                                                               
 '''
-import copy
 import time
 from typing import Any, Self, Literal, Dict, Union, Hashable
 
+from options_base import Options
+
 ## ============================================================================
 DEFAULT_OPTIONS = dict (Debug  = False,
                              Trace  = False,
@@ -49,7 +50,9 @@ DEFAULT_OPTIONS = dict (Debug  = False,
                              IGCM_Catalog_list    = [ 'IGCM_catalog.json', ],
                              Pint                 = False)
 
-OPTIONS = copy.deepcopy (DEFAULT_OPTIONS)
+## Call stack, depth and timers are context-local, see options_base.Options
+OPTIONS: Options = Options (DEFAULT_OPTIONS, __name__)
+_STACK = OPTIONS.vars['Stack']
 
 class set_options :
     '''
@@ -107,21 +110,18 @@ def push_stack (string:str) -> None :
     if OPTIONS['Trace'] :
         print ( '  '*(OPTIONS['Depth']-1), f'-->{__name__}.{string}' )
     #
-    if OPTIONS['Stack'] :
-        OPTIONS['Stack'].append (string) # type: ignore
-    else             :
-        OPTIONS['Stack'] = [string,]
+    _STACK.set ((_STACK.get () or ()) + (string,))
     #
     if OPTIONS['Timing'] :
         if OPTIONS['t0'] :
-            OPTIONS['t0'].append (time.time())
+            OPTIONS['t0'] = OPTIONS['t0'] + [time.time(),]
         else :
             OPTIONS['t0'] = [time.time(),]
 
 def pop_stack (string:str) -> None :
     if OPTIONS['Timing'] :
         dt = time.time() - OPTIONS['t0'][-1]
-        OPTIONS['t0'].pop()
+        OPTIONS['t0'] = OPTIONS['t0'][:-1]
     else :
         dt = None
     if OPTIONS['Trace'] or dt :
@@ -138,9 +138,7 @@ def pop_stack (string:str) -> None :
     OPTIONS['Depth'] -= 1
     if OPTIONS['Depth'] == 0 :
         OPTIONS['Depth'] = None 
-    OPTIONS['Stack'].pop ()
-    if OPTIONS['Stack'] == list () :
-        OPTIONS['Stack'] = None 
+    _STACK.set ((_STACK.get () or ())[:-1] or None)
     #
     
    
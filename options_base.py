@@ -0,0 +1,448 @@
+#!/usr/bin/env python3
+'''
+options_base : options, call stack tracing and profiler shared by
+libIGCM, plotIGCM, ephemerides and DailyInso
+
+Only depends on the standard library, and is not part of a package :
+importing it does not import libIGCM nor plotIGCM.
+
+Author : olivier.marti@lsce.ipsl.fr
+
+Github : https://github.com/oliviermarti/IPSLCM-Utilities
+
+This software is governed by the CeCILL license under French law and
+abiding by the rules of distribution of free software.  You can  use,
+modify and/ or redistribute the software under the terms of the CeCILL
+license as circulated by CEA, CNRS and INRIA at the following URL
+"http://www.cecill.info".
+
+Warning, to install, configure, run, use any of Olivier Marti's
+software or to read the associated documentation you'll need at least
+one (1) brain in a reasonably working order. Lack of this implement
+will void any warranties (either express or implied).
+O. Marti assumes no responsability for errors, omissions,
+data loss, or any other consequences caused directly or indirectly by
+the usage of his software by incorrectly or partially configured
+personal. Be warned that the author himself may not respect the prerequisites.
+'''
+import os
+import json
+import time
+import threading
+import tracemalloc
+import contextvars
+import copy
+import reprlib
+import functools
+from typing import Self, Any, Callable
+
+## ============================================================================
+## Options
+## Call stack, depth and timers are context-local : each thread, asyncio task
+## or contextvars context sees its own values, while the other options are
+## shared. OPTIONS['Stack'], OPTIONS['Depth'] and OPTIONS['t0'] read and write
+## these context variables.
+CONTEXT_OPTIONS = ('Stack', 'Depth', 't0')
+
+def _frozen (value:Any) -> Any :
+    '''Immutable copy of a list, that can be shared between contexts'''
+    return tuple (value) if isinstance (value, list) else value
+
+class Options (dict) :
+    '''
+    Dictionary of options, shared by libIGCM, plotIGCM, ephemerides and DailyInso
+
+    Values of CONTEXT_OPTIONS are kept in context variables (attribute vars),
+    and are not stored in the dictionary : they are found by __missing__.
+    Other options are plain dictionary entries, read at the speed of a dict.
+
+    defaults : default values of the options
+    name     : name of the owner module, used to name the context variables
+    '''
+    def __init__ (self:Self, defaults:dict[str, Any], name:str) -> None :
+        super ().__init__ ( {zkey:zval for zkey, zval in copy.deepcopy (defaults).items ()
+                             if zkey not in CONTEXT_OPTIONS} )
+        self.vars: dict[str, contextvars.ContextVar] = {
+            zkey:contextvars.ContextVar (f'{name}.{zkey}', default=_frozen (defaults.get (zkey)))
+            for zkey in CONTEXT_OPTIONS }
+
+    def __missing__ (self:Self, key:str) -> Any :
+        zvar = self.vars.get (key)
+        if zvar is None :
+            raise KeyError (key)
+        zval = zvar.get ()
+        return list (zval) if isinstance (zval, tuple) else zval
+
+    def __setitem__ (self:Self, key:str, value:Any) -> None :
+        zvar = self.vars.get (key)
+        if zvar is None :
+            dict.__setitem__ (self, key, value)
+        else :
+            zvar.set (_frozen (value))
+
+    def __contains__ (self:Self, key:object) -> bool :
+        return key in self.vars or dict.__contains__ (self, key)
+
+    def get (self:Self, key:str, default:Any=None) -> Any :
+        '''Value of an option, default if not an option'''
+        return self[key] if key in self else default
+
+    def update (self:Self, *args, **kwargs) -> None :
+        '''Update options, context-local ones in the current context'''
+        for key, value in dict (*args, **kwargs).items () :
+            self[key] = value
+
+## ============================================================================
+## Profiler
+##   When OPTIONS['Timing'] is set, push_stack/pop_stack aggregate statistics
+##   per call path : count, total, self, min and max time. With
+##   OPTIONS['TimingMemory'], the peak memory increase of each call is measured
+##   with tracemalloc. OPTIONS['Timing']='profile' collects the statistics
+##   without printing one line per call.
+##   There is a single profiler for libIGCM, plotIGCM, ephemerides and
+##   DailyInso : a call path going through several modules is a single branch
+##   of the call tree, and events carry the name of their module as category.
+
+_PROFILE_STATS:  dict[tuple, list] = {}   # path : [count, total, self, min, max, mem]
+_PROFILE_EVENTS: list[tuple]       = []   # (path, start, duration, module)
+_PROFILE_LOCK = threading.Lock ()
+# Open frames [path, start, children time, mem0, peak, module], local to each thread or task
+_PROFILE_FRAMES: contextvars.ContextVar[tuple] = \
+    contextvars.ContextVar (f'{__name__}.profile_frames', default=())
+PROFILE_MAX_EVENTS = 1000000
+
+PROFILE_SORT_KEYS = ('count', 'total', 'self', 'min', 'max', 'mean', 'mem')
+
+def _short_label (string:str) -> str :
+    '''Function name from a stack label like "name ( args )" or "name : result"'''
+    return string.split ('(')[0].split (' : ')[0].strip ()
+
+def _profile_enter (string:str, module:str, memory:bool=False) -> None :
+    '''Open a profiling frame'''
+    zframes = _PROFILE_FRAMES.get ()
+    if memory :
+        if not tracemalloc.is_tracing () :
+            tracemalloc.start ()
+        zcurrent, zpeak = tracemalloc.get_traced_memory ()
+        if zframes :
+            # Keep parent peak before resetting it for the child
+            zframes[-1][4] = max (zframes[-1][4], zpeak)
+        tracemalloc.reset_peak ()
+    else :
+        zcurrent = None
+    zpath = (zframes[-1][0] if zframes else ()) + (_short_label (string),)
+    _PROFILE_FRAMES.set (zframes + ([zpath, time.perf_counter (), 0.0, zcurrent, 0, module],))
+
+def _profile_exit () -> float :
+    '''Close the current profiling frame, update statistics and return elapsed time'''
+    zend = time.perf_counter ()
+    zframes = _PROFILE_FRAMES.get ()
+    zpath, zstart, zchild, zmem0, zpeak, zmodule = zframes[-1]
+    zframes = zframes[:-1]
+    _PROFILE_FRAMES.set (zframes)
+    dt = zend - zstart
+
+    dmem = 0
+    if zmem0 is not None and tracemalloc.is_tracing () :
+        zpeak = max (zpeak, tracemalloc.get_traced_memory ()[1])
+        dmem  = max (zpeak - zmem0, 0)
+
+    if zframes :
+        zframes[-1][2] += dt
+        zframes[-1][4]  = max (zframes[-1][4], zpeak)
+
+    with _PROFILE_LOCK :
+        zstat = _PROFILE_STATS.get (zpath)
+        if zstat is None :
+            _PROFILE_STATS[zpath] = [1, dt, dt-zchild, dt, dt, dmem]
+        else :
+            zstat[0] += 1
+            zstat[1] += dt
+            zstat[2] += dt - zchild
+            zstat[3]  = min (zstat[3], dt)
+            zstat[4]  = max (zstat[4], dt)
+            zstat[5]  = max (zstat[5], dmem)
+
+        if len (_PROFILE_EVENTS) < PROFILE_MAX_EVENTS :
+            _PROFILE_EVENTS.append ((zpath, zstart, dt, zmodule))
+
+    return dt
+
+def profile_reset () -> None :
+    '''Clear profiling statistics and events, for all modules'''
+    with _PROFILE_LOCK :
+        _PROFILE_STATS.clear ()
+        _PROFILE_EVENTS.clear ()
+    _PROFILE_FRAMES.set (())
+
+def profile_stats () -> dict[str, dict[str, Any]] :
+    '''
+    Profiling statistics per call path
+
+    Returns a dictionary with key the call path ('f1 > f2 > f3') and value a
+    dictionary with count, total, self, min, max and mean time (seconds), and
+    mem (peak memory increase in bytes, if OPTIONS['TimingMemory'])
+    '''
+    zstats = {}
+    with _PROFILE_LOCK :
+        zitems = [ (zpath, list (zstat)) for zpath, zstat in _PROFILE_STATS.items () ]
+    for zpath, (count, total, zself, zmin, zmax, zmem) in zitems :
+        zstats[' > '.join (zpath)] = {
+            'depth':len (zpath), 'name':zpath[-1],
+            'count':count, 'total':total, 'self':zself,
+            'min':zmin, 'max':zmax, 'mean':total/count, 'mem':zmem }
+    return zstats
+
+def profile_report (sort:str='total', limit:int|None=30, tree:bool=False) -> str :
+    '''
+    Print and return a table of the profiling statistics
+
+    sort  : one of PROFILE_SORT_KEYS
+    limit : maximum number of lines. None for all
+    tree  : if True, order by call path (sort and limit are ignored)
+    '''
+    if sort not in PROFILE_SORT_KEYS :
+        raise ValueError (f'{sort=} should be one of {PROFILE_SORT_KEYS}')
+
+    zstats = profile_stats ()
+    if tree :
+        zkeys = sorted (zstats, key=lambda zk : tuple (zk.split (' > ')))
+    else :
+        zkeys = sorted (zstats, key=lambda zk : zstats[zk][sort], reverse=True)
+        if limit :
+            zkeys = zkeys[:limit]
+
+    zlines = [ f"{'count':>9} {'total (s)':>11} {'self (s)':>11} {'mean (ms)':>11} " +
+               f"{'min (ms)':>11} {'max (ms)':>11} {'mem (kB)':>10}  path" ]
+    for zk in zkeys :
+        zs = zstats[zk]
+        zlabel = '  '*(zs['depth']-1) + zs['name'] if tree else zk
+        zlines.append (
+            f"{zs['count']:9d} {zs['total']:11.4f} {zs['self']:11.4f} {zs['mean']*1e3:11.4f} " +
+            f"{zs['min']*1e3:11.4f} {zs['max']*1e3:11.4f} {zs['mem']/1024:10.1f}  {zlabel}" )
+
+    zreport = '\n'.join (zlines)
+    print (zreport)
+    return zreport
+
+def profile_events () -> list[dict[str, Any]] :
+    '''
+    Profiling events in Chrome trace format (complete events, time in micro seconds)
+
+    The category of an event is the module (libIGCM.options, plotIGCM.options,
+    ephemerides, DailyInso) whose push_stack opened it.
+    '''
+    zpid = os.getpid ()
+    with _PROFILE_LOCK :
+        zevents = list (_PROFILE_EVENTS)
+    return [ {'name':zpath[-1], 'cat':zmodule, 'ph':'X', 'pid':zpid, 'tid':0,
+              'ts':zstart*1e6, 'dur':dt*1e6, 'args':{'path':' > '.join (zpath)}}
+             for zpath, zstart, dt, zmodule in zevents ]
+
+def _speedscope (events:list[dict[str, Any]]) -> dict[str, Any] :
+    '''Convert Chrome trace complete events to a speedscope evented profile'''
+    zframes: dict[str, int] = {}
+    zopen:   list[tuple]    = []
+    zout:    list[dict]     = []
+    zlast = 0.0
+
+    def close_until (zt:float|None) -> None :
+        nonlocal zlast
+        while zopen and (zt is None or zopen[-1][1] <= zt) :
+            zframe, zend = zopen.pop ()
+            zlast = max (zlast, zend)
+            zout.append ({'type':'C', 'frame':zframe, 'at':zlast})
+
+    zevents = sorted (events, key=lambda ze : (ze['ts'], -ze['dur']))
+    for ze in zevents :
+        close_until (ze['ts'])
+        zname  = f"{ze['cat']}.{ze['name']}"
+        zframe = zframes.setdefault (zname, len (zframes))
+        zlast  = max (zlast, ze['ts'])
+        zout.append ({'type':'O', 'frame':zframe, 'at':zlast})
+        zopen.append ((zframe, ze['ts'] + ze['dur']))
+    close_until (None)
+
+    zstart = zevents[0]['ts'] if zevents else 0.0
+    return {
+        '$schema':'https://www.speedscope.app/file-format-schema.json',
+        'shared':{'frames':[ {'name':zname} for zname in zframes ]},
+        'profiles':[ {'type':'evented', 'name':__name__, 'unit':'microseconds',
+                      'startValue':zstart, 'endValue':zlast, 'events':zout} ],
+        'exporter':__name__ }
+
+def profile_export (filename:str, fmt:str='chrome', events:list|None=None) -> str :
+    '''
+    Write profiling events to a file
+
+    fmt    : 'chrome' (chrome://tracing, Perfetto) or 'speedscope'
+    events : additional events, e.g. profile_events() of another process
+    '''
+    zevents = profile_events () + (events if events else [])
+    if fmt == 'chrome' :
+        zdata: dict[str, Any] = {'traceEvents':zevents, 'displayTimeUnit':'ms'}
+    elif fmt == 'speedscope' :
+        zdata = _speedscope (zevents)
+    else :
+        raise ValueError (f"{fmt=} should be 'chrome' or 'speedscope'")
+    with open (filename, 'w', encoding='utf-8') as zfile :
+        json.dump (zdata, zfile)
+    return filename
+
+## ============================================================================
+## Call stack and tracing decorator
+##   A Tracer gives push_stack, pop_stack and traced for the OPTIONS of one
+##   module. The traced decorator has the same output as explicit
+##   push_stack/pop_stack calls, but the message is only formatted when
+##   OPTIONS['Trace'] or OPTIONS['Timing'] is set. Otherwise the decorated
+##   function is called directly, with no string built nor stack update.
+
+_TRACE_REPR = reprlib.Repr ()
+_TRACE_REPR.maxstring = 40
+_TRACE_REPR.maxother  = 40
+_TRACE_REPR.maxlist   = 4
+_TRACE_REPR.maxtuple  = 4
+_TRACE_REPR.maxdict   = 4
+
+def _call_string (name:str, args:tuple, kwargs:dict) -> str :
+    '''Short description of a function call, for tracing'''
+    zargs = [ _TRACE_REPR.repr (arg) for arg in args ] \
+          + [ f'{key}={_TRACE_REPR.repr (val)}' for key, val in kwargs.items () ]
+    return f"{name} ( {', '.join (zargs)} )"
+
+class Tracer :
+    '''
+    Call stack of a module : push_stack, pop_stack and the traced decorator
+
+    options     : OPTIONS of the module (an Options instance)
+    name        : module name, printed in traces and used as profiling category
+    trace_stack : if True, traces print the whole stack instead of an
+                  indented function name
+
+    Timing goes to the profiler of this module, shared by all modules.
+    '''
+    def __init__ (self:Self, options:Options, name:str, trace_stack:bool=False) -> None :
+        self.options     = options
+        self.name        = name
+        self.trace_stack = trace_stack
+        self._stack      = options.vars['Stack']
+        self._depth      = options.vars['Depth']
+
+    def push_stack (self:Self, string:str) -> None :
+        '''Push a function name on the trace stack and start timing if enabled.'''
+        zdepth = (self._depth.get () or 0) + 1
+        self._depth.set (zdepth)
+        self._stack.set ((self._stack.get () or ()) + (string,))
+        #
+        zopts = self.options
+        if zopts['Trace'] :
+            if self.trace_stack :
+                print ( f'-->{list (self._stack.get ())}' )
+            else :
+                print ( '  '*(zdepth-1), f'-->{self.name}.{string}' )
+        #
+        if zopts['Timing'] :
+            _profile_enter (string, self.name, zopts['TimingMemory'])
+
+    def pop_stack (self:Self, string:str) -> None :
+        '''Pop a function name from the trace stack and print elapsed time if enabled.'''
+        zopts  = self.options
+        zdepth = self._depth.get () or 1
+        dt = None
+        if zopts['Timing'] and _PROFILE_FRAMES.get () :
+            dt = _profile_exit ()
+            if zopts['Timing'] == 'profile' :
+                dt = None
+        if zopts['Trace'] or dt :
+            if dt :
+                if dt < 1e-3 :
+                    print ( '  '*(zdepth-1),
+                        f'<--{self.name}.{string} : time: {dt*1e6:5.1f} micro s')
+                else :
+                    if dt < 1 :
+                        print ( '  '*(zdepth-1),
+                            f'<--{self.name}.{string} : time: {dt*1e3:5.1f} milli s')
+                    else :
+                        print ( '  '*(zdepth-1),
+                            f'<--{self.name}.{string} : time: {dt*1:5.1f} second')
+            elif self.trace_stack :
+                print ( f'<--{list (self._stack.get ())}' )
+            else :
+                print ( '  '*(zdepth-1), f'<--{self.name}.{string}')
+        #
+        self._depth.set (zdepth - 1)
+        self._stack.set ((self._stack.get () or ())[:-1])
+        #
+
+    def traced (self:Self, func:Callable|None=None, *, name:str|None=None,
+                result:bool=True) -> Callable :
+        '''
+        Decorator to trace and time a function, in place of explicit calls to
+        push_stack and pop_stack
+
+           @traced
+           def myfunc (x, y) : ...
+
+        name   : name in the stack. Default is the function qualified name
+        result : show a short repr of the returned value when leaving the function
+        '''
+        zopts = self.options
+        push, pop = self.push_stack, self.pop_stack
+
+        def decorator (zfunc:Callable) -> Callable :
+            zname = name if name else zfunc.__qualname__
+
+            @functools.wraps (zfunc)
+            def wrapper (*args, **kwargs) :
+                if not (zopts['Trace'] or zopts['Timing']) :
+                    return zfunc (*args, **kwargs)
+                push (_call_string (zname, args, kwargs))
+                zres = None
+                try :
+                    zres = zfunc (*args, **kwargs)
+                    return zres
+                finally :
+                    pop (f'{zname} : {_TRACE_REPR.repr (zres)}' if result else zname)
+            return wrapper
+
+        if func is None :
+            return decorator
+        return decorator (func)
+
+    def benchmark (self:Self, ncall:int=100000) -> dict[str, float] :
+        '''
+        Micro-benchmark of the tracing overhead, with tracing and timing off
+
+        Returns time per call (nanoseconds) of a trivial function : plain,
+        with explicit push_stack/pop_stack, and decorated by traced
+        '''
+        def f_plain (x) :
+            return x
+
+        def f_stack (x) :
+            self.push_stack ( f'f_stack ( {x=} )' )
+            self.pop_stack ( 'f_stack' )
+            return x
+
+        @self.traced
+        def f_traced (x) :
+            return x
+
+        zopts = self.options
+        zold  = zopts['Trace'], zopts['Timing']
+        zopts['Trace'], zopts['Timing'] = False, None
+
+        zarg   = list (range (100))
+        timing = {}
+        for zname, zfunc in [('plain', f_plain), ('push_pop', f_stack), ('traced', f_traced)] :
+            t_start = time.perf_counter ()
+            for _ in range (ncall) :
+                zfunc (zarg)
+            timing[zname] = (time.perf_counter () - t_start) / ncall * 1.0e9
+
+        zopts['Trace'], zopts['Timing'] = zold
+
+        for zname, zdt in timing.items () :
+            print ( f'{zname:10s} : {zdt:8.1f} ns per call' )
+        return timing
+
@@ -29,6 +29,12 @@ from plotIGCM.options import get_options
 from plotIGCM.options import reset_options
 from plotIGCM.options import push_stack
 from plotIGCM.options import pop_stack
+from plotIGCM.options import traced
+from plotIGCM.options import profile_reset
+from plotIGCM.options import profile_stats
+from plotIGCM.options import profile_report
+from plotIGCM.options import profile_events
+from plotIGCM.options import profile_export
 from plotIGCM.utils   import copy_attrs
 
 from plotIGCM import sphere
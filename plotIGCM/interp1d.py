@@ -26,6 +26,8 @@ the usage of his software by incorrectly or partially configured
 personal.
 '''
 
+from typing import Tuple, Literal
+
 import numpy as np
 import xarray as xr
 from plotIGCM.options import OPTIONS
@@ -34,10 +36,17 @@ from plotIGCM.options import pop_stack
 
 #from numba import jit
 
+## Temporary names of the vertical dimensions of the target levels
+LEVEL_DIM     = 'interp1d_level'
+INTERFACE_DIM = 'interp1d_interface'
+
 def interp1d (x:np.ndarray|xr.DataArray, xp:xr.DataArray,
               yp:xr.DataArray,
               zdim:str,
-              name:str|None=None) :
+              name:str|None=None,
+              engine:Literal['vector', 'loop']='vector',
+              method:Literal['linear', 'log', 'conservative']='linear',
+              extrapolate:Literal['nan', 'constant', 'linear']='nan') :
     '''
     One-dimensionnal interpolation of a multi-dimensionnal field
 
@@ -51,14 +60,318 @@ def interp1d (x:np.ndarray|xr.DataArray, xp:xr.DataArray,
        yp   : fields values at these points (temperature, humidity, etc ..)
        zdim : name of the dimension that we want to interpolate
        name : set the name of new dimension
+       engine : 'vector' (default) finds the bracketing levels of all target
+              levels at once, and works on dask arrays chunked along the other
+              dimensions. 'loop' is the original level by level algorithm
+       method, extrapolate : see VerticalWeights. The loop engine only
+              knows method='linear' and extrapolate='nan'
+
+    To interpolate several fields sharing the same xp, build a
+    VerticalWeights object once and apply it to each field.
     '''
-    push_stack ( f'interp1d (x, xp, yp, {zdim=} {name=}')
+    push_stack ( f'interp1d (x, xp, yp, {zdim=} {name=} {engine=} {method=} {extrapolate=}')
 
     if isinstance (x, np.ndarray) :
         x = xr.DataArray (x, coords=(x,), dims=(zdim,))
     if isinstance (x, float) :
         x = xr.DataArray (x, coords=(np.array(x),), dims=(zdim,))
 
+    if engine == 'loop' :
+        if method != 'linear' or extrapolate != 'nan' :
+            raise ValueError ( f'interp1d : {engine=} does not handle {method=} {extrapolate=}' )
+        ou_tab = _interp1d_loop (x, xp, yp, zdim)
+        if name :
+            ou_tab = ou_tab.rename ( {x.dims[0]:name} )
+        ou_tab = ou_tab.squeeze ()
+    elif engine == 'vector' :
+        ou_tab = VerticalWeights (x, xp, zdim, method=method, extrapolate=extrapolate) (yp, name=name)
+    else :
+        raise ValueError ( f'interp1d : unknown {engine=}. Should be vector or loop' )
+
+    pop_stack ( 'interp1d' )
+
+    return ou_tab
+
+class VerticalWeights : # pylint: disable=too-many-instance-attributes
+    '''
+    Vertical interpolation weights from the levels xp to the levels x
+
+    The search of the bracketing levels is done once, and the object can
+    then be applied to all the fields sharing the same xp (ta, hus, ua, va, zg ...)
+
+       weights = VerticalWeights (plev, pres, 'presnivs', method='log')
+       ta_p    = weights (ta)
+       hus_p   = weights (hus)
+
+    Input :
+       x    : levels at wich we want to interpolat
+       xp   : position of the input points (i.e. pressure)
+       zdim : name of the vertical dimension of xp
+       method :
+          'linear'       : linear in xp
+          'log'          : linear in log(xp). xp and x should be positive
+          'conservative' : mean over layers, weighted by the xp thickness (i.e. mass
+                           for pressure). Target layers are bounded by the mid-points
+                           between the x levels, input layers by the mid-points between
+                           the xp levels (and by the first and last levels)
+       extrapolate : below the lowest level of xp
+          'nan'      : no value
+          'constant' : value of the lowest level
+          'linear'   : linear extrapolation from the two lowest levels
+          With the conservative method, 'constant' and 'linear' both average
+          over the part of the target layer inside the column.
+          Above the highest level, linear methods extrapolate linearly, as before.
+    '''
+    def __init__ (self, x:np.ndarray|xr.DataArray, xp:xr.DataArray, zdim:str,
+                  method:Literal['linear', 'log', 'conservative']='linear',
+                  extrapolate:Literal['nan', 'constant', 'linear']='nan') -> None :
+        push_stack ( f'VerticalWeights.__init__ (x, xp, {zdim=}, {method=}, {extrapolate=})' )
+
+        if method not in ['linear', 'log', 'conservative'] :
+            raise ValueError ( f'VerticalWeights : unknown {method=}' )
+        if extrapolate not in ['nan', 'constant', 'linear'] :
+            raise ValueError ( f'VerticalWeights : unknown {extrapolate=}' )
+
+        if isinstance (x, np.ndarray) :
+            x = xr.DataArray (x, coords=(x,), dims=(zdim,))
+
+        self.zdim        = zdim
+        self.method      = method
+        self.extrapolate = extrapolate
+        self.pdim        = x.dims[0]
+        self.levels      = x.coords[self.pdim] if self.pdim in x.coords else None
+
+        if method == 'log' :
+            x, xp = np.log (x), np.log (xp)
+
+        # Determines orientation of x
+        x, xp = _orientation (x, xp, zdim)
+
+        if zdim in xp.dims and xp.chunks is not None :
+            xp = xp.chunk ( {zdim:-1} )
+
+        if method == 'conservative' :
+            xi = xr.DataArray (_interfaces (x.values), dims=(INTERFACE_DIM,))
+            self.idk1, self.idk2, self.w1, self.w2, self.ti, self.dp = xr.apply_ufunc (
+                _conservative_weights, xi, xp, kwargs={'extrapolate':extrapolate},
+                input_core_dims=[[INTERFACE_DIM], [zdim]],
+                output_core_dims=[[INTERFACE_DIM]]*5 + [[zdim]],
+                dask='parallelized', output_dtypes=[np.intp, np.intp] + [np.float64]*4 )
+        else :
+            x_tmp = x.rename ( {self.pdim:LEVEL_DIM} ).drop_vars (LEVEL_DIM, errors='ignore')
+            self.idk1, self.idk2, self.w1, self.w2 = xr.apply_ufunc (
+                _linear_weights, x_tmp, xp, kwargs={'extrapolate':extrapolate},
+                input_core_dims=[[LEVEL_DIM], [zdim]],
+                output_core_dims=[[LEVEL_DIM]]*4,
+                dask='parallelized', output_dtypes=[np.intp, np.intp, np.float64, np.float64] )
+            self.ti, self.dp = None, None
+
+        self.nk_ou = len (x)
+
+        pop_stack ( 'VerticalWeights.__init__' )
+
+    def __call__ (self, yp:xr.DataArray, name:str|None=None) -> xr.DataArray :
+        '''
+        Interpolate yp. yp should have the vertical dimension of xp
+        '''
+        push_stack ( f'VerticalWeights.__call__ (yp, {name=})' )
+
+        if self.zdim in yp.dims and yp.chunks is not None :
+            yp = yp.chunk ( {self.zdim:-1} )
+
+        if self.method == 'conservative' :
+            ou_tab = xr.apply_ufunc (
+                _apply_conservative, yp, self.idk1, self.idk2, self.w1, self.w2, self.ti, self.dp,
+                input_core_dims=[[self.zdim]] + [[INTERFACE_DIM]]*5 + [[self.zdim]],
+                output_core_dims=[[LEVEL_DIM]],
+                dask='parallelized', output_dtypes=[np.float64],
+                dask_gufunc_kwargs={'output_sizes':{LEVEL_DIM:self.nk_ou}} )
+        else :
+            ou_tab = xr.apply_ufunc (
+                _apply_linear, yp, self.idk1, self.idk2, self.w1, self.w2,
+                input_core_dims=[[self.zdim]] + [[LEVEL_DIM]]*4,
+                output_core_dims=[[LEVEL_DIM]],
+                dask='parallelized', output_dtypes=[np.float64] )
+
+        # Same dimensions order as yp, with zdim replaced by the new levels
+        ou_dims = [ LEVEL_DIM if dim == self.zdim else dim for dim in yp.dims ]
+        ou_dims = ou_dims + [ dim for dim in ou_tab.dims if dim not in ou_dims ]
+        ou_tab  = ou_tab.transpose (*ou_dims).rename ( {LEVEL_DIM:self.pdim} )
+        if self.levels is not None :
+            ou_tab = ou_tab.assign_coords ( {self.pdim:self.levels.values} )
+
+        if name :
+            ou_tab = ou_tab.rename ( {self.pdim:name} )
+
+        pop_stack ( 'VerticalWeights.__call__' )
+        return ou_tab.squeeze ()
+
+def _orientation (x:xr.DataArray, xp:xr.DataArray, zdim:str) -> Tuple[xr.DataArray, xr.DataArray] :
+    '''
+    Checks that x is monotonic. If xp increases along zdim, x and xp are
+    reversed in sign : the interpolation is written for levels xp decreasing
+    along zdim (pressure from the ground upward). The target levels x may be
+    in any order
+    '''
+    if len (x) > 1 :
+        dx = np.diff (x.values)
+        if not ( np.all (dx > 0.) or np.all (dx < 0.) ) :
+            raise ValueError ( 'interp1d : Coordinate not monotonic')
+
+    or_up = None
+    if zdim in xp.dims and xp.sizes[zdim] > 1 :
+        zdxp = float ( (xp.isel ({zdim:-1}) - xp.isel ({zdim:0})).mean () )
+        if np.isfinite (zdxp) and zdxp != 0. :
+            or_up = zdxp > 0.
+    if or_up is None and len (x) > 1 :
+        # No usable input levels : same orientation as x
+        or_up = x.values[-1] > x.values[0]
+
+    if or_up :
+        x, xp  = -x, -xp
+
+    return x, xp
+
+def _interfaces (x:np.ndarray) -> np.ndarray :
+    '''
+    Interfaces of the layers centered on the levels x : mid-points, and
+    half a layer beyond the first and last levels
+    '''
+    if len (x) < 2 :
+        raise ValueError ( 'interp1d : conservative method needs at least two target levels' )
+    mid = 0.5 * (x[1:] + x[:-1])
+    return np.concatenate ( ([x[0] + 0.5*(x[0]-x[1])], mid, [x[-1] - 0.5*(x[-2]-x[-1])]) )
+
+def _bracket (x:np.ndarray, xp:np.ndarray) -> Tuple[np.ndarray, np.ndarray] :
+    '''
+    Index of the levels bracketing each target level
+
+    x  : target levels, shape (nk_ou,) or (..., nk_ou)
+    xp : input levels, shape (..., nk), decreasing along the last axis
+
+    idk1 is the first input level below or at x (searchsorted on the
+    decreasing axis), or the last level if x is above the top. idk2 is
+    the level before. Both have shape (..., nk_ou)
+    '''
+    nk     = xp.shape[-1]
+    zshape = np.broadcast_shapes ((*xp.shape[:-1], 1), np.shape (x))
+    if xp.ndim == 1 :
+        # Same input levels everywhere : -xp is increasing
+        count = np.broadcast_to (np.searchsorted (-xp, -np.asarray (x), side='left'), zshape)
+    else :
+        # Column by column searchsorted : input and target levels of each
+        # column are sorted together, targets first on ties. The count of
+        # input levels before a target is its searchsorted index
+        zxp   = np.broadcast_to (xp, (*zshape[:-1], nk)).reshape (-1, nk)
+        zx    = np.broadcast_to (x , zshape).reshape (-1, zshape[-1])
+        zval  = np.concatenate ((-zxp, -zx), axis=-1)
+        zlab  = np.concatenate ((np.ones (zxp.shape, dtype=np.intp),
+                                 np.zeros (zx.shape, dtype=np.intp)), axis=-1)
+        zord  = np.lexsort ((zlab, zval), axis=-1)
+        zlab  = np.take_along_axis (zlab, zord, axis=-1)
+        zlev  = np.cumsum (zlab, axis=-1)
+        ztgt  = zlab == 0
+        count = np.empty (zx.shape, dtype=np.intp)
+        count[np.nonzero (ztgt)[0], zord[ztgt] - nk] = zlev[ztgt]
+        count = count.reshape (zshape)
+    idk1 = np.minimum (count, nk-1)
+    idk2 = np.maximum (idk1-1, 0)
+    return idk1, idk2
+
+def _linear_weights (x:np.ndarray, xp:np.ndarray, extrapolate:str='nan') -> Tuple[np.ndarray, ...] :
+    '''
+    Bracketing levels and weights of linear interpolation : y = w1*y[idk1] + w2*y[idk2]
+    The vertical axis is the last one
+    '''
+    nk         = xp.shape[-1]
+    idk1, idk2 = _bracket (x, xp)
+
+    # At or below the lowest level idk1 == idk2 == 0, which gives nan weights
+    below = idk1 == 0
+    if extrapolate == 'linear' and nk > 1 :
+        idk1 = np.where (below, 1, idk1)
+
+    x1  = np.take_along_axis (xp, idk1, axis=-1)
+    x2  = np.take_along_axis (xp, idk2, axis=-1)
+
+    dx1 = x  - x1
+    dx2 = x2 - x
+
+    with np.errstate (invalid='ignore', divide='ignore') :
+        w1 = dx2 / (dx1 + dx2)
+        w2 = dx1 / (dx1 + dx2)
+
+    if extrapolate == 'constant' or (extrapolate == 'linear' and nk == 1) :
+        w1 = np.where (below, 1., w1)
+        w2 = np.where (below, 0., w2)
+
+    return idk1, idk2, w1, w2
+
+def _apply_linear (yp:np.ndarray, idk1:np.ndarray, idk2:np.ndarray,
+                   w1:np.ndarray, w2:np.ndarray) -> np.ndarray :
+    '''
+    Apply linear weights. The vertical axis is the last one
+    '''
+    y1 = np.take_along_axis (yp, idk1, axis=-1)
+    y2 = np.take_along_axis (yp, idk2, axis=-1)
+    return w1*y1 + w2*y2
+
+def _conservative_weights (xi:np.ndarray, xp:np.ndarray, extrapolate:str='nan') -> Tuple[np.ndarray, ...] :
+    '''
+    Weights of the conservative method
+
+    The integral of y along xp is piecewise linear between input interfaces :
+    it is interpolated linearly on the target interfaces xi
+
+    Returns bracketing input interfaces and weights for each target interface,
+    the target interfaces (clipped to the column if extrapolate is not 'nan')
+    and the thickness of the input layers
+    '''
+    pi = np.concatenate ( (xp[..., :1], 0.5*(xp[..., 1:] + xp[..., :-1]), xp[..., -1:]), axis=-1)
+    dp = pi[..., :-1] - pi[..., 1:]
+    ti = np.broadcast_to (xi, (*pi.shape[:-1], len (xi)))
+
+    if extrapolate != 'nan' :
+        ti = np.clip (ti, pi[..., -1:], pi[..., :1])
+
+    nk         = pi.shape[-1]
+    idk1, _    = _bracket (ti, pi)
+    # An interface exactly on the lowest one should keep a non empty bracket
+    idk1       = np.clip (idk1, 1, nk-1)
+    idk2       = idk1 - 1
+
+    x1  = np.take_along_axis (pi, idk1, axis=-1)
+    x2  = np.take_along_axis (pi, idk2, axis=-1)
+
+    dx1 = ti - x1
+    dx2 = x2 - ti
+
+    with np.errstate (invalid='ignore', divide='ignore') :
+        w1 = dx2 / (dx1 + dx2)
+        w2 = dx1 / (dx1 + dx2)
+
+    outside = (ti > pi[..., :1]) | (ti < pi[..., -1:])
+    w1 = np.where (outside, np.nan, w1)
+    w2 = np.where (outside, np.nan, w2)
+
+    return idk1, idk2, w1, w2, ti, dp
+
+def _apply_conservative (yp:np.ndarray, idk1:np.ndarray, idk2:np.ndarray, # pylint: disable=too-many-arguments
+                         w1:np.ndarray, w2:np.ndarray, ti:np.ndarray, dp:np.ndarray) -> np.ndarray :
+    '''
+    Apply conservative weights. The vertical axis is the last one
+    '''
+    yp, dp = np.broadcast_arrays (yp, dp)
+    cumul  = np.concatenate ( (np.zeros_like (yp[..., :1]), np.cumsum (yp*dp, axis=-1)), axis=-1)
+    cumul  = w1*np.take_along_axis (cumul, idk1, axis=-1) + w2*np.take_along_axis (cumul, idk2, axis=-1)
+    thick  = ti[..., :-1] - ti[..., 1:]
+    with np.errstate (invalid='ignore', divide='ignore') :
+        return (cumul[..., 1:] - cumul[..., :-1]) / thick
+
+def _interp1d_loop (x:xr.DataArray, xp:xr.DataArray, yp:xr.DataArray, zdim:str) -> xr.DataArray :
+    '''
+    Level by level interpolation. Reference for the vectorized engine of interp1d
+    '''
     # Get the number of dimension with dim==zdim
     axis           = list (xp.dims).index (zdim)
 
@@ -76,19 +389,7 @@ def interp1d (x:np.ndarray|xr.DataArray, xp:xr.DataArray,
     ou_dims[axis]  = pdim
 
     # Determines orientation of x
-    dx = x.differentiate (coord=zdim)
-    if dx.min()*dx.max() < 0. :
-        raise ValueError ( 'interp1d : Coordinate not monotonic')
-
-    if   ( dx.min() > 0. and dx.max()> 0. ) :
-        or_up=True
-    elif ( dx.min() < 0. and dx.max()< 0. ) :
-        or_up=False
-    else :
-        raise ValueError ( 'interp1d : Coordinate not monotonic')
-
-    if or_up :
-        x, xp  = -x, -xp
+    x, xp = _orientation (x, xp, zdim)
 
     # Define the result array
     new_coords = []
@@ -112,19 +413,51 @@ def interp1d (x:np.ndarray|xr.DataArray, xp:xr.DataArray,
 
         dx1    = x[k] - x1
         dx2    = x2   - x[k]
-        dx     = x2   - x1
 
         y1     = yp[{zdim:idk1}]
         y2     = yp[{zdim:idk2}]
 
         ou_tab [{pdim:k}] = (dx1*y2 + dx2*y1) / (dx1 + dx2)
 
-    if name :
-        ou_tab = ou_tab.rename ( {pdim:name} )
+    return ou_tab
 
-    pop_stack ( 'interp1d' )
+def CheckInterp1d (Debug:bool=False) -> int :
+    '''
+    Check of the vector engine of interp1d against the loop engine and
+    np.interp, for input and target levels in both orders, with the same
+    input levels everywhere or levels varying with position
 
-    return ou_tab.squeeze()
+    Returns the number of mismatches (printed)
+    '''
+    zrng  = np.random.default_rng (0)
+    zxp1  = np.linspace (1000., 100., 9)
+    zyp1  = np.sort (zrng.random (9))
+    zxp3  = zxp1[:, np.newaxis] * (1.0 + 0.05*zrng.random ((9, 4)))
+    zyp3  = np.sort (zrng.random ((9, 4)), axis=0)
+    nerror = 0
+    for zxp, zyp in [ (zxp1, zyp1), (zxp3, zyp3) ] :
+        zdims = ('lev',) + (('x',) if zxp.ndim > 1 else ())
+        for xp_order in [ 1, -1 ] :
+            xp = xr.DataArray (zxp[::xp_order], dims=zdims)
+            yp = xr.DataArray (zyp[::xp_order], dims=zdims)
+            for x in [ np.array ([850., 500., 250.]), np.array ([250., 500., 850.]),
+                       np.array ([1050., 700., 50.]) ] :
+                zvec = interp1d (x, xp, yp, 'lev').values
+                zloo = interp1d (x, xp, yp, 'lev', engine='loop').values
+                ok = np.allclose (zvec, zloo, equal_nan=True)
+                if zxp.ndim == 1 :
+                    # Outside of the input levels, only the engines are compared
+                    zref = np.interp (-x, -zxp, zyp)
+                    zref = np.where ((x > zxp[0]) | (x < zxp[-1]), zvec, zref)
+                    ok = ok and np.allclose (zvec, zref, equal_nan=True)
+                if not ok :
+                    nerror += 1
+                    print ( f'CheckInterp1d : {zxp.ndim=} {xp_order=} {x=} : {zvec=} {zloo=}' )
+                elif OPTIONS['Debug'] or Debug :
+                    print ( f'CheckInterp1d : {zxp.ndim=} {xp_order=} {x=} : ok' )
+
+    print ( f'CheckInterp1d : {nerror} mismatch(es)' )
+    return nerror
 
 def find_roots_np (x:np.ndarray, y:np.ndarray, Debug=True) -> float|np.ndarray :
     '''https://stackoverflow.com/questions/46909373/
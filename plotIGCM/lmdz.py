@@ -25,7 +25,8 @@ data loss, or any other consequences caused directly or indirectly by
 the usage of his software by incorrectly or partially configured
 personal.
 '''
-from typing import Literal, Union, Optional
+import functools
+from typing import Literal, Union, Optional, Self, NamedTuple
 import numpy as np
 import xarray as xr
 from plotIGCM.options import OPTIONS, push_stack, pop_stack
@@ -104,123 +105,140 @@ ZLENGTH :list[int] = [ 39, 59, 79, ]
 
 
 ## ============================================================================
-@validate_types
-def __find_axis__ (ptab:xr.DataArray|xr.Dataset, axis:Literal['x', 'y', 'z', 't', 'b', 'c']='z',
-                    back:bool=True, Debug:bool=False) -> tuple[Optional[str], Optional[int]] :
+## Axis resolution
+##   The axes of an array only depend on the names and sizes of its dimensions
+##   and on the 'axis' and 'units' attributes of the associated coordinates.
+##   find_axes resolves all axes at once from this signature, and the result
+##   is cached.
+
+AXIS_KINDS:tuple[str, ...] = ('x', 'y', 'c', 'z', 't', 'b')
+
+class Axes (NamedTuple) :
     '''
-    Returns name and name of the requested axis
-    '''
-    push_stack ( f'__find_axis__ ( ptab, {axis=} {back=} )' )
-
-    ax        :Optional[str]       = None
-    ix        :Optional[int]       = None
-    ax_name   :Optional[list[str]] = None
-    unit_list :Optional[list[str]] = None
-    length    :Optional[list[int]] = None
-
-    if axis in XNAME :
-        ax_name   = XNAME
-        unit_list = XUNIT
-        length    = XLENGTH
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on xaxis found by name : {axis=} : ',\
-                    f'{XNAME=} {ax_name=} {unit_list=} {length=}' )
-    if axis in YNAME :
-        ax_name, unit_list, length = YNAME, YUNIT, YLENGTH
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on yaxis found by name : {axis=} : ',\
-                    f'{YNAME=} {ax_name=} {unit_list=} {length=}' )
-    if axis in CNAME :
-        ax_name, unit_list, length = CNAME, CUNIT, CLENGTH
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on caxis found by name : {axis=} : ',\
-                    f'{CNAME=} {ax_name=} {unit_list=} {length=}' )
-    if axis in ZNAME :
-        ax_name, unit_list, length = ZNAME, ZUNIT, ZLENGTH
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on zaxis found by name : {axis=} : ',\
-                    f'{ZNAME=} {ax_name=} {unit_list=} {length=}' )
-    if axis in TNAME :
-        ax_name, unit_list, length = TNAME, TUNIT, None
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on taxis found by name : {axis=} : ',\
-                    f'{TNAME=} {ax_name=} {unit_list=} {length=}' )
-    if axis in BNAME :
-        ax_name, unit_list, length = BNAME, None, None
-        if OPTIONS['Debug'] or Debug :
-            print ( f'Working on taxis found by name : {axis=} : ',\
-                    f'{BNAME=} {ax_name=} {unit_list=} {length=}' )
-
-    # Try by name
-    if ax_name is not None :
-        for dim in ax_name :
-            if dim in ptab.dims :
-                if OPTIONS['Debug'] or Debug :
-                    print (
-                        f'Rule 2 : {ax_name=} axis found by unit : {axis=} : {XNAME=}' )
-                ix = ptab.dims.index(dim) # pyright: ignore[reportAttributeAccessIssue]
-                ax = str(dim)
-
-    # If not found, try by 'axis' attribute
-    if not ix :
-        for ii, dim in enumerate (ptab.dims) :
-            if 'axis' in ptab.coords[dim].attrs.keys() :
-                l_axis = ptab.coords[dim].attrs['axis']
-                if OPTIONS['Debug'] or Debug :
-                    print ( f'Rule 3 : Trying {ii=} {dim=} {l_axis=}' )
-                if l_axis in ax_name and l_axis == str('X') :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 3 : xaxis found by name : {ax=} {l_axis=} {axis=} : ',\
-                                f'{ax_name=} {l_axis=} {ii=} {dim=}' )
-                    ix, ax = ii, str(dim)
-                if l_axis in ax_name and l_axis == str('Y') :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 3 : yaxis found by name : {ax=} {l_axis=} {axis=} : ',\
-                                f'{ax_name=} {l_axis=} {ii=} {dim=}' )
-                    ix, ax = ii, str(dim)
-                if l_axis in ax_name and l_axis == str('C') :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 3 : caxis found by name : {ax=} {l_axis=} {axis=} : ',\
-                                f'{ax_name=} {l_axis=} {ii=} {dim=}' )
-                    ix, ax = ii, str(dim)
-                if l_axis in ax_name and l_axis == str('Z') :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 3 : zaxis found by name : {ax=} {l_axis=} {axis=} : ',\
-                                f'{ax_name=} {l_axis=} {ii=} {dim=}' )
-                    ix, ax = ii, str(dim)
-                if l_axis in ax_name and l_axis == str('T') :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 3 : taxis found by name : {ax=} {l_axis=} {axis=} : ',\
-                                f'{ax_name=} {l_axis=} {ii=} {dim=}' )
-                    ix, ax = ii, str(dim)
-
-        # If not found, try by units
-        if not ix and unit_list is not None :
-            for ii, dim in enumerate (ptab.dims) :
-                if 'units' in ptab.coords[dim].attrs.keys() :
-                    for name in unit_list :
-                        if name in ptab.coords[dim].attrs['units'] :
-                            if OPTIONS['Debug'] or Debug :
-                                print ( f'Rule 4 : axis found by unit {name} : ',\
-                                        f'{unit_list=} {ii=} {dim=}' )
-                            ix, ax = ii, str(dim)
-
-    # If dimension not found, try by length
+    Names and positions of the axes of an array, as resolved by find_axes
+
+    Each axis is a tuple (name, index), index counted from the first dimension
+    '''
+    x    : tuple[Optional[str], Optional[int]]
+    y    : tuple[Optional[str], Optional[int]]
+    c    : tuple[Optional[str], Optional[int]]
+    z    : tuple[Optional[str], Optional[int]]
+    t    : tuple[Optional[str], Optional[int]]
+    b    : tuple[Optional[str], Optional[int]]
+    ndim : int
+
+    def get (self:Self, axis:str='z', back:bool=True) -> tuple[Optional[str], Optional[int]] :
+        '''Name and index of an axis, as returned by find_axis'''
+        ax, ix = getattr (self, axis_kind (axis))
+        if ix and back :
+            ix -= self.ndim
+        return ax, ix
+
+_AXIS_TABLES:dict[str, dict] = {}
+
+def _axis_tables () -> dict[str, dict] :
+    '''Kind of each axis name, and names, units and lengths of each kind'''
+    if not _AXIS_TABLES :
+        # Same precedence as the successive tests of the former __find_axis__
+        zkinds = (('x', XNAME, XUNIT, XLENGTH), ('y', YNAME, YUNIT, YLENGTH),
+                  ('c', CNAME, CUNIT, CLENGTH), ('z', ZNAME, ZUNIT, ZLENGTH),
+                  ('t', TNAME, TUNIT, None)   , ('b', BNAME, None , None   ))
+        _AXIS_TABLES['kind'] = { zname:zkind for zkind, znames, _, _ in zkinds for zname in znames }
+        _AXIS_TABLES['rule'] = {
+            zkind:(tuple (znames), frozenset (znames), tuple (zunits) if zunits else None,
+                   frozenset (zlength) if zlength else None)
+            for zkind, znames, zunits, zlength in zkinds }
+    return _AXIS_TABLES
+
+def clear_axis_cache () -> None :
+    '''Clear the axis cache. Needed after a modification of XNAME, YNAME, XUNIT, ...'''
+    _AXIS_TABLES.clear ()
+    _resolve_axes.cache_clear ()
+
+def axis_kind (axis:str) -> str :
+    '''Kind of axis (one of AXIS_KINDS) from any known axis name'''
+    try :
+        return _axis_tables ()['kind'][axis]
+    except KeyError as err :
+        raise ValueError (f'Unknown axis {axis=}') from err
+
+def _axes_signature (ptab:xr.DataArray|xr.Dataset) -> tuple :
+    '''Dimension names and sizes, with 'axis' and 'units' attributes of their coordinates'''
+    zsig = []
+    for dim in ptab.dims :
+        l_axis, l_units = None, None
+        if dim in ptab.coords :
+            zattrs = ptab.coords[dim].attrs
+            if 'axis' in zattrs :
+                l_axis = str (zattrs['axis'])
+            if 'units' in zattrs :
+                l_units = str (zattrs['units'])
+        zsig.append ((dim, ptab.sizes[dim], l_axis, l_units))
+    return tuple (zsig)
+
+def _resolve_axis (signature:tuple, kind:str) -> tuple[Optional[str], Optional[int]] :
+    '''Name and index of one kind of axis'''
+    zlist, znames, zunits, zlength = _axis_tables ()['rule'][kind]
+    zdims = [ dim for dim, _, _, _ in signature ]
+    ax:Optional[str] = None
+    ix:Optional[int] = None
+
+    # Rule 2 : by name. The last name of the list found in dims wins
+    for dim in zlist :
+        if dim in zdims :
+            ix, ax = zdims.index (dim), str (dim)
+
+    # Rule 3 : by 'axis' attribute
     if not ix :
-        if length is not None :
-            for nn, dim in enumerate (ptab.shape) :
-                if dim in length :
-                    if OPTIONS['Debug'] or Debug :
-                        print ( f'Rule 5 : axis found by length : {axis=} : ', \
-                                f'{XNAME=} {nn=} {dim=}' )
-                    ix = nn
+        for ii, (dim, _, l_axis, _) in enumerate (signature) :
+            if l_axis in ('X', 'Y', 'C', 'Z', 'T') and l_axis in znames :
+                ix, ax = ii, str (dim)
+
+        # Rule 4 : by units
+        if not ix and zunits :
+            for ii, (dim, _, _, l_units) in enumerate (signature) :
+                if l_units is not None :
+                    for zunit in zunits :
+                        if zunit in l_units :
+                            ix, ax = ii, str (dim)
+
+    # Rule 5 : by length
+    if not ix and zlength :
+        for nn, (_, zsize, _, _) in enumerate (signature) :
+            if zsize in zlength :
+                ix = nn
+
+    return ax, ix
+
+@functools.lru_cache (maxsize=512)
+def _resolve_axes (signature:tuple) -> Axes :
+    '''All axes from an array signature (cached)'''
+    return Axes (*[_resolve_axis (signature, zkind) for zkind in AXIS_KINDS],
+                 ndim=len (signature))
+
+def find_axes (ptab:xr.DataArray|xr.Dataset, Debug:bool=False) -> Axes :
+    '''
+    Resolve all axes of ptab at once
 
+    Returns an Axes descriptor : zaxes.x, zaxes.y, ... are (name, index) tuples,
+    and zaxes.get ('x', back=True) gives the same result as find_axis (ptab, 'x')
+    '''
+    zsig  = _axes_signature (ptab)
+    zaxes = _resolve_axes (zsig)
+    if OPTIONS['Debug'] or Debug :
+        print ( f'find_axes : {zsig=} {zaxes=}' )
+    return zaxes
 
-    if ix and back :
-        ix -= len(ptab.shape)
+@validate_types
+def __find_axis__ (ptab:xr.DataArray|xr.Dataset, axis:Literal['x', 'y', 'z', 't', 'b', 'c']='z',
+                    back:bool=True, Debug:bool=False) -> tuple[Optional[str], Optional[int]] :
+    '''
+    Returns name and index of the requested axis
 
-    pop_stack ( f'__find_axis__ ( {ax=} {ix=} )' )
-    return ax, ix # type: ignore
+    Axes are found by name, then by 'axis' attribute, then by units, then by length.
+    See find_axes to get all axes at once.
+    '''
+    return find_axes (ptab, Debug=Debug).get (axis, back)
 
 @validate_types
 def find_axis ( ptab:Union[xr.DataArray,xr.Dataset],
@@ -229,10 +247,7 @@ def find_axis ( ptab:Union[xr.DataArray,xr.Dataset],
                  ) -> tuple[Union[str,None], Union[int,None]] :
     '''
     Version of find_axis with no __'''
-    push_stack ( f'find_axis__ ( ptab {axis=} {back=} )' )
-    xx, ix = __find_axis__ (ptab, axis, back)
-    pop_stack ( f'find_axis ( {xx=} {ix=} )' )
-    return xx, ix
+    return find_axes (ptab).get (axis, back)
 
 @validate_types
 def get_shape ( ptab:xr.DataArray ) -> str :
@@ -247,18 +262,19 @@ def get_shape ( ptab:xr.DataArray ) -> str :
     push_stack ( 'get_shape ( ptab) ' )
 
     g_shape = ''
-    if __find_axis__ (ptab, 'x')[0] :
+    zaxes   = find_axes (ptab)
+    if zaxes.x[0] :
         g_shape = 'X'
-    if __find_axis__ (ptab, 'y')[0] :
+    if zaxes.y[0] :
         g_shape = 'Y' + g_shape
-    if __find_axis__ (ptab, 'c')[0] :
+    if zaxes.c[0] :
         g_shape = 'C' + g_shape
-    if __find_axis__ (ptab, 'z')[0] :
+    if zaxes.z[0] :
         g_shape = 'Z' + g_shape
-    if __find_axis__ (ptab, 't')[0] :
+    if zaxes.t[0] :
         g_shape = 'T' + g_shape
 
-    push_stack ( f'get_shape : {g_shape=} ' )
+    pop_stack ( f'get_shape : {g_shape=} ' )
     return g_shape
 
 @validate_types
@@ -36,11 +36,18 @@ respects the above prerequisite.
 
 # Modules
 import os
+import json
+import shutil
+import hashlib
+import functools
+from collections import OrderedDict
 from typing import (Self, Any, Optional, Iterable, ItemsView, KeysView, ValuesView,
-                    TypeVar, Literal, Dict, Callable)
+                    TypeVar, Literal, Dict, Callable, NamedTuple)
 import numpy as np
 import xarray as xr
 from scipy import ndimage
+from scipy import sparse
+from scipy.spatial import cKDTree
 
 try :
     from sklearn.impute import SimpleImputer
@@ -55,11 +62,12 @@ except ImportError as err :
     f90nml = None
 
 import libIGCM
-from plotIGCM.options import OPTIONS, get_options, push_stack, pop_stack
+from plotIGCM.options import OPTIONS, get_options, push_stack, pop_stack, traced
 from plotIGCM.utils import validate_types
 from plotIGCM.utils import copy_attrs
 from plotIGCM.utils import build_feat
 from plotIGCM.sphere import clo_lon
+from plotIGCM.sphere import latlon2cart
 #from plotIGCM import orca
 from plotIGCM import domzgr
 
@@ -398,6 +406,381 @@ known_domains:dict[str,Any|dict] = {
 CFG_name_RANGE:list[str] = [ vv['CFG_name'] for vv in known_domains.values() ]
 cfg_name_RANGE:list[str] = [ vv['cfg_name'] for vv in known_domains.values() ]
 
+## ============================================================================
+## Domain descriptors
+##   Inference of a Domain from partial information is memoized : building the
+##   same Domain again costs a dictionary lookup. DomainSpec is an immutable,
+##   hashable and interned snapshot of a Domain, usable as a key for the
+##   grid-level caches.
+
+DOMAIN_ATTRS:tuple[str, ...] = ( 'cfg_name', 'CFG_name', 'cd_cfg', 'kk_cfg', 'jpk', 'jpj', 'jpi',
+                                 'Iperio', 'Jperio', 'NFold', 'NFtype', 'nperio', 'aperio',
+                                 'Halo', 'Cyclic', 'ForceDefaults' )
+
+_DOMAIN_SPECS:dict[tuple, 'DomainSpec'] = {}
+_DOMAIN_CACHE:dict[tuple, 'DomainSpec'] = {}
+
+class DomainSpec :
+    '''
+    Immutable and hashable description of a NEMO domain
+
+    Instances are interned : DomainSpec with the same values are the same object.
+    Get one from a Domain with Domain.spec, and a Domain from it with
+    Domain (domain=spec)
+    '''
+    __slots__ = DOMAIN_ATTRS + ('_values', '_hash')
+
+    def __new__ (cls, **kwargs:Any) -> 'DomainSpec' :
+        zunknown = set (kwargs) - set (DOMAIN_ATTRS)
+        if zunknown :
+            raise TypeError (f'DomainSpec: unknown attributes {zunknown}')
+        zvalues = tuple (kwargs.get (attr) for attr in DOMAIN_ATTRS)
+        zspec = _DOMAIN_SPECS.get (zvalues)
+        if zspec is None :
+            zspec = super().__new__ (cls)
+            for attr, value in zip (DOMAIN_ATTRS, zvalues) :
+                object.__setattr__ (zspec, attr, value)
+            object.__setattr__ (zspec, '_values', zvalues)
+            object.__setattr__ (zspec, '_hash'  , hash (zvalues))
+            zspec = _DOMAIN_SPECS.setdefault (zvalues, zspec)
+        return zspec
+
+    @classmethod
+    def from_domain (cls, domain:Any) -> 'DomainSpec' :
+        '''DomainSpec of a Domain (or of any object with the Domain attributes)'''
+        if isinstance (domain, DomainSpec) :
+            return domain
+        return cls (**{ attr:getattr (domain, attr, None) for attr in DOMAIN_ATTRS })
+
+    def __setattr__ (self:Self, attr:str, value:Any) -> None :
+        raise AttributeError ('DomainSpec is immutable')
+
+    def __delattr__ (self:Self, attr:str) -> None :
+        raise AttributeError ('DomainSpec is immutable')
+
+    def __hash__ (self:Self) -> int :
+        return self._hash
+
+    def __eq__ (self:Self, other:Any) -> bool :
+        if isinstance (other, DomainSpec) :
+            return self is other or self._values == other._values
+        return NotImplemented
+
+    def __repr__ (self:Self) -> str :
+        return 'DomainSpec (' + ', '.join (f'{attr}={value!r}' for attr, value
+                                           in zip (DOMAIN_ATTRS, self._values)) + ')'
+
+    def __reduce__ (self:Self) -> tuple :
+        return (_domain_spec, (self._values,))
+
+    def dict (self:Self) -> dict[str, Any] :
+        '''Values as a dictionary'''
+        return dict (zip (DOMAIN_ATTRS, self._values))
+
+def _domain_spec (values:tuple) -> DomainSpec :
+    '''Rebuild an interned DomainSpec from its values (used by pickle)'''
+    return DomainSpec (**dict (zip (DOMAIN_ATTRS, values)))
+
+def clear_domain_cache () -> None :
+    '''Clear the cache of Domain inference. Needed after a modification of known_domains'''
+    _DOMAIN_CACHE.clear ()
+
+# pylint: disable=too-many-arguments, too-many-locals, too-many-branches, too-many-statements
+def _infer_domain (cfg_name:str|None, CFG_name:str|None, cd_cfg:str|None, kk_cfg:int|None,
+                   jpi:int|None, jpj:int|None, jpk:int|None,
+                   Iperio:bool|None, Jperio:bool|None, NFold:bool|None, NFtype:str|None,
+                   nperio:int|None, aperio:int|float|None, Halo:bool|None, Cyclic:bool|None,
+                   ForceDefaults:bool|None, domain:Any, shape:tuple|None,
+                   Debug:bool=False) -> 'DomainSpec' :
+    '''
+    Infer all values defining a NEMO domain from partial information
+
+    domain : a Domain or DomainSpec giving default values
+    shape  : (jpi, jpj, jpk) read from an array, or None
+    '''
+    if domain is not None :
+        if domain.cfg_name and cfg_name is not None :
+            cfg_name = domain.cfg_name
+        if domain.CFG_name and not CFG_name :
+            CFG_name = domain.CFG_name
+        if domain.cd_cfg   and not cd_cfg   :
+            cd_cfg   = domain.cd_cfg
+        if domain.kk_cfg   and not kk_cfg   :
+            kk_cfg   = domain.kk_cfg
+        if domain.jpi      and not jpi      :
+            jpi      = domain.jpi
+        if domain.jpj      and not jpj      :
+            jpj      = domain.jpj
+        if domain.jpk      and not jpk      :
+            jpk      = domain.jpk
+        if domain.Iperio   and not Iperio   :
+            Iperio   = domain.Iperio
+        if domain.Jperio   and not Jperio   :
+            Jperio   = domain.Jperio
+        if domain.NFold    and not NFold    :
+            NFold    = domain.NFold
+        if domain.NFtype   and not NFtype   :
+            NFtype   = domain.NFtype
+        if domain.nperio   and not nperio   :
+            nperio   = domain.nperio
+        if domain.aperio and not aperio :
+            if Halo and not domain.Halo :
+                if nperio == 4.2 :
+                    aperio = 4
+                if nperio == 6.2 :
+                    aperio = 6
+            if not Halo and domain.Halo :
+                if nperio == 4   :
+                    aperio = 4.2
+                if nperio == 6   :
+                    aperio = 6.2
+        if domain.Halo     and not Halo     :
+            Halo     = domain.Halo
+        if domain.Cyclic   and not Cyclic   :
+            Cyclic   = domain.Cyclic
+        if domain.ForceDefaults and not ForceDefaults :
+            ForceDefaults=domain.ForceDefaults
+
+        if Halo and Cyclic :
+            raise ValueError ('Error in nemo.Domain: Halo and Cyclic can not be both True')
+
+    if cfg_name :
+        cfg_name = cfg_name.lower ()
+        CFG_name = cfg_name.upper ()
+        if 'EORCA' in CFG_name :
+            CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
+        if 'PALEORCA' in CFG_name :
+            CFG_name = CFG_name.replace ( "PALEORCA", "paleORCA" )
+
+    if CFG_name and not cfg_name :
+        cfg_name = CFG_name.lower ()
+        CFG_name = CFG_name.upper ()
+        if 'EORCA' in CFG_name :
+            CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
+        if 'PALEORCA' in CFG_name :
+            CFG_name = CFG_name.replace ( "PALEORCA", "paleORCA" )
+
+    if shape is not None :
+        zjpi, zjpj, zjpk = shape
+        if Debug :
+            print (f'{jpk=} {jpj=} {jpi=} {zjpk=} {zjpj=} {zjpi=}')
+
+        zerr = 0
+        if jpi :
+            if zjpi is not None :
+                if jpi != zjpi :
+                    zerr += 1
+        else :
+            if zjpi :
+                jpi = zjpi
+
+        if jpj :
+            if zjpj is not None :
+                if jpj != zjpj :
+                    zerr += 1
+        else :
+            if zjpj :
+                jpj = zjpj
+
+        if jpk :
+            if zjpk is not None :
+                if jpk != zjpk :
+                    zerr += 1
+        else :
+            if zjpk :
+                jpk = zjpk
+
+        if zerr > 0 :
+            raise RuntimeError (f'Error in nemo.Domain: shape of ptab (jpi, jpj, jpk)={shape}',\
+                                f' does not match {jpk=}, {jpj=}, {jpi=}')
+
+    if Debug :
+        print (f'{jpk=} {jpj=} {jpi=}')
+
+    if Debug :
+        print ('Find by dimensions')
+    if jpj == 149 and jpi == 182 :
+        domain = Domain (cfg_name='orca2.3')
+    if jpj == 148 and jpi == 180 :
+        domain = Domain (cfg_name='orca2.3')
+    if jpj == 332 and jpi == 362 :
+        domain = Domain (cfg_name='eorca1.4.0')
+    if jpj == 331 and jpi == 360 :
+        domain = Domain (cfg_name='eorca1.4.2')
+    if Debug :
+        print (domain)
+
+    if domain is not None :
+        if domain.cfg_name and not cfg_name :
+            cfg_name = domain.cfg_name
+        if domain.CFG_name and not CFG_name :
+            CFG_name = domain.CFG_name
+        if domain.cd_cfg   and not cd_cfg   :
+            cd_cfg   = domain.cd_cfg
+        if domain.kk_cfg   and not kk_cfg   :
+            kk_cfg   = domain.kk_cfg
+        if domain.jpi      and not jpi      :
+            jpi      = domain.jpi
+        if domain.jpj      and not jpj      :
+            jpj      = domain.jpj
+        if domain.jpk      and not jpk      :
+            jpk      = domain.jpk
+        if domain.Iperio   and not Iperio   :
+            Iperio   = domain.Iperio
+        if domain.Jperio   and not Jperio   :
+            Jperio   = domain.Jperio
+        if domain.NFold    and not NFold    :
+            NFold    = domain.NFold
+        if domain.NFtype   and not NFtype   :
+            NFtype   = domain.NFtype # type: ignore
+        if domain.nperio   and not nperio   :
+            nperio   = domain.nperio # type: ignore
+        if domain.aperio   and not aperio   :
+            aperio   = domain.aperio
+        if domain.Halo     and not Halo     :
+            Halo     = domain.Halo
+        if domain.ForceDefaults and not ForceDefaults :
+            ForceDefaults=domain.ForceDefaults
+
+    if Debug :
+        print ( f"{cfg_name=} {cd_cfg=} {kk_cfg=} {Halo=} {NFtype=} {jpj=} {jpi=}", \
+               f"{nperio=} {aperio=}" )
+
+    if Debug :
+        print ('Find by configuration names')
+    zf = None
+
+    for zd in known_domains.values() :
+        if Debug :
+            print  ( f'handling {zd=}')
+        if cfg_name and zd['cfg_name'] :
+            if cfg_name.lower() == zd['cfg_name'].lower () : # type: ignore
+                zf = zd
+        if CFG_name and zd['CFG_name'] :
+            if CFG_name.upper() == zd['CFG_name'].upper () : # type: ignore
+                zf = zd
+        if not zf :
+            if cd_cfg and kk_cfg and zd['cd_cfg'] and zd['kk_cfg'] :
+                if cd_cfg == zd['cd_cfg'] and kk_cfg == zd['kk_cfg'] :
+                    if Debug :
+                        print  ( f"handling {zd['cd_cfg']=} {zd['kk_cfg']=}",\
+                                 f"{cd_cfg=} {kk_cfg=}")
+                    zf = zd
+        if zf :
+            break
+
+    if zf :
+        if Debug :
+            print  ( f'handling {cfg_name=}')
+        if ForceDefaults or cd_cfg is None :
+            cd_cfg = 'orca'
+            if ForceDefaults or kk_cfg is None :
+                kk_cfg = zf['kk_cfg'] # type: ignore
+            if ForceDefaults or nperio is None :
+                nperio = zf['nperio'] # type: ignore
+            if ForceDefaults or aperio is None :
+                aperio = zf['aperio'] # type: ignore
+            if ForceDefaults or Iperio is None :
+                Iperio = zf['Iperio'] # type: ignore
+            if ForceDefaults or Jperio is None :
+                Jperio = zf['Jperio'] # type: ignore
+            if ForceDefaults or NFold  is None :
+                NFold  = zf['NFold']  # type: ignore
+            if ForceDefaults or NFtype is None :
+                NFtype = zf['NFtype'] # type: ignore
+            if ForceDefaults or Halo   is None :
+                Halo   = zf['Halo']   # type: ignore
+            if ForceDefaults or jpk    is None :
+                jpk    = zf['jpk']    # type: ignore
+            if ForceDefaults or jpj    is None :
+                jpj    = zf['jpj']    # type: ignore
+            if ForceDefaults or jpi    is None :
+                jpi    = zf['jpi']    # type: ignore
+
+    if Debug :
+        print ( 'Fill missing values' )
+    if aperio == 4 :
+        if ForceDefaults or nperio is None :
+            nperio = 4
+        if ForceDefaults or Iperio is None :
+            Iperio = True
+        if ForceDefaults or Jperio is None :
+            Jperio = False
+        if ForceDefaults or NFold  is None :
+            NFold  = True
+        if ForceDefaults or NFtype is None :
+            NFtype = 'T'
+        if ForceDefaults or Halo   is None :
+            Halo   = True
+
+    if aperio == 4.2 :
+        if ForceDefaults or nperio is None :
+            nperio = 4
+        if ForceDefaults or Iperio is None :
+            Iperio = True
+        if ForceDefaults or Jperio is None :
+            Jperio = False
+        if ForceDefaults or NFold  is None :
+            NFold  = True
+        if ForceDefaults or NFtype is None :
+            NFtype = 'T'
+        if ForceDefaults or Halo   is None :
+            Halo   = False
+
+    if aperio == 6 :
+        if ForceDefaults or nperio is None :
+            nperio = 6
+        if ForceDefaults or Iperio is None :
+            Iperio = True
+        if ForceDefaults or Jperio is None :
+            Jperio = False
+        if ForceDefaults or NFold  is None :
+            NFold  = True
+        if ForceDefaults or NFtype is None :
+            NFtype = 'F'
+        if ForceDefaults or Halo   is None :
+            Halo   = True
+
+    if aperio == 6.2 :
+        if ForceDefaults or nperio is None :
+            nperio = 6
+        if ForceDefaults or Iperio is None :
+            Iperio = True
+        if ForceDefaults or Jperio is None :
+            Jperio = False
+        if ForceDefaults or NFold  is None :
+            NFold  = True
+        if ForceDefaults or NFtype is None :
+            NFtype = 'F'
+        if ForceDefaults or Halo   is None :
+            Halo   = False
+
+    if nperio == 4 :
+        if ForceDefaults or aperio is None :
+            aperio = 4 if Halo else 4.2
+
+    if nperio == 6 :
+        if ForceDefaults or aperio is None :
+            aperio = 6 if Halo else 6.2
+
+    if Iperio and NFold and NFtype=='T' and Halo     :
+        nperio, aperio = 4, 4
+    if Iperio and NFold and NFtype=='F' and Halo     :
+        nperio, aperio = 6, 6
+    if Iperio and NFold and NFtype=='T' and not Halo :
+        nperio, aperio = 4, 4.2
+    if Iperio and NFold and NFtype=='F' and not Halo :
+        nperio, aperio = 6, 6.2
+
+    if CFG_name :
+        if 'EORCA' in CFG_name :
+            CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
+
+    return DomainSpec (cfg_name=cfg_name, CFG_name=CFG_name, cd_cfg=cd_cfg, kk_cfg=kk_cfg,
+                       jpk=jpk, jpj=jpj, jpi=jpi, Iperio=Iperio, Jperio=Jperio,
+                       NFold=NFold, NFtype=NFtype, nperio=nperio, aperio=aperio,
+                       Halo=Halo, Cyclic=Cyclic, ForceDefaults=ForceDefaults)
+
 # pylint: disable=too-many-instance-attributes
 class Domain :
     '''
@@ -471,6 +854,10 @@ class Domain :
     # pylint: disable=missing-function-docstring
     def copy(self: Self) -> 'Domain':
         return Domain (domain=self)
+    @property
+    def spec (self:Self) -> DomainSpec :
+        '''Immutable and hashable snapshot of the domain, usable as a cache key'''
+        return DomainSpec.from_domain (self)
     # Convenience aliases for update
     @validate_types
     # pylint: disable=missing-function-docstring
@@ -528,315 +915,30 @@ class Domain :
         Tries to infer all missing values from known ones
         '''
 
-        zOPTIONS = get_options ()
-
-        if domain is not None :
-            if domain.cfg_name and cfg_name is not None :
-                cfg_name = domain.cfg_name
-            if domain.CFG_name and not CFG_name :
-                CFG_name = domain.CFG_name
-            if domain.cd_cfg   and not cd_cfg   :
-                cd_cfg   = domain.cd_cfg
-            if domain.kk_cfg   and not kk_cfg   :
-                kk_cfg   = domain.kk_cfg
-            if domain.jpi      and not jpi      :
-                jpi      = domain.jpi
-            if domain.jpj      and not jpj      :
-                jpj      = domain.jpj
-            if domain.jpk      and not jpk      :
-                jpk      = domain.jpk
-            if domain.Iperio   and not Iperio   :
-                Iperio   = domain.Iperio
-            if domain.Jperio   and not Jperio   :
-                Jperio   = domain.Jperio
-            if domain.NFold    and not NFold    :
-                NFold    = domain.NFold
-            if domain.NFtype   and not NFtype   :
-                NFtype   = domain.NFtype
-            if domain.nperio   and not nperio   :
-                nperio   = domain.nperio
-            if domain.aperio and not aperio :
-                if Halo and not domain.Halo :
-                    if nperio == 4.2 :
-                        aperio = 4
-                    if nperio == 6.2 :
-                        aperio = 6
-                if not Halo and domain.Halo :
-                    if nperio == 4   :
-                        aperio = 4.2
-                    if nperio == 6   :
-                        aperio = 6.2
-            if domain.Halo     and not Halo     :
-                Halo     = domain.Halo
-            if domain.Cyclic   and not Cyclic   :
-                Cyclic   = domain.Cyclic
-            if domain.ForceDefaults and not ForceDefaults :
-                ForceDefaults=domain.ForceDefaults
-
-            if Halo and Cyclic :
-                raise ValueError ('Error in nemo.Domain: Halo and Cyclic can not be both True')
-
-        if cfg_name :
-            cfg_name = cfg_name.lower ()
-            CFG_name = cfg_name.upper ()
-            if 'EORCA' in CFG_name :
-                CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
-            if 'PALEORCA' in CFG_name :
-                CFG_name = CFG_name.replace ( "PALEORCA", "paleORCA" )
-
-        if CFG_name and not cfg_name :
-            cfg_name = CFG_name.lower ()
-            CFG_name = CFG_name.upper ()
-            if 'EORCA' in CFG_name :
-                CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
-            if 'PALEORCA' in CFG_name :
-                CFG_name = CFG_name.replace ( "PALEORCA", "paleORCA" )
+        zdebug = get_options ()['Debug'] or Debug
 
+        zshape = None
         if ptab is not None :
-            if zOPTIONS['Debug'] or Debug :
+            if zdebug :
                 print ( f'{ptab.shape=}' )
-            ax, _ = find_axis (ptab, 'x')
-            ay, _ = find_axis (ptab, 'y')
-            az, _ = find_axis (ptab, 'z')
-
-            if zOPTIONS['Debug'] or Debug :
-                print (f'{ax=}, {ay=}, {az=}')
-
-            zjpi = ptab.sizes[ax] if ax is not None else None
-            zjpj = ptab.sizes[ay] if ay is not None else None
-            zjpk = ptab.sizes[az] if az is not None else None
-
-            if zOPTIONS['Debug'] or Debug :
-                print (f'{jpk=} {jpj=} {jpi=} {zjpk=} {zjpj=} {zjpi=}')
-
-            zerr = 0
-            if jpi :
-                if zjpi is not None :
-                    if jpi != zjpi :
-                        zerr += 1
-            else :
-                if zjpi :
-                    jpi = zjpi
-
-            if jpj :
-                if zjpj is not None :
-                    if jpj != zjpj :
-                        zerr += 1
-            else :
-                if zjpj :
-                    jpj = zjpj
-
-            if jpk :
-                if zjpk is not None :
-                    if jpk != zjpk :
-                        zerr += 1
-            else :
-                if zjpk :
-                    jpk = zjpk
-
-            if zerr > 0 :
-                raise RuntimeError (f'Error in nemo.Domain: shape of ptab={ptab.shape}',\
-                                    f' does not match {jpk=}, {jpj=}, {jpi=}')
-
-        if zOPTIONS['Debug'] or Debug :
-            print (f'{jpk=} {jpj=} {jpi=}')
-
-        if zOPTIONS['Debug'] or Debug :
-            print ('Find by dimensions')
-        if jpj == 149 and jpi == 182 :
-            domain = Domain (cfg_name='orca2.3')
-        if jpj == 148 and jpi == 180 :
-            domain = Domain (cfg_name='orca2.3')
-        if jpj == 332 and jpi == 362 :
-            domain = Domain (cfg_name='eorca1.4.0')
-        if jpj == 331 and jpi == 360 :
-            domain = Domain (cfg_name='eorca1.4.2')
-        if zOPTIONS['Debug'] or Debug :
-            print (domain)
-
-        if domain is not None :
-            if domain.cfg_name and not cfg_name :
-                cfg_name = domain.cfg_name
-            if domain.CFG_name and not CFG_name :
-                CFG_name = domain.CFG_name
-            if domain.cd_cfg   and not cd_cfg   :
-                cd_cfg   = domain.cd_cfg
-            if domain.kk_cfg   and not kk_cfg   :
-                kk_cfg   = domain.kk_cfg
-            if domain.jpi      and not jpi      :
-                jpi      = domain.jpi
-            if domain.jpj      and not jpj      :
-                jpj      = domain.jpj
-            if domain.jpk      and not jpk      :
-                jpk      = domain.jpk
-            if domain.Iperio   and not Iperio   :
-                Iperio   = domain.Iperio
-            if domain.Jperio   and not Jperio   :
-                Jperio   = domain.Jperio
-            if domain.NFold    and not NFold    :
-                NFold    = domain.NFold
-            if domain.NFtype   and not NFtype   :
-                NFtype   = domain.NFtype # type: ignore
-            if domain.nperio   and not nperio   :
-                nperio   = domain.nperio # type: ignore
-            if domain.aperio   and not aperio   :
-                aperio   = domain.aperio
-            if domain.Halo     and not Halo     :
-                Halo     = domain.Halo
-            if domain.ForceDefaults and not ForceDefaults :
-                ForceDefaults=domain.ForceDefaults
-
-        if zOPTIONS['Debug'] or Debug :
-            print ( f"{cfg_name=} {cd_cfg=} {kk_cfg=} {Halo=} {NFtype=} {jpj=} {jpi=}", \
-                   f"{nperio=} {aperio=}" )
-
-        if zOPTIONS['Debug'] or Debug :
-            print ('Find by configuration names')
-        zf = None
-
-        for zd in known_domains.values() :
-            if zOPTIONS['Debug'] or Debug :
-                print  ( f'handling {zd=}')
-            if cfg_name and zd['cfg_name'] :
-                if cfg_name.lower() == zd['cfg_name'].lower () : # type: ignore
-                    zf = zd
-            if CFG_name and zd['CFG_name'] :
-                if CFG_name.upper() == zd['CFG_name'].upper () : # type: ignore
-                    zf = zd
-            if not zf :
-                if cd_cfg and kk_cfg and zd['cd_cfg'] and zd['kk_cfg'] :
-                    if cd_cfg == zd['cd_cfg'] and kk_cfg == zd['kk_cfg'] :
-                        if zOPTIONS['Debug'] or Debug :
-                            print  ( f"handling {zd['cd_cfg']=} {zd['kk_cfg']=}",\
-                                     f"{cd_cfg=} {kk_cfg=}")
-                        zf = zd
-            if zf :
-                break
-
-        if zf :
-            if zOPTIONS['Debug'] or Debug :
-                print  ( f'handling {cfg_name=}')
-            if ForceDefaults or cd_cfg is None :
-                cd_cfg = 'orca'
-                if ForceDefaults or kk_cfg is None :
-                    kk_cfg = zf['kk_cfg'] # type: ignore
-                if ForceDefaults or nperio is None :
-                    nperio = zf['nperio'] # type: ignore
-                if ForceDefaults or aperio is None :
-                    aperio = zf['aperio'] # type: ignore
-                if ForceDefaults or Iperio is None :
-                    Iperio = zf['Iperio'] # type: ignore
-                if ForceDefaults or Jperio is None :
-                    Jperio = zf['Jperio'] # type: ignore
-                if ForceDefaults or NFold  is None :
-                    NFold  = zf['NFold']  # type: ignore
-                if ForceDefaults or NFtype is None :
-                    NFtype = zf['NFtype'] # type: ignore
-                if ForceDefaults or Halo   is None :
-                    Halo   = zf['Halo']   # type: ignore
-                if ForceDefaults or jpk    is None :
-                    jpk    = zf['jpk']    # type: ignore
-                if ForceDefaults or jpj    is None :
-                    jpj    = zf['jpj']    # type: ignore
-                if ForceDefaults or jpi    is None :
-                    jpi    = zf['jpi']    # type: ignore
-
-        if zOPTIONS['Debug'] or Debug :
-            print ( 'Fill missing values' )
-        if aperio == 4 :
-            if ForceDefaults or nperio is None :
-                nperio = 4
-            if ForceDefaults or Iperio is None :
-                Iperio = True
-            if ForceDefaults or Jperio is None :
-                Jperio = False
-            if ForceDefaults or NFold  is None :
-                NFold  = True
-            if ForceDefaults or NFtype is None :
-                NFtype = 'T'
-            if ForceDefaults or Halo   is None :
-                Halo   = True
-
-        if aperio == 4.2 :
-            if ForceDefaults or nperio is None :
-                nperio = 4
-            if ForceDefaults or Iperio is None :
-                Iperio = True
-            if ForceDefaults or Jperio is None :
-                Jperio = False
-            if ForceDefaults or NFold  is None :
-                NFold  = True
-            if ForceDefaults or NFtype is None :
-                NFtype = 'T'
-            if ForceDefaults or Halo   is None :
-                Halo   = False
-
-        if aperio == 6 :
-            if ForceDefaults or nperio is None :
-                nperio = 6
-            if ForceDefaults or Iperio is None :
-                Iperio = True
-            if ForceDefaults or Jperio is None :
-                Jperio = False
-            if ForceDefaults or NFold  is None :
-                NFold  = True
-            if ForceDefaults or NFtype is None :
-                NFtype = 'F'
-            if ForceDefaults or Halo   is None :
-                Halo   = True
-
-        if aperio == 6.2 :
-            if ForceDefaults or nperio is None :
-                nperio = 6
-            if ForceDefaults or Iperio is None :
-                Iperio = True
-            if ForceDefaults or Jperio is None :
-                Jperio = False
-            if ForceDefaults or NFold  is None :
-                NFold  = True
-            if ForceDefaults or NFtype is None :
-                NFtype = 'F'
-            if ForceDefaults or Halo   is None :
-                Halo   = False
+            zaxes  = find_axes (ptab)
+            zshape = tuple (ptab.sizes[zax] if zax is not None else None
+                            for zax in (zaxes.x[0], zaxes.y[0], zaxes.z[0]))
+            if zdebug :
+                print (f'{zaxes=} {zshape=}')
 
-        if nperio == 4 :
-            if ForceDefaults or aperio is None :
-                aperio = 4 if Halo else 4.2
+        zargs = ( cfg_name, CFG_name, cd_cfg, kk_cfg, jpi, jpj, jpk, Iperio, Jperio, NFold,
+                  NFtype, nperio, aperio, Halo, Cyclic, ForceDefaults,
+                  None if domain is None else DomainSpec.from_domain (domain), zshape )
+        zspec = None if zdebug else _DOMAIN_CACHE.get (zargs)
+        if zspec is None :
+            zspec = _infer_domain (*zargs, Debug=zdebug)
+            if not zdebug :
+                _DOMAIN_CACHE[zargs] = zspec
 
-        if nperio == 6 :
-            if ForceDefaults or aperio is None :
-                aperio = 6 if Halo else 6.2
-
-        if Iperio and NFold and NFtype=='T' and Halo     :
-            nperio, aperio = 4, 4
-        if Iperio and NFold and NFtype=='F' and Halo     :
-            nperio, aperio = 6, 6
-        if Iperio and NFold and NFtype=='T' and not Halo :
-            nperio, aperio = 4, 4.2
-        if Iperio and NFold and NFtype=='F' and not Halo :
-            nperio, aperio = 6, 6.2
-
-        if CFG_name :
-            if 'EORCA' in CFG_name :
-                CFG_name = CFG_name.replace ( "EORCA", "eORCA" )
-
-        self.cfg_name = cfg_name
-        self.CFG_name = CFG_name
-        self.cd_cfg   = cd_cfg
-        self.kk_cfg   = kk_cfg
-        self.jpk      = jpk
-        self.jpj      = jpj
-        self.jpi      = jpi
-        self.Iperio   = Iperio
-        self.Jperio   = Jperio
-        self.NFold    = NFold
-        self.NFtype   = NFtype
-        self.nperio   = nperio
-        self.aperio   = aperio
-        self.Halo     = Halo
-        self.Cyclic   = Cyclic
-        self.ForceDefaults=ForceDefaults
+        self.__dict__.update (zspec.dict ())
 
+    @traced
     @validate_types
     def edit (self:Self, action:str|None=None, Debug:bool=False,
               stop_on_check:bool=False) -> None :
@@ -844,7 +946,6 @@ class Domain :
         Edit the domain by adding or removing halo or cyclic
         action: 'add_halo', 'del_halo', 'add_cyclic',   'del_cyclic'
         '''
-        push_stack ('edit domain')
         if action in [ 'add_halo', 'add', 'ext', 'extend'] :
             self.add_halo   (Debug=Debug, stop_on_check=stop_on_check)
         if action in [ 'del_halo', 'del', 'rm', 'remove'] :
@@ -853,14 +954,13 @@ class Domain :
             self.add_cyclic (Debug=Debug, stop_on_check=stop_on_check)
         if action in [ 'del_cyclic', ] :
             self.del_cyclic (Debug=Debug, stop_on_check=stop_on_check)
-        pop_stack ('edit_domain')
 
+    @traced
     @validate_types
     def add_halo (self:Self, Debug:bool=False, stop_on_check:bool=False) :
         '''
         Add halo to the domain
         '''
-        push_stack ('add_halo')
         if self.Halo :
             if stop_on_check :
                 raise RuntimeError (
@@ -891,14 +991,13 @@ class Domain :
                 self.jpi = self.jpi + 2
             if self.jpj is not None :
                 self.jpj = self.jpj + 1
-        push_stack ('add_halo')
 
+    @traced
     @validate_types
     def del_halo (self:Self, Debug:bool=False, stop_on_check:bool=False) -> None :
         '''
         Delete halo from the domain
         '''
-        push_stack ('del_halo')
         if not self.Halo :
             if stop_on_check :
                 raise RuntimeError (
@@ -930,14 +1029,13 @@ class Domain :
             if self.jpj is not None :
                 self.jpj = self.jpj - 1
             self.__dict__.update (Halo=False )
-        pop_stack ('add_halo')
 
+    @traced
     @validate_types
     def add_cyclic (self:Self, Debug:bool=False, stop_on_check:bool=False) -> None :
         '''
         Add cyclic to the domain
         '''
-        push_stack ('add_cyclic')
         if self.Halo :
             if stop_on_check :
                 raise RuntimeError (
@@ -962,14 +1060,13 @@ class Domain :
             self.Cyclic = True
             if self.jpi is not None :
                 self.jpi = self.jpi + 1
-        pop_stack ('add_cyclic')
 
+    @traced
     @validate_types
     def del_cyclic (self:Self, Debug:bool=False, stop_on_check:bool=False) :
         '''
         Delete cyclic from the domain
         '''
-        pop_stack ('del_cyclic')
         if not self.Halo :
             if stop_on_check :
                 raise RuntimeError (
@@ -994,7 +1091,73 @@ class Domain :
             self.Cyclic = False
             if self.jpi is not None :
                 self.jpi = self.jpi - 1
-        pop_stack ('del_cyclic')
+
+## ============================================================================
+## GridMask cache
+##   Building a GridMask reads up to five files and processes every array (lbc,
+##   unify_dims, fixed_lon, angles ...). When OPTIONS['CacheDir'] is set, the
+##   processed arrays are written there, one NetCDF file per array, in a
+##   directory keyed by the configuration and the dates of the source files.
+##   Later constructions open the arrays lazily, on first access.
+
+GRIDMASK_CACHE_VERSION = 1
+
+GRIDMASK_ARRAYS:tuple[str, ...] = (
+    'lon_T', 'lat_T', 'lon_U', 'lat_U', 'lon_V', 'lat_V', 'lon_F', 'lat_F', 'lon_W', 'lat_W',
+    'lon1D', 'lat1D',
+    'mask_T', 'mask_U', 'mask_V', 'mask_F', 'mask_W',
+    'mask_3T', 'mask_3U', 'mask_3V', 'mask_3F', 'mask_3W',
+    'gcosT', 'gsinT', 'gcosU', 'gsinU', 'gcosV', 'gsinV', 'gcosF', 'gsinF',
+    'atlmsk', 'atlmsk_nomed', 'pacmsk', 'indmsk', 'ipcmsk',
+    'z_c', 'z_f', 'z_c_bnds1d',
+    'e1t', 'e1u', 'e1v', 'e1f', 'e1w', 'e2t', 'e2u', 'e2v', 'e2f', 'e2w',
+    'e3t', 'e3u', 'e3v', 'e3f', 'e3w', 'e3t_ps', 'e3w_ps',
+    'maskdraw_T', 'maskdraw_U', 'maskdraw_V', 'maskdraw_F', 'maskdraw_W',
+    'maskutil_T', 'maskutil_U', 'maskutil_V', 'maskutil_F', 'maskutil_W' )
+
+## Attributes of GridMask that are the same object as another one
+GRIDMASK_ALIASES:dict[str, str] = { 'lon':'lon_T', 'lat':'lat_T', 'mask':'mask_T' }
+
+def gridmask_key (domain:Domain, sources:list[str|None], kw_uni:Dict, pval:Any) -> str :
+    '''
+    Name of the cache of a GridMask : configuration name, and hash of the
+    domain, of the options, and of the paths and modification times of the
+    source files
+    '''
+    zkey = [ str (GRIDMASK_CACHE_VERSION), repr (DomainSpec.from_domain (domain)),
+             repr (sorted (kw_uni.items ())), repr (pval) ]
+    for source in sources :
+        if source is not None and os.path.isfile (source) :
+            zkey.append ( f'{os.path.abspath (source)}:{os.stat (source).st_mtime_ns}' )
+        else :
+            zkey.append ( 'None' )
+    return f'{domain.CFG_name}_{hashlib.sha1 (":".join (zkey).encode ()).hexdigest ()[:16]}'
+
+## Name of the arrays in the cache files. The names of the arrays are restored on reading
+GRIDMASK_VARNAME = 'gridmask_array'
+
+def _read_cached_array (zcache:str, name:str, varname:str|None=None) -> xr.DataArray :
+    '''
+    Array name of a GridMask cache. It is read on first access to the
+    attribute, so it is loaded at once and the file is closed
+    '''
+    with xr.open_dataset (os.path.join (zcache, f'{name}.nc'), decode_times=False,
+                          cache=False) as zds :
+        zvar = zds[GRIDMASK_VARNAME].load ()
+    zvar.name = varname
+    return zvar
+
+def _read_grid_file (source:str, kw_uni:Dict) -> xr.Dataset :
+    '''Grid file, as read by GridMask. The dataset stays open, as the one of GridMask'''
+    return unify_dims (xr.open_dataset (source, decode_times=False).squeeze (), **kw_uni)
+
+def clear_gridmask_cache (CFG_name:str|None=None) -> None :
+    '''Remove the GridMask caches of OPTIONS['CacheDir'], for one configuration or for all'''
+    if OPTIONS['CacheDir'] and os.path.isdir (OPTIONS['CacheDir']) :
+        zprefix = f'gridmask_{CFG_name}_' if CFG_name else 'gridmask_'
+        for zcache in os.listdir (OPTIONS['CacheDir']) :
+            if zcache.startswith (zprefix) :
+                shutil.rmtree (os.path.join (OPTIONS['CacheDir'], zcache), ignore_errors=True)
 
 class GridMask :
     '''
@@ -1124,7 +1287,15 @@ class GridMask :
             self:Self, mm:libIGCM.sys.Config, domain:Domain,
             kw_uni:Dict={'use_xgcm':True},
             e3file:str|None=None, e3dataset:xr.Dataset|None=None, e3t=None, e3w=None,
-            pval=np.nan, Debug=False) -> None :
+            pval=np.nan, cache:bool=True, Debug=False) -> None :
+        '''
+        Read the grid files of the configuration, and build all grid arrays
+
+        cache : if OPTIONS['CacheDir'] is set, the processed arrays are saved
+                there, keyed by the configuration and the dates of the source
+                files. Later constructions read the arrays from the cache
+                on first access. Not used when e3dataset is given.
+        '''
 
         f_g  = os.path.join (  # pyright: ignore[reportCallIssue]
             mm.R_IN, # pyright: ignore[reportArgumentType]
@@ -1168,6 +1339,19 @@ class GridMask :
             print ( f'{f_d2=}' )
             print ( f'{f_b=} ' )
 
+        self._sources = { 'd_g':f_g, 'd_e':f_e, 'd_b':f_b,
+                          'd_d':f_d1 if os.path.isfile (f_d1) else f_d2 }
+        self._sources = { name:(source if source is not None and os.path.isfile (source) else None)
+                          for name, source in self._sources.items () }
+
+        zcache = None
+        if cache and OPTIONS['CacheDir'] and e3dataset is None :
+            zcache = os.path.join (OPTIONS['CacheDir'], 'gridmask_' + gridmask_key (
+                domain, list (self._sources.values ()) + [e3file], kw_uni, pval))
+            if os.path.isfile (os.path.join (zcache, 'gridmask.json')) :
+                self._load_cache (zcache, mm, domain, kw_uni, Debug=Debug)
+                return
+
         kw_read = {'decode_times':False}
 
         d_g = xr.open_dataset (f_g , **kw_read  # type: ignore
@@ -1387,16 +1571,17 @@ class GridMask :
 
         if d_b is not None :
             kw = {'domain':domain, 'psgn':1, 'cd_type':'T', 'btype':'lbc'}
-            if atlmsk in d_b :
+            if 'atlmsk' in d_b :
                 atlmsk = lbcu (d_b.atlmsk, **kw_uni, **kw)
-            if indmsk is not None and ipcmsk is not None :
-                ipcmsk = lbcu (d_b.indmsk, **kw_uni, **kw)
-            if pacmsk in d_b :
+            if 'indmsk' in d_b :
+                indmsk = lbcu (d_b.indmsk, **kw_uni, **kw)
+            if 'pacmsk' in d_b :
                 pacmsk = lbcu (d_b.pacmsk, **kw_uni, **kw)
-            if atlmsk is not None and ipcmsk is not None :
-                # pyright: ignore[reportOptionalOperand]
-                ipcmsk = np.clip (pacmsk + indmsk, 0, 1) # pyright: ignore[reportOptionalOperand]
-            if atlmsk_nomed in d_b :
+            if 'ipcmsk' in d_b :
+                ipcmsk = lbcu (d_b.ipcmsk, **kw_uni, **kw)
+            elif pacmsk is not None and indmsk is not None :
+                ipcmsk = np.clip (pacmsk + indmsk, 0, 1)
+            if 'atlmsk_nomed' in d_b :
                 atlmsk_nomed = lbcu (d_b.atlmsk_nomed, **kw_uni, **kw)
 
         if   d_g is not None and 'e1t' in d_g.variables :
@@ -1553,59 +1738,12 @@ class GridMask :
         #         f'{domain.cfg_name}_grid_line.json'), mm),
         #                        facecolor='k', edgecolor='none') # type: ignore
 
-        if mm.DB is not None :
-            f_coast     = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_coast.json'    )
-            f_land      = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_land.json'     )
-            f_sea       = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_sea.json'      )
-            f_gridboxes = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_gridboxes.json')
-            f_gridlines = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_gridlines.json')
-        else :
-            f_coast, f_land, f_sea, f_gridboxes, f_gridlines = None, None, None, None, None
-
-        if f_coast is not None and os.path.exists (f_coast) :
-            coast_poly, coast_poly_shp = build_feat (f_coast    , facecolor='k'   ,
-                                                     edgecolor='none')
-        else :
-            coast_poly, coast_poly_shp = None, None
-        if f_land is not None and os.path.exists (f_land) :
-            land_poly , land_poly_shp  = build_feat (f_land     , facecolor='none',
-                                                     edgecolor='grey')
-        else :
-            land_poly , land_poly_shp  = None, None
-        if f_sea is not None and os.path.exists (f_sea) :
-            sea_poly  , sea_poly_shp   = build_feat (f_sea      , facecolor='none',
-                                                     edgecolor='grey')
-        else :
-            sea_poly  , sea_poly_shp   = None, None
-        if f_gridboxes is not None and os.path.exists (f_gridboxes) :
-            grid_poly , grid_poly_shp  = build_feat (f_gridboxes, facecolor='none',
-                                                     edgecolor='grey')
-        else :
-            grid_poly , grid_poly_shp  = None, None
-        if f_gridlines is not None and os.path.exists (f_gridlines) :
-            grid_line , grid_line_shp  = build_feat (f_gridlines, facecolor='k'   ,
-                                                     edgecolor='none')
-        else :
-            grid_line , grid_line_shp  = None, None
+        coast_poly, coast_poly_shp, land_poly, land_poly_shp, sea_poly, sea_poly_shp, \
+            grid_poly, grid_poly_shp, grid_line, grid_line_shp = self._features (mm, domain)
 
         # Defines the class components
 
-        self.domain   = domain
-        self.cfg_name = domain.cfg_name
-        self.CFG_name = domain.CFG_name
-        self.cd_cfg   = domain.cd_cfg
-        self.kk_cfg   = domain.kk_cfg
-        self.jpk      = domain.jpk
-        self.jpj      = domain.jpj
-        self.jpi      = domain.jpi
-        self.Iperio   = domain.Iperio
-        self.Jperio   = domain.Jperio
-        self.NFold    = domain.NFold
-        self.NFtype   = domain.NFtype
-        self.nperio   = domain.nperio
-        self.aperio   = domain.aperio
-        self.Halo     = domain.Halo
-        self.Cyclic   = domain.Cyclic
+        self._set_domain (domain)
 
         self.d_g = d_g
         self.d_e = d_e
@@ -1651,7 +1789,7 @@ class GridMask :
         self.gsinF   = gsinF
 
         self.atlmsk       = atlmsk
-        self.atlmsk_nomed = atlmsk
+        self.atlmsk_nomed = atlmsk_nomed
         self.pacmsk       = pacmsk
         self.indmsk       = indmsk
         self.ipcmsk       = ipcmsk
@@ -1703,6 +1841,197 @@ class GridMask :
         self.maskutil_F = maskutil_F
         self.maskutil_W = maskutil_W
 
+        self.packs      = {}
+
+        if zcache :
+            self._save_cache (zcache, Debug=Debug)
+
+    def _set_domain (self:Self, domain:Domain) -> None :
+        '''Copy the domain description'''
+        self.domain   = domain
+        self.cfg_name = domain.cfg_name
+        self.CFG_name = domain.CFG_name
+        self.cd_cfg   = domain.cd_cfg
+        self.kk_cfg   = domain.kk_cfg
+        self.jpk      = domain.jpk
+        self.jpj      = domain.jpj
+        self.jpi      = domain.jpi
+        self.Iperio   = domain.Iperio
+        self.Jperio   = domain.Jperio
+        self.NFold    = domain.NFold
+        self.NFtype   = domain.NFtype
+        self.nperio   = domain.nperio
+        self.aperio   = domain.aperio
+        self.Halo     = domain.Halo
+        self.Cyclic   = domain.Cyclic
+
+    @staticmethod
+    def _features (mm:libIGCM.sys.Config, domain:Domain) -> tuple :
+        '''Coast, land, sea and grid features for plots'''
+        if mm.DB is not None :
+            f_coast     = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_coast.json'    )
+            f_land      = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_land.json'     )
+            f_sea       = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_sea.json'      )
+            f_gridboxes = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_gridboxes.json')
+            f_gridlines = os.path.join (mm.DB, 'extras', f'{domain.cfg_name}_gridlines.json')
+        else :
+            f_coast, f_land, f_sea, f_gridboxes, f_gridlines = None, None, None, None, None
+
+        if f_coast is not None and os.path.exists (f_coast) :
+            coast_poly, coast_poly_shp = build_feat (f_coast    , facecolor='k'   ,
+                                                     edgecolor='none')
+        else :
+            coast_poly, coast_poly_shp = None, None
+        if f_land is not None and os.path.exists (f_land) :
+            land_poly , land_poly_shp  = build_feat (f_land     , facecolor='none',
+                                                     edgecolor='grey')
+        else :
+            land_poly , land_poly_shp  = None, None
+        if f_sea is not None and os.path.exists (f_sea) :
+            sea_poly  , sea_poly_shp   = build_feat (f_sea      , facecolor='none',
+                                                     edgecolor='grey')
+        else :
+            sea_poly  , sea_poly_shp   = None, None
+        if f_gridboxes is not None and os.path.exists (f_gridboxes) :
+            grid_poly , grid_poly_shp  = build_feat (f_gridboxes, facecolor='none',
+                                                     edgecolor='grey')
+        else :
+            grid_poly , grid_poly_shp  = None, None
+        if f_gridlines is not None and os.path.exists (f_gridlines) :
+            grid_line , grid_line_shp  = build_feat (f_gridlines, facecolor='k'   ,
+                                                     edgecolor='none')
+        else :
+            grid_line , grid_line_shp  = None, None
+
+        return ( coast_poly, coast_poly_shp, land_poly, land_poly_shp, sea_poly, sea_poly_shp,
+                 grid_poly, grid_poly_shp, grid_line, grid_line_shp )
+
+    def _save_cache (self:Self, zcache:str, Debug:bool=False) -> None :
+        '''
+        Write the processed arrays in the directory zcache, one NetCDF file per array.
+        Failures only print a warning : the GridMask is usable anyway
+        '''
+        push_stack ( f'GridMask._save_cache ({zcache=})' )
+        ztmp = f'{zcache}.{os.getpid ()}.tmp'
+        try :
+            os.makedirs (ztmp, exist_ok=True)
+            zvars = {}
+            for name in GRIDMASK_ARRAYS :
+                zvar = getattr (self, name, None)
+                if isinstance (zvar, xr.DataArray) :
+                    zvar.to_dataset (name=GRIDMASK_VARNAME).to_netcdf (os.path.join (ztmp, f'{name}.nc'))
+                    zvars[name] = None if zvar.name is None else str (zvar.name)
+            with open (os.path.join (ztmp, 'gridmask.json'), 'w', encoding='utf-8') as zfile :
+                json.dump ( {'version':GRIDMASK_CACHE_VERSION, 'CFG_name':self.CFG_name,
+                             'je':None if self.je is None else int (self.je),
+                             'variables':zvars, 'sources':self._sources}, zfile, indent=1 )
+            # A concurrent session never sees a partial cache
+            os.replace (ztmp, zcache)
+            if OPTIONS['Debug'] or Debug :
+                print ( f'GridMask : cache written in {zcache}' )
+        except (OSError, ValueError, TypeError) as err :
+            print ( f'===> Warning : GridMask : cache not written in {zcache} : {err}' )
+            shutil.rmtree (ztmp, ignore_errors=True)
+        pop_stack ( 'GridMask._save_cache' )
+
+    def _load_cache (self:Self, zcache:str, mm:libIGCM.sys.Config, domain:Domain,
+                     kw_uni:Dict, Debug:bool=False) -> None :
+        '''
+        Set up a GridMask from the cache directory zcache. Arrays and source
+        datasets are read on first access
+        '''
+        push_stack ( f'GridMask._load_cache ({zcache=})' )
+        with open (os.path.join (zcache, 'gridmask.json'), encoding='utf-8') as zfile :
+            zmeta = json.load (zfile)
+
+        self._set_domain (domain)
+        self.je    = zmeta['je']
+        self.packs = {}
+        self._lazy = {}
+        for name in GRIDMASK_ARRAYS :
+            if name in zmeta['variables'] :
+                self._lazy[name] = functools.partial (_read_cached_array, zcache, name,
+                                                      zmeta['variables'][name])
+            else :
+                setattr (self, name, None)
+        for name, target in GRIDMASK_ALIASES.items () :
+            self._lazy[name] = functools.partial (getattr, self, target)
+        for name, source in self._sources.items () :
+            if source is None :
+                setattr (self, name, None)
+            else :
+                self._lazy[name] = functools.partial (_read_grid_file, source, kw_uni)
+
+        coast_poly, coast_poly_shp, land_poly, land_poly_shp, sea_poly, sea_poly_shp, \
+            grid_poly, grid_poly_shp, grid_line, grid_line_shp = self._features (mm, domain)
+        self.coast_poly = coast_poly
+        self.land_poly  = land_poly
+        self.sea_poly   = sea_poly
+        self.grid_poly  = grid_poly
+        self.grid_line  = grid_line
+
+        self.coast_poly_shp = coast_poly_shp
+        self.land_poly_shp  = land_poly_shp
+        self.sea_poly_shp   = sea_poly_shp
+        self.grid_poly_shp  = grid_poly_shp
+        self.grid_line_shp  = grid_line_shp
+
+        if OPTIONS['Debug'] or Debug :
+            print ( f'GridMask : read from cache {zcache}' )
+        pop_stack ( 'GridMask._load_cache' )
+
+    def __getattr__ (self:Self, name:str) -> Any :
+        '''Arrays of a GridMask read from the cache are loaded on first access'''
+        zlazy = self.__dict__.get ('_lazy', {})
+        if name not in zlazy :
+            raise AttributeError ( f"'GridMask' object has no attribute {name!r}" )
+        zvalue = zlazy.pop (name) ()
+        setattr (self, name, zvalue)
+        return zvalue
+
+    def pack (self:Self, cd_type:CDTYPE_LITERAL|str='T', ndim:int=3) -> 'OceanPack' :
+        '''
+        Compact ocean-only storage on the mask of cd_type (see OceanPack)
+
+        ndim=3 uses the 3D mask when known (T and W points), ndim=2 the 2D
+        mask : the vertical dimension of the fields is then kept.
+        '''
+        zkey = (cd_type.upper (), ndim)
+        if zkey not in self.packs :
+            zmask = None
+            if ndim == 3 and cd_type.upper () in ['T', 'W'] :
+                zmask = self.mask_3T
+            if zmask is None :
+                zmask = getattr (self, f'mask_{cd_type.upper ()}')
+            if zmask is None :
+                raise ValueError ( f'GridMask.pack : no mask for {cd_type=}' )
+            self.packs[zkey] = OceanPack (zmask, cd_type=cd_type.upper (), domain=self.domain)
+        return self.packs[zkey]
+
+    def basins (self:Self, cd_type:CDTYPE_LITERAL|str='V',
+                names:Iterable[str]|None=None) -> xr.DataArray :
+        '''
+        Ocean basin masks stacked along a 'basin' dimension, with the global
+        ocean first : glo, atl, pac, ind, ipc, atl_nomed (when known)
+
+        Subbasins are defined on T points, and used as they are for the
+        points of type cd_type with the same indexes. Values are 1 or 0
+        '''
+        zmask  = getattr (self, f'mask_{cd_type.upper ()}')
+        zall   = { 'glo':zmask, 'atl':self.atlmsk, 'pac':self.pacmsk, 'ind':self.indmsk,
+                   'ipc':self.ipcmsk, 'atl_nomed':self.atlmsk_nomed }
+        if names is None :
+            names = [ name for name, zbas in zall.items () if zbas is not None ]
+        zbasins = []
+        for name in names :
+            if zall.get (name) is None :
+                raise ValueError ( f'GridMask.basins : unknown basin {name}' )
+            # Same indexes, on the points of the mask
+            zbas = zmask.copy (data=like_axes (zall[name], zmask).transpose (*zmask.dims).values)
+            zbasins.append (zbas.fillna (0.) * zmask.fillna (0.))
+        zbasins = xr.concat (zbasins, dim='basin').assign_coords (basin=list (names))
+        return zbasins
+
 @validate_types
 def essai ( a:int|float, b:Domain) :
     '''
@@ -1710,50 +2039,47 @@ def essai ( a:int|float, b:Domain) :
     '''
     return a, b.Halo
 
+@traced
 @validate_types
 def add_halo (domain:Domain, Debug:bool=False, stop_on_check:bool=False) -> Domain :
     '''
     Add halo to the domain
     '''
-    push_stack ('add_halo')
     zdom = domain.copy()
     zdom.add_halo (Debug=Debug, stop_on_check=stop_on_check)
-    pop_stack ('del_halo')
     return zdom
 
+@traced
 @validate_types
 def del_halo (domain, Debug:bool=False, stop_on_check:bool=False) -> Domain :
     '''
     Delete halo from the domain
     '''
-    push_stack ('add_halo')
     zdom = domain.copy()
     zdom.del_halo (Debug=Debug, stop_on_check=stop_on_check)
-    pop_stack ('del_halo')
     return zdom
 
+@traced
 @validate_types
 def add_cyclic (domain, Debug:bool=False, stop_on_check=False) -> Domain :
     '''
     Add cyclic to the domain
     '''
-    push_stack ('add_cyclic')
     zdom = domain.copy()
     zdom.add_cyclic (Debug=Debug, stop_on_check=stop_on_check)
-    pop_stack ('add_cyclic')
     return zdom
 
+@traced
 @validate_types
 def del_cyclic (domain, Debug:bool=False, stop_on_check:bool=False) -> Domain :
     '''
     Delete cyclic from the domain
     '''
-    push_stack ('del_cyclic')
     zdom = domain.copy()
     zdom.del_cyclic (Debug=Debug, stop_on_check=stop_on_check)
-    pop_stack ('del_cyclic')
     return zdom
 
+@traced
 @validate_types
 def get_shape (ptab:xr.DataArray) -> str :
     '''Get shape of ptab return a string with axes names
@@ -1763,134 +2089,163 @@ def get_shape (ptab:xr.DataArray) -> str :
     X is missing for on longitudinal slice
     etc ...
     '''
-    push_stack ( 'get_shape ( ptab )' )
     g_shape = ''
-    if find_axis (ptab, 'x')[0] :
+    zaxes   = find_axes (ptab)
+    if zaxes.x[0] :
         g_shape = 'X' + g_shape
-    if find_axis (ptab, 'y')[0] :
+    if zaxes.y[0] :
         g_shape = 'Y' + g_shape
-    if find_axis (ptab, 'z')[0] :
+    if zaxes.z[0] :
         g_shape = 'Z' + g_shape
-    if find_axis (ptab, 't')[0] :
+    if zaxes.t[0] :
         g_shape = 'T' + g_shape
 
-    pop_stack ( f'get_shape : {g_shape}' )
     return g_shape
 
-@validate_types
-def find_axis (ptab:xr.DataArray|xr.Dataset, axis:str|Literal['x', 'y', 'z', 't', 'yx', 'b']='z',
-               back:bool=True, Debug:bool=False) -> tuple[str|None, int|None] :
-    '''Returns name and name of the requested axis'''
-    push_stack ( f'find_axis ( ptab, {axis=}, {back=}' )
+## ============================================================================
+## Axis resolution
+##   The axes of an array only depend on the names of its dimensions and on the
+##   'axis' and 'units' attributes of the associated coordinates. find_axes
+##   resolves all axes at once from this signature, and the result is cached :
+##   arrays with the same dimensions share the same descriptor.
+
+AXIS_KINDS:tuple[str, ...] = ('x', 'y', 'z', 't', 'yx', 'b')
+
+class Axes (NamedTuple) :
+    '''
+    Names and positions of the axes of an array, as resolved by find_axes
+
+    Each axis is a tuple (name, index), index counted from the first dimension
+    '''
+    x    : tuple[str|None, int|None]
+    y    : tuple[str|None, int|None]
+    z    : tuple[str|None, int|None]
+    t    : tuple[str|None, int|None]
+    yx   : tuple[str|None, int|None]
+    b    : tuple[str|None, int|None]
+    ndim : int
+
+    def get (self:Self, axis:str='z', back:bool=True) -> tuple[str|None, int|None] :
+        '''Name and index of an axis, as returned by find_axis'''
+        ax, ix = getattr (self, axis_kind (axis))
+        if ix and back :
+            ix -= self.ndim
+        return ax, ix
+
+_AXIS_TABLES:dict[str, dict] = {}
+
+def _axis_tables () -> dict[str, dict] :
+    '''Kind of each axis name, and set of names and units of each kind'''
+    if not _AXIS_TABLES :
+        # Same precedence as the successive tests of the former find_axis
+        zkinds = (('x', XNAME, XUNIT), ('y', YNAME, YUNIT), ('z', ZNAME, ZUNIT),
+                  ('t', TNAME, TUNIT), ('b', BNAME, None), ('yx', YXNAME, None))
+        _AXIS_TABLES['kind'] = { zname:zkind for zkind, znames, _ in zkinds for zname in znames }
+        _AXIS_TABLES['rule'] = { zkind:(frozenset (znames), tuple (zunits) if zunits else None)
+                                 for zkind, znames, zunits in zkinds }
+    return _AXIS_TABLES
+
+def clear_axis_cache () -> None :
+    '''Clear the axis cache. Needed after a modification of XNAME, YNAME, XUNIT, ...'''
+    _AXIS_TABLES.clear ()
+    _resolve_axes.cache_clear ()
+
+def axis_kind (axis:str) -> str :
+    '''Kind of axis (one of AXIS_KINDS) from any known axis name'''
+    try :
+        return _axis_tables ()['kind'][axis]
+    except KeyError as err :
+        raise ValueError (f'Unknown axis {axis=}') from err
+
+def _axes_signature (ptab:xr.DataArray|xr.Dataset) -> tuple :
+    '''Dimension names, with 'axis' and 'units' attributes of their coordinates'''
+    zcoords = getattr (ptab, 'coords', None)
+    zsig = []
+    for dim in ptab.dims :
+        l_axis, l_units = None, None
+        if zcoords is not None and dim in zcoords :
+            zattrs = zcoords[dim].attrs
+            if 'axis' in zattrs :
+                l_axis = str (zattrs['axis'])
+            if 'units' in zattrs :
+                l_units = str (zattrs['units'])
+        zsig.append ((dim, l_axis, l_units))
+    return tuple (zsig)
+
+def _resolve_axis (signature:tuple, kind:str) -> tuple[str|None, int|None] :
+    '''Name and index of one kind of axis. When several dimensions match a rule, the last one wins'''
+    znames, zunits = _axis_tables ()['rule'][kind]
     ax:str|None = None
     ix:int|None = None
 
-    ax_name, unit_list, length = None, None, None
-
-    if axis in XNAME :
-        ax_name, unit_list, length   = XNAME , XUNIT, XLENGTH
-    if axis in YNAME :
-        ax_name, unit_list, length   = YNAME , YUNIT, YLENGTH
-    if axis in ZNAME :
-        ax_name, unit_list, length   = ZNAME , ZUNIT, ZLENGTH
-    if axis in TNAME :
-        ax_name, unit_list, length   = TNAME , TUNIT, None
-    if axis in BNAME :
-        ax_name, unit_list, length   = BNAME , None , None
-    if axis in YXNAME :
-        ax_name, unit_list, length   = YXNAME, None , None
+    # Rule 1 : by 'axis' attribute
+    for ii, (dim, l_axis, _) in enumerate (signature) :
+        if l_axis in ('X', 'Y', 'Z', 'T') and l_axis in znames :
+            ix, ax = ii, str (dim)
 
-    if OPTIONS['Debug'] or Debug :
-        if ax_name is not None :
-            print ( f'Working on axis found by name : {axis=} : {ax_name=} {unit_list=} {length=}' )
-
-    # Try by 'axis' attribute
-    # pylint: disable=too-many-nested-blocks
-    if ix is None :
-        if OPTIONS['Debug'] or Debug:
-            print ( 'ix not found - 1' )
-        for ii, dim in enumerate (ptab.dims):
-            if OPTIONS['Debug'] or Debug:
-                print ( f'{ii=} {dim=}' )
-            if 'coords' in dir(ptab) :
-                if 'axis' in ptab.coords[dim].attrs.keys() :
-                    l_axis = ptab.coords[dim].attrs['axis']
-                    if OPTIONS['Debug'] or Debug:
-                        print ( f'Rule 1 : Trying {ii=} {dim=} {l_axis=}' )
-                    if l_axis in ax_name and l_axis == str('X'):
-                        if OPTIONS['Debug'] or Debug:
-                            print ( 'Rule 1 : xaxis found by attribute : ',
-                                   f'{ax=} {l_axis=} {axis=} : {ax_name=} {l_axis=} {ii=} {dim=}' )
-                        ix, ax = ii, str(dim)
-                    if l_axis in ax_name and l_axis == str('Y'):
-                        if OPTIONS['Debug'] or Debug:
-                            print ( 'Rule 1 : yaxis found by attribute : ',
-                                   f'{ax=} {l_axis=} {axis=} : {ax_name=} {l_axis=} {ii=} {dim=}' )
-                        ix, ax = ii, str(dim)
-                    if l_axis in ax_name and l_axis == str('Z'):
-                        if OPTIONS['Debug'] or Debug:
-                            print ( 'Rule 1 : zaxis found by attribute : ',
-                                f'{ax=} {l_axis=} {axis=} : {ax_name=} {l_axis=} {ii=} {dim=}' )
-                        ix, ax = ii, str(dim)
-                    if l_axis in ax_name and l_axis == str('T') :
-                        if OPTIONS['Debug'] or Debug:
-                            print ( 'Rule 1 : taxis found by attribute : ',
-                                f'{ax=} {l_axis=} {axis=} : {ax_name=} {l_axis=} {ii=} {dim=}' )
-                        ix, ax = ii, str(dim)
-
-    # Try by name
-    if OPTIONS['Debug'] or Debug :
-        print ( 'Try by name')
+    # Rule 2 : by name
     if ix is None :
-        for ii, dim in enumerate (ptab.dims) :
-            if OPTIONS['Debug'] or Debug :
-                print ( f'{ii=} {dim=}' )
-            if dim in ax_name : # type: ignore
-                if OPTIONS['Debug'] or Debug :
-                    print ( f'Rule 2 : {dim=} axis found by name in : {ax_name=}' )
-                ix, ax = ii, str(dim)
-
-    # If not found, try by units
-    if ix is None  :
-        for ii, dim in enumerate (ptab.dims) :
-            if 'coords' in dir(ptab) :
-                if 'units' in ptab.coords[dim].attrs.keys() :
-                    zunit =  str(ptab.coords[dim].attrs['units'])
-                    if unit_list :
-                        for zname in unit_list :
-                            if zname in zunit :
-                                if OPTIONS['Debug'] or Debug :
-                                    print ( f'Rule 3 : {zname=} found by unit : ', \
-                                            f'{axis=} : {unit_list=} {ii=} {dim=}' )
-                                ix, ax = ii, str(dim)
-
-    # If dimension not found, try by length
-    if not ix :
-        if length is not None :
-            l_shape = list(ptab.sizes)
-            if OPTIONS['Debug'] or Debug :
-                print ( f'{l_shape=} {length=}')
-            for nn, ldim in enumerate (l_shape) :
-                if ldim in length :
-                    if OPTIONS['Debug'] or Debug :
-                        print (
-                            f'Rule 4 : {ax_name=} axis found by length : ',\
-                            f'{axis=} : {length=} {nn=} {ldim=}' )
-                    ix, ax = nn, None
+        for ii, (dim, _, _) in enumerate (signature) :
+            if dim in znames :
+                ix, ax = ii, str (dim)
+
+    # Rule 3 : by units
+    if ix is None and zunits :
+        for ii, (dim, _, l_units) in enumerate (signature) :
+            if l_units is not None :
+                for zunit in zunits :
+                    if zunit in l_units :
+                        ix, ax = ii, str (dim)
+
+    return ax, ix
+
+@functools.lru_cache (maxsize=512)
+def _resolve_axes (signature:tuple) -> Axes :
+    '''All axes from an array signature (cached)'''
+    return Axes (*[_resolve_axis (signature, zkind) for zkind in AXIS_KINDS],
+                 ndim=len (signature))
+
+def find_axes (ptab:xr.DataArray|xr.Dataset, Debug:bool=False) -> Axes :
+    '''
+    Resolve all axes of ptab at once
 
-    if ix and back :
-        ix -= len (ptab.dims)
+    Returns an Axes descriptor : zaxes.x, zaxes.y, ... are (name, index) tuples,
+    and zaxes.get ('x', back=True) gives the same result as find_axis (ptab, 'x')
+    '''
+    zsig  = _axes_signature (ptab)
+    zaxes = _resolve_axes (zsig)
+    if OPTIONS['Debug'] or Debug :
+        print ( f'find_axes : {zsig=} {zaxes=}' )
+    return zaxes
+
+def like_axes (ptab:xr.DataArray, ref:xr.DataArray|xr.Dataset,
+               kinds:Iterable[str]=('x', 'y', 'z')) -> xr.DataArray :
+    '''Rename the axes of ptab (of kinds) to the names of the same axes of ref'''
+    zaxes, zref = find_axes (ptab), find_axes (ref)
+    zrename = {}
+    for kind in kinds :
+        zold, znew = getattr (zaxes, kind)[0], getattr (zref, kind)[0]
+        if zold is not None and znew is not None and zold != znew :
+            zrename[zold] = znew
+    return ptab.rename (zrename) if zrename else ptab
 
-    pop_stack ( f'find_axis : {ax}, {ix}' )
+@validate_types
+def find_axis (ptab:xr.DataArray|xr.Dataset, axis:str|Literal['x', 'y', 'z', 't', 'yx', 'b']='z',
+               back:bool=True, Debug:bool=False) -> tuple[str|None, int|None] :
+    '''
+    Returns name and index of the requested axis
 
-    return str(ax) if ax else None, ix
+    Axes are found by 'axis' attribute of the coordinates, then by name, then
+    by units. See find_axes to get all axes at once.
+    '''
+    return find_axes (ptab, Debug=Debug).get (axis, back)
 
+@traced
 @validate_types
 def find_axis_bounds (ds:xr.DataArray|xr.Dataset, axis:str='z', Debug:bool=False) -> tuple :
     '''
     Find axis and associated bounds
     '''
-    push_stack ( f'find_axis_bounds ( ds, {axis=}' )
 
     ax, ix = find_axis (ds, axis)
     if OPTIONS['Debug'] or Debug :
@@ -1918,7 +2273,6 @@ def find_axis_bounds (ds:xr.DataArray|xr.Dataset, axis:str='z', Debug:bool=False
             if dim != ax :
                 bdim = dim
 
-    pop_stack ( f'find_axis_bounds : {ax=}, {ab=} {bdim=}' )
 
     return ax, ab, bdim
 
@@ -2205,22 +2559,20 @@ def build_bounds2d (glont:xr.DataArray|None=None, glatt:xr.DataArray|None=None,
 
     return None, None
 
+@traced
 @validate_types
 def close_bounds (blon:xr.DataArray, blat:xr.DataArray|None=None
                   ) -> tuple[xr.DataArray, xr.DataArray]|xr.DataArray :
     '''
     Close each polygon by adding the first point at the end of the polygon
     '''
-    push_stack ('close_bounds')
     ab, _ = find_axis ( blon, 'bnds')
     blon = xr.concat ( [blon, blon[{ab:-1}]], dim=ab )
     if blat is not None :
         ab, _ = find_axis ( blon, 'bnds')
         blat = xr.concat ( [blat, blat[{ab:-1}]], dim=ab )
-        pop_stack ('close_bounds : lon, lat' )
         return blon, blat
 
-    pop_stack ('close_bounds : lon' )
     return blon
 
 @validate_types
@@ -2249,6 +2601,7 @@ def build_bounds1d (b2d:xr.DataArray, Debug:bool=False) -> xr.DataArray :
 
     return bnds1d
 
+@traced
 @validate_types
 def fixed_lon (plon:xr.DataArray|None, center_lon:float=0.0,
                Debug:bool=False) -> xr.DataArray|None :
@@ -2261,7 +2614,6 @@ def fixed_lon (plon:xr.DataArray|None, center_lon:float=0.0,
     Designed by Phil Pelson.
     See https://gist.github.com/pelson/79cf31ef324774c97ae7
     '''
-    push_stack ( f'fixed_lon ( plon, {center_lon=}' )
 
     if plon is not None :
 
@@ -2308,9 +2660,9 @@ def fixed_lon (plon:xr.DataArray|None, center_lon:float=0.0,
     else :
         f_lon = None
 
-    pop_stack ( 'fixed_lon : f_lon' )
     return f_lon
 
+@traced
 @validate_types
 def unify_dims (dd:xr.DataArray|xr.Dataset|None=None,
                 x:str|None=None, y:str|None=None, z:str|None=None,
@@ -2320,7 +2672,6 @@ def unify_dims (dd:xr.DataArray|xr.Dataset|None=None,
     Rename dimensions to unify them between NEMO versions
     If xgrid is set, force to xgcm standard
     '''
-    push_stack ( f'unify_dims (dd, {x=}, {y=}, {z=}, {t=} {xgrid=} {use_xgcm=})' )
 
     if dd is not None :
         if xgrid is not None :
@@ -2492,9 +2843,9 @@ def unify_dims (dd:xr.DataArray|xr.Dataset|None=None,
                                 print ( f'{cc}{xg}', '->', f'{cc}_{fg}' )
                             dd = dd.rename ( {f'{cc}{xg}':f'{cc}_{fg}'})
 
-    pop_stack ( 'unify_dims : dd' )
     return dd
 
+@traced
 @validate_types
 def lbcu (ptab:xr.DataArray|xr.Dataset, x:str|None=None,
           y:str|None=None, z:str|None=None, t:str|None=None,
@@ -2513,7 +2864,6 @@ def lbcu (ptab:xr.DataArray|xr.Dataset, x:str|None=None,
     Performs both lbc and unify_dims operations
     See theses functions for details
     '''
-    push_stack ( f'lbcu (ptab, {btype=})' )
 
     if x or y or z or t or use_xgcm :
         ptab = unify_dims (ptab, x=x, y=y, z=z, t=t, xgrid=cd_type, use_xgcm=use_xgcm)
@@ -2601,7 +2951,6 @@ def lbcu (ptab:xr.DataArray|xr.Dataset, x:str|None=None,
         raise RuntimeError (
             f"ptab should be either xarray Dataset or DataArray. Type is {type(ptab)}")
 
-    pop_stack ('lbcu : ptab')
     return ptab
 
 @validate_types
@@ -2745,6 +3094,7 @@ def fill_bounds_lonlat (pbounds_lon:xr.DataArray, pbounds_lat:xr.DataArray,
     pop_stack ( 'fill_bounds_lonlat [void version]' )
     return pbounds_lon, pbounds_lat
 
+@traced
 @validate_types
 def jeq (plat:xr.DataArray, Debug=False) -> int :
     '''
@@ -2752,7 +3102,6 @@ def jeq (plat:xr.DataArray, Debug=False) -> int :
 
     lat : latitudes of the grid. At least 2D.
     '''
-    push_stack ( 'jeq (plat) ' )
     ay, jy = find_axis (plat, 'y')
     #ax, ix = find_axis (plat, 'x')
     if OPTIONS['Debug'] or Debug :
@@ -2766,9 +3115,9 @@ def jeq (plat:xr.DataArray, Debug=False) -> int :
     jj = int (np.nanmean (np.where (aa!=0, aa, np.nan))) + jmin
     jj = np.minimum ( jj, plat.sizes[ay]-1 )
 
-    pop_stack ( f'jeq : {jj}' )
     return jj
 
+@traced
 @validate_types
 def lon1d (plon:xr.DataArray, plat:xr.DataArray|None=None, Debug:bool=False,
            dim='x_c') -> xr.DataArray :
@@ -2778,7 +3127,6 @@ def lon1d (plon:xr.DataArray, plat:xr.DataArray|None=None, Debug:bool=False,
     plon : longitudes of the grid
     plat (optionnal) : latitudes of the grid
     '''
-    push_stack ( 'lon1d (plon, plat) ' )
 
     ax, _ = find_axis (plon, 'x', Debug=Debug)
     ay, _ = find_axis (plon, 'y', Debug=Debug)
@@ -2799,9 +3147,9 @@ def lon1d (plon:xr.DataArray, plat:xr.DataArray|None=None, Debug:bool=False,
                           'long_name':'Longitude'})
     if OPTIONS['Debug'] or Debug :
         print ( f'{lon_1d=}' )
-    pop_stack ( 'lon_1d' )
     return lon_1d
 
+@traced
 @validate_types
 def latreg (plat:xr.DataArray, diff:float=0.1, Debug:bool=False) -> tuple[int, float] :
     '''
@@ -2811,7 +3159,6 @@ def latreg (plat:xr.DataArray, diff:float=0.1, Debug:bool=False) -> tuple[int, f
     lat : latitudes of the grid (2D)
     diff [optional] : tolerance
     '''
-    push_stack ( f'latreg ( plat, {diff=}' )
 
 
     if OPTIONS['Debug'] or Debug :
@@ -2847,9 +3194,9 @@ def latreg (plat:xr.DataArray, diff:float=0.1, Debug:bool=False) -> tuple[int, f
     if OPTIONS['Debug'] or Debug :
         print ( f'{jreg=} {lareg=}')
 
-    pop_stack ( f'latreg : {jreg=}, {lareg=}' )
     return jreg, lareg
 
+@traced
 @validate_types
 def lat1d (plat:xr.DataArray, dim='y_c', Debug:bool=False) -> xr.DataArray :
     '''
@@ -2857,7 +3204,6 @@ def lat1d (plat:xr.DataArray, dim='y_c', Debug:bool=False) -> xr.DataArray :
 
     plat : latitudes of the grid (2D)
     '''
-    push_stack ( 'lat1d ( plat )' )
 
     ax, _ = find_axis (plat, 'x')
     ay, _ = find_axis (plat, 'y')
@@ -2912,9 +3258,9 @@ def lat1d (plat:xr.DataArray, dim='y_c', Debug:bool=False) -> xr.DataArray :
     lat_1d.attrs.update ( {'units':'degrees_north', 'standard_name':'latitude',
                            'long_name':'Latitude'})
 
-    pop_stack ( 'lat1d' )
     return lat_1d
 
+@traced
 @validate_types
 def latlon1d (plat:xr.DataArray, plon:xr.DataArray, dims=('y_c', 'x_c'),
               Debug:bool=False) -> tuple[xr.DataArray, xr.DataArray] :
@@ -2923,33 +3269,30 @@ def latlon1d (plat:xr.DataArray, plon:xr.DataArray, dims=('y_c', 'x_c'),
 
     plat, plon : latitudes and longitudes of the grid (2D)
     '''
-    push_stack ( 'latlon1d ( plat, plon) ' )
     zla = lat1d (plat, dim=dims[0], Debug=Debug)
     zlo = lon1d (plon, plat, dim=dims[1], Debug=Debug)
 
-    pop_stack ( 'latlon1d' )
     return zla, zlo
 
+@traced
 @validate_types
 def ff (plat:xr.DataArray) -> xr.DataArray :
     '''
     Returns Coriolis factor
     '''
-    push_stack ( 'ff ( plat )' )
     zff = ROMEGA * np.sin (RAD*plat)
-    pop_stack ('ff')
     return zff
 
+@traced
 @validate_types
 def beta (plat:xr.DataArray) -> xr.DataArray :
     '''
     Return Beta factor (derivative of Coriolis factor)
     '''
-    push_stack ( 'beta ( plat )' )
     zbeta = ROMEGA / RA * np.cos (RAD*plat)
-    pop_stack ( 'beta' )
     return zbeta
 
+@traced
 @validate_types
 def mask_lonlat (ptab:xr.DataArray, x0:xr.DataArray, x1:xr.DataArray,
                  y0:xr.DataArray, y1:xr.DataArray,
@@ -2957,7 +3300,6 @@ def mask_lonlat (ptab:xr.DataArray, x0:xr.DataArray, x1:xr.DataArray,
     '''
     Returns masked values outside a lat/lon box
     '''
-    push_stack ( f'mask_lonlat  (ptab, {x0=}, {x1=}, {y0=}, {y1=}, lon, lat, {sval=}' )
 
     zlon = lon.copy().to_masked_array()
     zlat = lat.copy().to_masked_array()
@@ -2969,9 +3311,9 @@ def mask_lonlat (ptab:xr.DataArray, x0:xr.DataArray, x1:xr.DataArray,
                 np.logical_and (zlon-360.>x0, zlon-360.<x1)))
     tab = xr.where (mask, ptab, sval)
 
-    pop_stack ( 'mask_lonlat' )
     return tab
 
+@traced
 @validate_types
 def extend (ptab:xr.DataArray, blon:bool=False, jplus:int=25, jpi:int|None=None,
             Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -2995,7 +3337,6 @@ def extend (ptab:xr.DataArray, blon:bool=False, jplus:int=25, jpi:int|None=None,
           the east side of the field
 
     '''
-    push_stack ( f'extend ( ptab, {blon=}, {jplus=}, {jpi=}, {aperio=}' )
     zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo,
                      Cyclic=Cyclic, aperio=aperio, domain=domain)
@@ -3038,7 +3379,6 @@ def extend (ptab:xr.DataArray, blon:bool=False, jplus:int=25, jpi:int|None=None,
                     new_coords.append ( ptab.coords[coord].values)
             tabex = xr.DataArray ( tabex, dims=ptab.dims, coords=new_coords )
 
-    pop_stack ( 'extend' )
     return tabex
 
 @validate_types
@@ -3104,6 +3444,153 @@ def orca2reg (dd:xr.DataArray, lat_name:str|None=None, lon_name:str|None=None,
     pop_stack ( 'orca2reg' )
     return zdd
 
+## ============================================================================
+## Lateral boundary conditions kernels
+##   For a given domain and grid point type, the north fold and east-west rules
+##   of lbc only move values from one point to another, with a change of sign
+##   for vectors. The rules are played once on an array of indexes : the
+##   resulting kernel gives, for each halo or fold point, the point it is
+##   copied from and the number of sign changes. Applying the kernel is one
+##   gather and one scatter on the underlying array.
+
+class LbcKernel (NamedTuple) :
+    '''
+    Gather/scatter indexes of the lateral boundary conditions, as built by lbc_kernel
+
+    Values are copied from (src_j, src_i) to (dst_j, dst_i), and multiplied
+    by psgn**nsgn
+    '''
+    dst_j : np.ndarray
+    dst_i : np.ndarray
+    src_j : np.ndarray
+    src_i : np.ndarray
+    nsgn  : np.ndarray
+    shape : tuple[int, int]
+
+    def apply (self:Self, zv:np.ndarray, psgn:Any=1) -> np.ndarray :
+        '''Apply in place on zv (horizontal dimensions last : [..., y, x])'''
+        zval = zv[..., self.src_j, self.src_i]
+        if psgn != 1 and self.nsgn.any () :
+            zval = zval * np.power (psgn, self.nsgn).astype (zv.dtype)
+        zv[..., self.dst_j, self.dst_i] = zval
+        return zv
+
+def _lbc_rules (jpi:int, cd_type:str|None, Iperio:bool, Halo:bool, NFold:bool, NFtype:str|None,
+                nemo_4U_bug:bool=False, has_y:bool=True) -> list[tuple] :
+    '''
+    Successive assignments of lbc, as (destination, source, sign change)
+
+    Destinations and sources are (j, i) numpy indexes. Same order as the
+    xarray engine of lbc
+    '''
+    zall = slice (None)
+    zew  = []
+    if Iperio and Halo :
+        zew = [ ((zall, 0), (zall, -2), 0), ((zall, -1), (zall, 1), 0) ]
+
+    zrules = list (zew)
+    if not has_y :
+        return zrules
+
+    if NFold and NFtype == 'T' and Halo : # North fold T-point pivot
+        if cd_type in [ 'T', 'W' ] :
+            zrules += [ ((-1, slice (1, None)), (-3, slice (-1, 0, -1)), 1),
+                        ((-1, 0)              , (-3, 2)                , 1),
+                        ((-2, slice (jpi//2, None)), (-2, slice (jpi//2, 0, -1)), 1) ]
+        if cd_type == 'U' :
+            zrules += [ ((-1, slice (0, -1)), (-3, slice (-1, 0, -1)), 1),
+                        ((-1,  0)           , (-3,  1)               , 1),
+                        ((-1, -1)           , (-3, -2)               , 1) ]
+            if nemo_4U_bug :
+                zrules += [ ((-2, slice (jpi//2+1, -1)), (-2, slice (jpi//2-2, 0, -1)), 1),
+                            ((-2, jpi//2-1)             , (-2, jpi//2)                  , 1) ]
+            else :
+                zrules += [ ((-2, slice (jpi//2-1, -1)), (-2, slice (jpi//2, 0, -1)), 1) ]
+        if cd_type == 'V' :
+            zrules += [ ((-2, slice (1, None)), (-3, slice (jpi-1, 0, -1)), 1),
+                        ((-1, slice (1, None)), (-4, slice (-1, 0, -1))   , 1),
+                        ((-1, 0)              , (-4, 2)                   , 1) ]
+        if cd_type == 'F' :
+            zrules += [ ((-2, slice (0, -1)), (-3, slice (-1, 0, -1)), 1),
+                        ((-1, slice (0, -1)), (-4, slice (-1, 0, -1)), 1),
+                        ((-1,  0)           , (-4,  1)               , 1),
+                        ((-1, -1)           , (-4, -2)               , 1) ]
+
+    if NFold and NFtype == 'T' and not Halo : # North fold T-point pivot
+        if cd_type in [ 'T', 'W' ] :
+            zrules += [ ((-1, slice (jpi//2, None)), (-1, slice (jpi//2, 0, -1)), 1) ]
+        if cd_type == 'U' :
+            zrules += [ ((-1, slice (jpi//2-1, -1)), (-1, slice (jpi//2, 0, -1)), 1) ]
+        if cd_type == 'V' :
+            zrules += [ ((-1, slice (1, None)), (-2, slice (jpi-1, 0, -1)), 1) ]
+        if cd_type == 'F' :
+            zrules += [ ((-1, slice (0, -1)), (-2, slice (-1, 0, -1)), 1) ]
+
+    if NFold and NFtype == 'F' and Halo : # North fold F-point pivot
+        if cd_type in [ 'T', 'W' ] :
+            zrules += [ ((-1, slice (0, None)), (-2, slice (-1, None, -1)), 1) ]
+        if cd_type == 'U' :
+            zrules += [ ((-1, slice (0, -1)), (-2, slice (-2, None, -1)), 1),
+                        ((zall, -1)         , (zall, 1)                 , 1) ]
+        if cd_type == 'V' :
+            zrules += [ ((-1, slice (0, None))    , (-3, slice (-1, None, -1))      , 1),
+                        ((-2, slice (jpi//2, None)), (-2, slice (jpi//2-1, None, -1)), 1) ]
+        if cd_type == 'F' :
+            zrules += [ ((-1, slice (0, -1))    , (-3, slice (-2, None, -1))      , 1),
+                        ((zall, -1)             , (zall, 1)                       , 1),
+                        ((-2, slice (jpi//2, -1)), (-2, slice (jpi//2-2, None, -1)), 1) ]
+
+    if NFold and NFtype == 'F' and not Halo : # North fold F-point pivot
+        if cd_type == 'V' :
+            zrules += [ ((-1, slice (jpi//2, None)), (-1, slice (jpi//2-1, None, -1)), 1) ]
+        if cd_type == 'F' :
+            zrules += [ ((-1, slice (jpi//2, -1)), (-1, slice (jpi//2-2, None, -1)), 1) ]
+
+    return zrules + zew
+
+@functools.lru_cache (maxsize=128)
+def _lbc_kernel (shape:tuple[int, int], jpi:int, cd_type:str|None, Iperio:bool, Halo:bool,
+                 NFold:bool, NFtype:str|None, nemo_4U_bug:bool=False,
+                 has_y:bool=True) -> LbcKernel :
+    '''Play the rules of lbc on an array of indexes (cached)'''
+    zind = np.arange (shape[0]*shape[1]).reshape (shape)
+    zsgn = np.zeros (shape, dtype=np.int8)
+    for zdst, zsrc, zflip in _lbc_rules (jpi, cd_type, Iperio, Halo, NFold, NFtype,
+                                         nemo_4U_bug, has_y) :
+        zind[zdst], zsgn[zdst] = zind[zsrc].copy (), zsgn[zsrc] + zflip
+
+    zdst = np.flatnonzero ((zind.ravel () != np.arange (zind.size)) | (zsgn.ravel () != 0))
+    dst_j, dst_i = np.divmod (zdst, shape[1])
+    src_j, src_i = np.divmod (zind.ravel ()[zdst], shape[1])
+    zkernel = LbcKernel (dst_j, dst_i, src_j, src_i, zsgn.ravel ()[zdst], shape)
+    for zarr in zkernel[:-1] :
+        zarr.flags.writeable = False
+    return zkernel
+
+def clear_lbc_cache () -> None :
+    '''Clear the cache of lbc kernels'''
+    _lbc_kernel.cache_clear ()
+
+def lbc_kernel (domain:Domain, cd_type:CDTYPE_LITERAL|str|None, shape:tuple[int, ...],
+                nemo_4U_bug:bool=False) -> LbcKernel :
+    '''
+    Kernel of lbc for a domain and a grid point type
+
+    shape : horizontal shape (jpj, jpi) of the arrays, or (jpi,) when
+            there is no y dimension
+    '''
+    has_y = len (shape) > 1
+    zshape = (int (shape[-2]), int (shape[-1])) if has_y else (1, int (shape[-1]))
+    return _lbc_kernel (zshape, int (domain.jpi), cd_type, bool (domain.Iperio), bool (domain.Halo),
+                        bool (domain.NFold), domain.NFtype, bool (nemo_4U_bug), has_y)
+
+def _lbc_apply (zv:np.ndarray, kernel:LbcKernel, psgn:Any=1, has_y:bool=True) -> np.ndarray :
+    '''Apply a kernel on a copy of zv. Used blockwise on dask arrays'''
+    zv = np.array (zv, copy=True)
+    kernel.apply (zv if has_y else zv[..., np.newaxis, :], psgn)
+    return zv
+
+@traced
 @validate_types
 def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float=1,
          nemo_4U_bug:bool=False,
@@ -3111,7 +3598,8 @@ def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float
          NFtype:Optional[NFTYPE_LITERAL]=None,
          Halo:bool|None=None, Cyclic:bool|None=None, aperio:int|float|None=None,
          nperio:int|None=None,
-         domain:Domain|None=None, Debug:bool=False) -> xr.DataArray|None :
+         domain:Domain|None=None, engine:Literal['kernel', 'xarray']='kernel',
+         inplace:bool=False, Debug:bool=False) -> xr.DataArray|None :
     '''
     Set periodicity on input field
 
@@ -3119,17 +3607,23 @@ def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float
     aperio    : Type of periodicity
     cd_type   : Grid specification : T, U, V or F
     psgn      : For change of sign for vector components (1 for scalars, -1 for vector components)
+    engine    : 'kernel' (default) applies a precomputed kernel (see lbc_kernel) with
+                one gather and one scatter, blockwise on dask arrays.
+                'xarray' is the original rule by rule algorithm
+    inplace   : with the kernel engine, modifies ptab in place (numpy arrays only)
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc ( ptab, {aperio=}, {cd_type=}, {psgn=}, {nemo_4U_bug=}' )
+    if engine not in ['kernel', 'xarray'] :
+        raise ValueError ( f'lbc : unknown {engine=}. Should be kernel or xarray' )
     zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold, NFtype=NFtype, Halo=Halo,
                      Cyclic=Cyclic, aperio=aperio, nperio=nperio, domain=domain)
     jpi    = zdom.jpi
-    ax, ix = find_axis (ptab, 'x')
-    ay, jy = find_axis (ptab, 'y')
+    zaxes  = find_axes (ptab)
+    ax, ix = zaxes.get ('x')
+    ay, jy = zaxes.get ('y')
     psgn   = ptab.dtype.type (psgn)
-    ayx, _ =  find_axis (ptab, 'yx')
+    ayx, _ = zaxes.get ('yx')
 
     stacked = ayx is not None
     if stacked :
@@ -3137,6 +3631,8 @@ def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float
         jpi = Domain (ptab=ztab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                       NFtype=NFtype, Halo=Halo, Cyclic=Cyclic, aperio=aperio,
                       nperio=nperio, domain=domain).jpi
+    elif engine == 'kernel' and inplace and ptab.chunks is None :
+        ztab  = ptab.load ()
     else :
         ztab  = ptab.copy ()
 
@@ -3154,7 +3650,29 @@ def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float
         print (f'{jpi=} {zdom.Iperio=} {zdom.Jperio=} {zdom.NFold=} {zdom.NFtype=}',
                f'{zdom.Halo=} {ax=} {ay=} {ix=} {jy=}')
 
-    if ax :
+    if engine == 'kernel' :
+        if stacked :
+            ax, _ = find_axes (ztab).get ('x')
+            ay, _ = find_axes (ztab).get ('y')
+        if ax :
+            zcore   = [ay, ax] if ay else [ax]
+            zkernel = _lbc_kernel ( (ztab.sizes[ay], ztab.sizes[ax]) if ay else (1, ztab.sizes[ax]),
+                                    int (jpi), cd_type, bool (zdom.Iperio), bool (zdom.Halo),
+                                    bool (zdom.NFold), zdom.NFtype, bool (nemo_4U_bug), bool (ay))
+            if ztab.chunks is not None :
+                zdims = ztab.dims
+                ztab  = xr.apply_ufunc (
+                    _lbc_apply, ztab.chunk ({dim:-1 for dim in zcore}),
+                    kwargs={'kernel':zkernel, 'psgn':psgn, 'has_y':bool (ay)},
+                    input_core_dims=[zcore], output_core_dims=[zcore],
+                    dask='parallelized', output_dtypes=[ztab.dtype], keep_attrs=True ).transpose (*zdims)
+            else :
+                ztab.load ()
+                zv = np.moveaxis (ztab.data, [ztab.dims.index (dim) for dim in zcore],
+                                  list (range (-len (zcore), 0)))
+                zkernel.apply (zv if ay else zv[..., np.newaxis, :], psgn)
+
+    elif ax :
         #
         #> East-West boundary conditions
         # ------------------------------
@@ -3297,9 +3815,51 @@ def lbc (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float
     if stacked :
         ztab = stack_yx (ztab)
 
-    pop_stack ( 'lbc' )
     return ztab
 
+def CheckLbcEngine (ntime:int=3, seed:int=0, Debug:bool=False) -> int :
+    '''
+    Check of the kernel engine of lbc against the xarray engine
+
+    For ORCA like domains with T and F pivots, with and without halo, checks
+    all grid point types and signs, on numpy and dask arrays, and in place.
+
+    Returns the number of mismatches (printed)
+    '''
+    rng    = np.random.default_rng (seed)
+    nerror = 0
+    for jpj, jpi, NFtype, Halo in [ (149, 182, 'T', True ), (147, 180, 'T', False),
+                                    (332, 362, 'F', True ), (331, 360, 'F', False) ] :
+        zdom = Domain (jpi=jpi, jpj=jpj, Iperio=True, Jperio=False, NFold=True,
+                       NFtype=NFtype, Halo=Halo)
+        ptab = xr.DataArray (rng.random ((ntime, jpj, jpi)), dims=('time_counter', 'y', 'x'))
+        for cd_type in [ 'T', 'U', 'V', 'F', 'W' ] :
+            for psgn in [ 1., -1. ] :
+                for nemo_4U_bug in [ False, True ] :
+                    zref  = lbc (ptab, cd_type=cd_type, psgn=psgn, nemo_4U_bug=nemo_4U_bug,
+                                 domain=zdom, engine='xarray')
+                    zargs = { 'cd_type':cd_type, 'psgn':psgn, 'nemo_4U_bug':nemo_4U_bug,
+                              'domain':zdom, 'engine':'kernel' }
+                    checks = [
+                        ('numpy'     , lbc (ptab, **zargs)),
+                        ('transposed', lbc (ptab.transpose ('x', 'time_counter', 'y'),
+                                            **zargs).transpose (*ptab.dims)),
+                        ('dask'      , lbc (ptab.chunk ({'time_counter':1}), **zargs).compute ()),
+                        ('inplace'   , lbc (ptab.copy (), inplace=True, **zargs)), ]
+                    for name, new in checks :
+                        if not np.array_equal (new.values, zref.values) :
+                            nerror += 1
+                            print ( f'CheckLbcEngine : {jpj=} {jpi=} {NFtype=} {Halo=} {cd_type=} '
+                                    f'{psgn=} {nemo_4U_bug=} {name} : '
+                                    f'{int ((new.values != zref.values).sum ())} point(s) differ' )
+                        elif OPTIONS['Debug'] or Debug :
+                            print ( f'CheckLbcEngine : {jpj=} {jpi=} {NFtype=} {Halo=} {cd_type=} '
+                                    f'{psgn=} {nemo_4U_bug=} {name} : ok' )
+
+    print ( f'CheckLbcEngine : {nerror} mismatch(es)' )
+    return nerror
+
+@traced
 @validate_types
 def lbc_mask (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None='T', sval:float=np.nan,
               Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -3316,7 +3876,6 @@ def lbc_mask (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None='T', sval:
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc_mask (ptab, {cd_type=}, {sval=}' )
 
     if ptab is not None :
 
@@ -3324,9 +3883,10 @@ def lbc_mask (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None='T', sval:
                          NFtype=NFtype, Halo=Halo, Cyclic=Cyclic, aperio=aperio,
                          nperio=nperio, domain=domain)
         jpi    = zdom.jpi
-        ax, _ = find_axis (ptab, 'x')
-        ay, _ = find_axis (ptab, 'y')
-        ayx, _ = find_axis (ptab, 'yx')
+        zaxes  = find_axes (ptab)
+        ax, _  = zaxes.get ('x')
+        ay, _  = zaxes.get ('y')
+        ayx, _ = zaxes.get ('yx')
 
         stacked = ayx is not None
         if stacked :
@@ -3428,9 +3988,9 @@ def lbc_mask (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None='T', sval:
     else :
         ztab = None
 
-    pop_stack ( 'lbc_mask' )
     return ztab
 
+@traced
 @validate_types
 def lbc_plot (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T',
               psgn:int|float=1, sval:float=np.nan,
@@ -3452,7 +4012,6 @@ def lbc_plot (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T',
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc_plot (ptab, {aperio=}, {cd_type=}, {psgn=}, {sval=}' )
 
     if ptab is not None :
 
@@ -3460,10 +4019,11 @@ def lbc_plot (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T',
                          NFtype=NFtype, Halo=Halo,
                          Cyclic=Cyclic, aperio=aperio, nperio=nperio, domain=domain)
         jpi    = zdom.jpi
-        ax, _ = find_axis (ptab, 'x')
-        ay, _ = find_axis (ptab, 'y')
+        zaxes  = find_axes (ptab)
+        ax, _  = zaxes.get ('x')
+        ay, _  = zaxes.get ('y')
         psgn   = ptab.dtype.type (psgn)
-        ayx, _ =  find_axis (ptab, 'yx')
+        ayx, _ = zaxes.get ('yx')
 
         stacked = ayx is not None
         if stacked :
@@ -3561,9 +4121,9 @@ def lbc_plot (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T',
     else :
         ztab = None
 
-    pop_stack ( 'lbc_plot' )
     return ztab
 
+@traced
 @validate_types
 def lbc_add (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float=1,
              Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -3582,16 +4142,16 @@ def lbc_add (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None, psgn:
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc_add ( ptab, {aperio=}, {cd_type=}, {psgn=} )' )
 
     if ptab is not None :
 
         zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                          NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                          aperio=aperio, nperio=nperio, domain=domain)
-        ax, ix = find_axis (ptab, 'x')
-        ay, jy = find_axis (ptab, 'y')
-        ayx, _ =  find_axis (ptab, 'yx')
+        zaxes  = find_axes (ptab)
+        ax, ix = zaxes.get ('x')
+        ay, jy = zaxes.get ('y')
+        ayx, _ = zaxes.get ('yx')
 
         stacked = ayx is not None
         if stacked :
@@ -3653,9 +4213,9 @@ def lbc_add (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None, psgn:
     else :
         ztab_ext = None
 
-    pop_stack ( 'lbc_add' )
     return ztab_ext
 
+@traced
 @validate_types
 def lbc_add_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None, psgn:int|float=1,
             Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -3665,18 +4225,18 @@ def lbc_add_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None
     '''
     Add 1 row at the east of the domain for nice plots
     '''
-    push_stack ( f'lbc_add ( ptab, {aperio=}, {cd_type=}, {psgn=} )' )
 
     if ptab is not None :
 
         zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                          NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                          aperio=aperio, nperio=nperio, domain=domain)
-        ax, ix = find_axis (ptab, 'x')
-        ay, _ = find_axis (ptab, 'y')
+        zaxes  = find_axes (ptab)
+        ax, ix = zaxes.get ('x')
+        ay, _  = zaxes.get ('y')
         psgn   = ptab.dtype.type (psgn)
         ztab_ext = ptab
-        ayx, _ = find_axis (ptab, 'yx')
+        ayx, _ = zaxes.get ('yx')
 
         stacked = ayx is not None
         if stacked :
@@ -3721,9 +4281,9 @@ def lbc_add_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str|None=None
     else :
         ztab_ext = None
 
-    pop_stack ( 'lbc_add' )
     return ztab_ext
 
+@traced
 @validate_types
 def lbc_del (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn:int|float=1,
              Iperio:bool|None=None, Jperio:bool|None=None,
@@ -3742,7 +4302,6 @@ def lbc_del (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn:int|fl
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc_del (ptab, {aperio=}, {cd_type=}, {psgn=}' )
 
     if ptab is not None :
 
@@ -3750,10 +4309,11 @@ def lbc_del (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn:int|fl
         zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                          NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                          aperio=aperio, nperio=nperio, domain=domain)
-        ax, ix = find_axis (ptab, 'x')
-        ay, jy = find_axis (ptab, 'y')
+        zaxes  = find_axes (ptab)
+        ax, ix = zaxes.get ('x')
+        ay, jy = zaxes.get ('y')
         psgn   = ptab.dtype.type (psgn)
-        ayx, _ = find_axis (ptab, 'yx')
+        ayx, _ = zaxes.get ('yx')
         stacked = ayx is not None
         if zdebug :
             print (f"{ax=} {ix=} {ay=} {jy=} {ayx=} {stacked=}", \
@@ -3795,9 +4355,9 @@ def lbc_del (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn:int|fl
     else :
         ztab = None
 
-    pop_stack ( 'lbc_del' )
     return ztab
 
+@traced
 @validate_types
 def lbc_del_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn:int|float=1,
             Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -3807,7 +4367,6 @@ def lbc_del_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn
     '''
     Remove eastern most row
     '''
-    push_stack ( f'lbc_del_cyclic (ptab, {domain=}, {cd_type=}, {psgn=}' )
 
     if ptab is not None :
 
@@ -3839,9 +4398,9 @@ def lbc_del_cyclic (ptab:xr.DataArray|None, cd_type:CDTYPE_LITERAL|str='T', psgn
     else :
         ztab = None
 
-    pop_stack ( 'lbc_del_cyclic' )
     return ztab
 
+@traced
 @validate_types
 def lbc_todom (ptab:xr.DataArray, dst_dom:Domain, src_dom:Domain|None=None,
                cd_type:CDTYPE_LITERAL|str='T',
@@ -3857,7 +4416,6 @@ def lbc_todom (ptab:xr.DataArray, dst_dom:Domain, src_dom:Domain|None=None,
     See NEMO documentation for further details
     '''
 
-    push_stack ( f'lbc_todom (ptab, {dst_dom=}, {src_dom=}, {cd_type=}, {psgn=}' )
 
     z_src_dom = Domain (ptab=ptab, domain=src_dom)
     ztab = ptab
@@ -3872,9 +4430,9 @@ def lbc_todom (ptab:xr.DataArray, dst_dom:Domain, src_dom:Domain|None=None,
     elif     z_src_dom.Halo == dst_dom.Halo and z_src_dom.Cyclic == dst_dom.Cyclic :
         ztab = lbc (ptab, domain=z_src_dom, cd_type=cd_type, psgn=psgn)
 
-    pop_stack ( 'lbc_todom' )
     return ztab
 
+@traced
 @validate_types
 def lbc_index (jj:int, ii:int, jpj:int, jpi:int, cd_type:CDTYPE_LITERAL|str='T',
                Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -3892,7 +4450,6 @@ def lbc_index (jj:int, ii:int, jpj:int, jpi:int, cd_type:CDTYPE_LITERAL|str='T',
 
     See NEMO documentation for further details
     '''
-    push_stack ( f'lbc_index ( {jj=}, {ii=}, {jpj=}, {jpi=}, {aperio=}, {cd_type=} )' )
     zdom = Domain (jpi=jpi, jpj=jpj, Iperio=Iperio, Jperio=Jperio, NFold=NFold, NFtype=NFtype,
                         Halo=Halo, Cyclic=Cyclic,
                         aperio=aperio, nperio=nperio, domain=domain)
@@ -3911,10 +4468,8 @@ def lbc_index (jj:int, ii:int, jpj:int, jpi:int, cd_type:CDTYPE_LITERAL|str='T',
         ix = xr.where (ix== 1 ,jpi-1, ix)
 
     def mod_ij (cond, jy_new, ix_new) :
-        push_stack ( 'mod_ij (cond, jy_new, ix_new)' )
         jy_r = xr.where (cond, jy_new, jy)
         ix_r = xr.where (cond, ix_new, ix)
-        pop_stack ( 'mod_ij' )
         return jy_r, ix_r
     #
     #> North-South boundary conditions
@@ -3974,7 +4529,6 @@ def lbc_index (jj:int, ii:int, jpj:int, jpi:int, cd_type:CDTYPE_LITERAL|str='T',
     if isinstance (ix, list) :
         ix = ix[0]
 
-    pop_stack ( f'lbc_index = {jy}, {ix}' )
     return jy, ix
 
 @validate_types
@@ -4082,11 +4636,335 @@ def unstack_yx (ptab, yxdim=None, domain=None, xdim=None, ydim=None,
 
     return ztab
 
+## ============================================================================
+## Compact ocean-only storage
+##   About a third of the ORCA grid points are land. An OceanPack keeps the
+##   index of the wet points of a mask, level by level, and gathers fields on
+##   them : a [t, z, y, x] field is stored as a [t, oce_point] array. Wet points
+##   are kept in the (z, y, x) memory order, so that zonal and level sums are
+##   sums over contiguous runs of points (np.add.reduceat).
+
+OCE_POINT = 'oce_point'
+
+def _runs (ids:np.ndarray) -> tuple[np.ndarray, np.ndarray] :
+    '''Start of each run of equal values in the sorted array ids, and value of the run'''
+    if len (ids) == 0 :
+        return np.zeros (0, dtype=np.intp), np.zeros (0, dtype=ids.dtype)
+    zstart = np.flatnonzero (np.concatenate (([True], ids[1:] != ids[:-1])))
+    return zstart, ids[zstart]
+
+def _pack_numpy (zv:np.ndarray, index:np.ndarray, ncore:int) -> np.ndarray :
+    '''Gather the points index of the ncore last (flattened) dimensions'''
+    return zv.reshape (zv.shape[:zv.ndim-ncore] + (-1,))[..., index]
+
+def _unpack_numpy (zv:np.ndarray, index:np.ndarray, shape:tuple, sval:Any) -> np.ndarray :
+    '''Scatter the last dimension of zv on the points index of an array of shape (..., *shape)'''
+    zdtype = np.result_type (zv.dtype, np.min_scalar_type (sval))
+    zout   = np.full (zv.shape[:-1] + (int (np.prod (shape)),), sval, dtype=zdtype)
+    zout[..., index] = zv
+    return zout.reshape (zv.shape[:-1] + tuple (shape))
+
+def _runs_sum (zv:np.ndarray, starts:np.ndarray, rows:np.ndarray, shape:tuple,
+               min_count:int=1) -> np.ndarray :
+    '''
+    Sum of zv over runs of points along the last dimension, nan values skipped
+
+    Run n goes to row rows[n] of the result, of shape (..., *shape). Rows
+    without points are nan
+    '''
+    zout = np.full (zv.shape[:-1] + (int (np.prod (shape)),), np.nan,
+                    dtype=np.result_type (zv.dtype, np.float32))
+    if len (starts) > 0 :
+        znan = np.isnan (zv)
+        zsum = np.add.reduceat (np.where (znan, 0, zv), starts, axis=-1)
+        zcnt = np.add.reduceat (~znan, starts, axis=-1)
+        zout[..., rows] = np.where (zcnt >= min_count, zsum, np.nan)
+    return zout.reshape (zv.shape[:-1] + tuple (shape))
+
+class OceanPack :
+    '''
+    Index of the wet points of a mask, to store fields on ocean points only
+
+       zpack = grid.pack ('T')                      # or OceanPack (grid.mask_3T)
+       ctab  = zpack.pack (thetao)                  # [time_counter, oce_point]
+       ttab  = zpack.unpack (ctab)                  # [time_counter, z, y, x]
+       heat  = zpack.integral (ctab, grid.e1t*grid.e2t*grid.e3t)
+
+    mask    : 2D (y, x) or 3D (z, y, x) mask. Wet points have a finite and
+              positive mask value (1 or nan, or 1 or 0)
+    cd_type : grid point type of the mask, used when filling halos
+    dim     : name of the packed dimension
+
+    With a 2D mask, the vertical dimension of the fields, if any, is kept
+    '''
+    def __init__ (self:Self, mask:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T',
+                  domain:Domain|None=None, dim:str=OCE_POINT, Debug:bool=False) -> None :
+        push_stack ( f'OceanPack.__init__ (mask, {cd_type=}, {dim=})' )
+        zaxes = find_axes (mask)
+        ax, ay, az = zaxes.x[0], zaxes.y[0], zaxes.z[0]
+        if ax is None or ay is None :
+            raise ValueError ( f'OceanPack : mask should have x and y dimensions. {mask.dims=}' )
+
+        self.dims    = tuple (zdim for zdim in (az, ay, ax) if zdim is not None)
+        self.kinds   = ('z', 'y', 'x')[3-len (self.dims):]
+        self.cd_type = cd_type
+        self.dim     = dim
+        self.domain  = domain
+        self.coords  = { zdim:mask.coords[zdim] for zdim in self.dims if zdim in mask.coords }
+
+        zmask = mask.transpose (*self.dims).values
+        with np.errstate (invalid='ignore') :
+            zwet = np.isfinite (zmask) & (zmask > 0)
+        self.shape = zwet.shape
+        zindex     = np.flatnonzero (zwet)
+        self.index = zindex.astype (np.int32 if zwet.size < 2**31 else np.int64)
+
+        # Runs of points on the same (z, y) row, and on the same level
+        self.row_start, self.rows = _runs (zindex // self.shape[-1])
+        self.lev_start, self.levs = _runs (zindex // (self.shape[-1]*self.shape[-2]))
+
+        if OPTIONS['Debug'] or Debug :
+            print ( f'OceanPack : {self!r}' )
+        pop_stack ( 'OceanPack.__init__' )
+
+    @property
+    def size (self:Self) -> int :
+        '''Number of wet points'''
+        return len (self.index)
+
+    @property
+    def fraction (self:Self) -> float :
+        '''Fraction of the points that are stored'''
+        return self.size / max (1, int (np.prod (self.shape)))
+
+    def __repr__ (self:Self) -> str :
+        return ( f'OceanPack (cd_type={self.cd_type!r}, dims={self.dims}, shape={self.shape}, '
+                 f'size={self.size}, fraction={self.fraction:.3f})' )
+
+    def _core_dims (self:Self, ptab:xr.DataArray) -> list[str] :
+        '''Dimensions of ptab matching the dimensions of the mask'''
+        zaxes = find_axes (ptab)
+        zcore = [ getattr (zaxes, kind)[0] for kind in self.kinds ]
+        if None in zcore :
+            raise ValueError ( f'OceanPack : {ptab.dims=} does not match the mask {self.dims=}' )
+        zshape = tuple (ptab.sizes[zdim] for zdim in zcore)
+        if zshape != self.shape :
+            raise ValueError ( f'OceanPack : shape {zshape} of {zcore} does not match the mask {self.shape}' )
+        return zcore # type: ignore
+
+    def is_packed (self:Self, ptab:xr.DataArray) -> bool :
+        '''True if ptab is stored on the wet points'''
+        return self.dim in ptab.dims
+
+    def pack (self:Self, ptab:xr.DataArray) -> xr.DataArray :
+        '''Keep the wet points of ptab. Already packed arrays are returned as they are'''
+        if self.is_packed (ptab) :
+            return ptab
+        push_stack ( 'OceanPack.pack (ptab)' )
+        zcore = self._core_dims (ptab)
+        if ptab.chunks is not None :
+            ptab = ptab.chunk ({zdim:-1 for zdim in zcore})
+        ztab = xr.apply_ufunc (
+            _pack_numpy, ptab, kwargs={'index':self.index, 'ncore':len (zcore)},
+            input_core_dims=[zcore], output_core_dims=[[self.dim]],
+            dask='parallelized', output_dtypes=[ptab.dtype],
+            dask_gufunc_kwargs={'output_sizes':{self.dim:self.size}}, keep_attrs=True )
+        pop_stack ( 'OceanPack.pack' )
+        return ztab
+
+    def unpack (self:Self, ctab:xr.DataArray, sval:Any=np.nan, psgn:int|float=1,
+                halo:Literal['keep', 'lbc', 'del']='keep') -> xr.DataArray :
+        '''
+        Expand a packed array back to the grid. Land points get sval
+
+        halo : 'keep' gives the layout of the mask, 'lbc' fills the halo
+               points with lbc, 'del' removes the halo (lbc_del)
+        '''
+        push_stack ( f'OceanPack.unpack (ctab, {sval=}, {psgn=}, {halo=})' )
+        if ctab.chunks is not None :
+            ctab = ctab.chunk ({self.dim:-1})
+        ztab = xr.apply_ufunc (
+            _unpack_numpy, ctab, kwargs={'index':self.index, 'shape':self.shape, 'sval':sval},
+            input_core_dims=[[self.dim]], output_core_dims=[list (self.dims)],
+            dask='parallelized', output_dtypes=[np.result_type (ctab.dtype, np.min_scalar_type (sval))],
+            dask_gufunc_kwargs={'output_sizes':dict (zip (self.dims, self.shape))}, keep_attrs=True )
+        ztab = ztab.assign_coords (self.coords)
+        if halo == 'lbc' :
+            ztab = lbc (ztab, cd_type=self.cd_type, psgn=psgn, domain=self.domain)
+        elif halo == 'del' :
+            ztab = lbc_del (ztab, cd_type=self.cd_type, psgn=psgn, domain=self.domain)
+        elif halo != 'keep' :
+            raise ValueError ( f'OceanPack.unpack : unknown {halo=}' )
+        pop_stack ( 'OceanPack.unpack' )
+        return ztab
+
+    def _reduce (self:Self, ctab:xr.DataArray, starts:np.ndarray, rows:np.ndarray,
+                 dims:tuple, min_count:int=1) -> xr.DataArray :
+        '''Sum over runs of wet points, on dask chunks independently'''
+        ctab   = self.pack (ctab)
+        if ctab.chunks is not None :
+            ctab = ctab.chunk ({self.dim:-1})
+        zsizes = { zdim:self.shape[self.dims.index (zdim)] for zdim in dims }
+        ztab   = xr.apply_ufunc (
+            _runs_sum, ctab, kwargs={'starts':starts, 'rows':rows,
+                                     'shape':tuple (zsizes.values ()), 'min_count':min_count},
+            input_core_dims=[[self.dim]], output_core_dims=[list (dims)],
+            dask='parallelized', output_dtypes=[np.result_type (ctab.dtype, np.float32)],
+            dask_gufunc_kwargs={'output_sizes':zsizes}, keep_attrs=True )
+        return ztab.assign_coords ({ zdim:self.coords[zdim] for zdim in dims if zdim in self.coords })
+
+    def zonal_sum (self:Self, ctab:xr.DataArray, min_count:int=1) -> xr.DataArray :
+        '''Sum along x : result on (z, y), or (y) with a 2D mask'''
+        return self._reduce (ctab, self.row_start, self.rows, self.dims[:-1], min_count)
+
+    def grid_zonal_sum (self:Self, ptab:xr.DataArray, min_count:int=1) -> xr.DataArray :
+        '''
+        Sum along x of an array on the grid, land points included, on the
+        dimensions of zonal_sum. A packed array has lost its land points :
+        zonal_sum is used
+        '''
+        if self.is_packed (ptab) :
+            return self.zonal_sum (ptab, min_count)
+        zcore = self._core_dims (ptab)
+        ztab  = ptab.sum (dim=zcore[-1], min_count=min_count, keep_attrs=True)
+        return ztab.rename ({ zold:znew for zold, znew in zip (zcore[:-1], self.dims[:-1])
+                              if zold != znew })
+
+    def level_sum (self:Self, ctab:xr.DataArray, min_count:int=1) -> xr.DataArray :
+        '''Horizontal sum on each level. With a 2D mask, same as sum'''
+        if len (self.dims) < 3 :
+            return self.sum (ctab, min_count)
+        return self._reduce (ctab, self.lev_start, self.levs, self.dims[:1], min_count)
+
+    def sum (self:Self, ctab:xr.DataArray, min_count:int=1) -> xr.DataArray :
+        '''Sum over all wet points'''
+        return self.pack (ctab).sum (dim=self.dim, min_count=min_count, keep_attrs=True)
+
+    def integral (self:Self, ctab:xr.DataArray, weights:xr.DataArray, per_level:bool=False) -> xr.DataArray :
+        '''Area or volume integral of ctab, weights being the area or volume of the cells'''
+        zprod = self.pack (ctab) * self.pack (weights)
+        return self.level_sum (zprod) if per_level else self.sum (zprod)
+
+    def mean (self:Self, ctab:xr.DataArray, weights:xr.DataArray, per_level:bool=False) -> xr.DataArray :
+        '''Area or volume weighted mean of ctab. nan values of ctab are skipped'''
+        ctab, weights = self.pack (ctab), self.pack (weights)
+        weights = weights.where (np.isfinite (ctab), 0.)
+        if per_level :
+            zsum, zwei = self.level_sum (ctab*weights), self.level_sum (weights)
+        else :
+            zsum, zwei = self.sum (ctab*weights), self.sum (weights)
+        return zsum / zwei.where (zwei > 0.)
+
+class GridIndex :
+    '''
+    Spatial index of a grid, to find the grid points closest to given points
+
+    Built once per grid : a cKDTree on the cartesian coordinates of the grid
+    points on the unit sphere. The nearest point for the chord distance is
+    also the nearest for the great circle distance.
+    If mask is given, only non masked grid points (i.e with mask=1) are indexed
+
+    See grid_index to get an index cached for a nemo.Domain
+    '''
+    def __init__ (self:Self, lat_grid:xr.DataArray, lon_grid:xr.DataArray,
+                  mask:float|xr.DataArray=1.0) -> None :
+        push_stack ( 'GridIndex.__init__ ( lat_grid, lon_grid, mask )' )
+
+        if len (lon_grid.shape) == 2 :
+            self.ay, _ = find_axis (lon_grid, 'y')
+            self.ax, _ = find_axis (lon_grid, 'x')
+            zlon = np.asarray (lon_grid.values, dtype=np.float64)
+            zlat = np.asarray (lat_grid.values, dtype=np.float64)
+        else :
+            self.ay, _ = find_axis (lat_grid, 'y')
+            self.ax, _ = find_axis (lon_grid, 'x')
+            zlon, zlat = np.meshgrid (np.asarray (lon_grid.values, dtype=np.float64),
+                                      np.asarray (lat_grid.values, dtype=np.float64))
+
+        self.shape = zlon.shape
+        zmask = np.broadcast_to (np.asarray (mask), self.shape)
+
+        # Flat index (Python/C flavor) of the indexed grid points
+        self.points = np.flatnonzero (zmask.ravel () == 1)
+        if self.points.size == 0 :
+            # Everything masked : find_ji used to fall back on all points
+            self.points = np.arange (zlon.size)
+
+        xyz = np.stack (latlon2cart (zlat.ravel ()[self.points], zlon.ravel ()[self.points]), axis=-1)
+        self.tree = cKDTree (xyz)
+
+        pop_stack ( 'GridIndex.__init__' )
+
+    def query (self:Self, lat_data:Any, lon_data:Any, k:int=1,
+               workers:int=1) -> tuple[np.ndarray, np.ndarray] :
+        '''
+        Flat index of the k nearest grid points, and their distance (in radian)
+        '''
+        zlat = np.asarray (lat_data, dtype=np.float64)
+        zlon = np.asarray (lon_data, dtype=np.float64)
+        zlat, zlon = np.broadcast_arrays (zlat, zlon)
+
+        xyz = np.stack (latlon2cart (zlat, zlon), axis=-1)
+        chord, idx = self.tree.query (xyz, k=k, workers=workers)
+        return self.points[idx], 2.0*np.arcsin (np.minimum (chord/2.0, 1.0))
+
+    def query_ji (self:Self, lat_data:Any, lon_data:Any,
+                  workers:int=1) -> tuple[np.ndarray, np.ndarray] :
+        '''
+        J,I indices (Python/C flavor : starting at 0) of the nearest grid point
+        '''
+        jimin, _ = self.query (lat_data, lon_data, workers=workers)
+        return np.unravel_index (jimin, self.shape)
+
+## Grid indexes already built, see grid_index. The cache keeps the
+## GRID_INDEX_CACHE_SIZE most recently used indexes. The key is built from the
+## shapes and a strided sample of GRID_INDEX_SAMPLE points along each
+## dimension of the coordinates and mask, with the number of valid points
+## of the mask : the full arrays are not hashed at each call
+GRID_INDEX_CACHE_SIZE:int = 8
+GRID_INDEX_SAMPLE:int = 64
+_GRID_INDEX_CACHE:OrderedDict[tuple, GridIndex] = OrderedDict ()
+
+def _grid_index_key (ztab:Any, count:bool=False) -> tuple :
+    '''Cheap fingerprint of an array (or scalar) for the grid_index cache'''
+    if np.ndim (ztab) == 0 :
+        return (float (ztab),)
+    zslices = tuple (slice (None, None, max (1, zn//GRID_INDEX_SAMPLE)) for zn in np.shape (ztab))
+    zsample = np.ascontiguousarray (np.asarray (ztab[zslices]))
+    zkey = ( np.shape (ztab), str (zsample.dtype), hashlib.sha1 (zsample.tobytes ()).hexdigest () )
+    if count :
+        zkey = zkey + (int (np.count_nonzero (np.asarray (ztab))),)
+    return zkey
+
+def grid_index (lat_grid:xr.DataArray, lon_grid:xr.DataArray, mask:float|xr.DataArray=1.0,
+                domain:Any=None) -> GridIndex :
+    '''
+    Get a GridIndex. If domain (a nemo.Domain) is given, the index is kept
+    in a cache and reused for the same domain, grid coordinates and mask
+    '''
+    if domain is None :
+        return GridIndex (lat_grid, lon_grid, mask)
+
+    # Grids of different point types (T, U, V ...) have the same shape : the
+    # coordinates themselves are part of the key
+    key = ( DomainSpec.from_domain (domain), _grid_index_key (lat_grid),
+            _grid_index_key (lon_grid), _grid_index_key (mask, count=True) )
+    if key in _GRID_INDEX_CACHE :
+        _GRID_INDEX_CACHE.move_to_end (key)
+        return _GRID_INDEX_CACHE[key]
+
+    zindex = GridIndex (lat_grid, lon_grid, mask)
+    _GRID_INDEX_CACHE[key] = zindex
+    while len (_GRID_INDEX_CACHE) > GRID_INDEX_CACHE_SIZE :
+        _GRID_INDEX_CACHE.popitem (last=False)
+    return zindex
+
 @validate_types
 def find_ji (lat_data:xr.DataArray, lon_data:xr.DataArray,
              lat_grid:xr.DataArray, lon_grid:xr.DataArray,
              mask:float|xr.DataArray=1.0,
              drop_duplicates:bool=False, out:str|None=None, ay:str|None=None, ax:str|None=None,
+             index:GridIndex|None=None, domain:Any=None,
              Debug:bool=False) :
     '''
     Description: seeks J,I indices of the grid point which is the closest
@@ -4096,93 +4974,40 @@ def find_ji (lat_data:xr.DataArray, lon_data:xr.DataArray,
     <grid latitudes><grid longitudes> are 2D fields on J/I (Y/X) dimensions
     mask : if given, seek only non masked grid points (i.e with mask=1)
 
+    index  : a GridIndex of the grid. Built if not given
+    domain : a nemo.Domain. If given, the GridIndex is cached and reused
+             by the next calls for the same domain and mask
+
     Example : find_ji (40., -20., nav_lat, nav_lon, mask=1.0)
 
     Note : all longitudes and latitudes in degrees
 
-    Note : may work with 1D lon_data/lat_data (?)
+    Note : works with 1D lon_data/lat_data : all points are located at once
     '''
     push_stack ( f'find_ji ( lat_data, lon_data, lat_grid, lon_grid,' \
                  f'mask, {drop_duplicates=}, {out=} ) ')
 
-    # Get grid dimensions
-    if len (lon_grid.shape) == 2 :
-        jpi = lon_grid.shape[-1]
-    else                         :
-        jpi = len(lon_grid)
+    if index is None :
+        index = grid_index (lat_grid, lon_grid, mask, domain=domain)
 
-    ay,iy = find_axis (lon_grid, 'y')
-    ax,ix = find_axis (lon_grid, 'x')
+    ay = index.ay if ay is None else ay
+    ax = index.ax if ax is None else ax
 
     if OPTIONS['Debug'] or Debug :
         print ( 'find_ji' )
         print ( f'{lat_data=}' )
         print ( f'{lon_data=}' )
-        print ( f'{ay=} {iy=}' )
-        print ( f'{ax=} {ix=}' )
-
-    # Compute distance from the point to all grid points (in RADian)
-    arg      = ( np.sin (RAD*lat_data) * np.sin (RAD*lat_grid)
-              +  np.cos (RAD*lat_data) * np.cos (RAD*lat_grid) * np.cos (RAD*(lon_data-lon_grid)) )
-
-    if OPTIONS['Debug'] or Debug :
-        print ( f'{type(arg)=} {arg.shape=}' )
-
-    # Send masked points to 'infinite'
-    distance = np.arccos (arg) + 4.0*np.pi*(1.0-mask)
-
-    if OPTIONS['Debug'] or Debug :
-        print ( f'{type(distance)=} {distance.shape=}', \
-               f'{distance.dims=}' ) # type: ignore[reportAttributeAccessIssue]
-
-    # Truncates to alleviate precision problem encountered with some grids
-    prec = int (1E7)
-    distance = (distance*prec).astype(int) / prec
-    if OPTIONS['Debug'] or Debug:
-        print ( f'{type(distance)=} {distance.shape=}', \
-               f'{distance.dims=}' ) # type: ignore[reportAttributeAccessIssue]
-
-    # Compute index minimum of distance
-    try :
-        nn = len (lat_data)
-    except TypeError:
-        if OPTIONS['Debug'] or Debug :
-            print ( 'Case TypeError' )
-        nn = 0
-        jimin = distance.values.ravel().argmin ( # pyright: ignore[reportAttributeAccessIssue]
-            axis=0).astype(int) # pyright: ignore[reportAttributeAccessIssue]
-    else :
-        if OPTIONS['Debug'] or Debug :
-            print ( 'Case not TypeError' )
-        jimin   = np.empty (nn, dtype=int )
-        ap=distance.dims[0] # type: ignore[reportAttributeAccessIssue]
-        if OPTIONS['Debug'] or Debug :
-            print ( f"{type(jimin)=} {jimin.shape=} {type(distance)=}" , \
-                    f"{distance.shape=} ", \
-                    f"{distance.dims=} {ap=}" ) # type: ignore[reportAttributeAccessIssue]
-        for ji in range (nn) :
-            jimin[ji] = distance.isel( # pyright: ignore[reportAttributeAccessIssue]
-                {ap:ji}).values.ravel().argmin(axis=0)
-            if OPTIONS['Debug'] or Debug and ji == 0 :
-                print ( f"{ji=} {distance.isel( # pyright: ignore[reportAttributeAccessIssue]
-                    {ap:ji}).dims=}" )
-        if OPTIONS['Debug'] or Debug :
-            print ( f"{type(jimin)=} {jimin.shape=} {jimin[ji]=}" )
-    finally :
-        if OPTIONS['Debug'] or Debug :
-            print ( f'{type(jimin)=} {jimin.shape}' )
-            print ( f'{jimin=}' )
+        print ( f'{ay=} {ax=} {index.shape=} {index.points.size=}' )
 
     # Compute 2D indices (Python/C flavor : starting at 0)
-    jmin = jimin // jpi
-    imin = jimin - jmin*jpi
+    jmin, imin = index.query_ji (lat_data, lon_data)
 
     if OPTIONS['Debug'] or Debug :
         print ( f'{jmin=}' )
         print ( f'{imin=}' )
 
     if drop_duplicates :
-        zz   = np.vstack ( (np.array (jmin), np.array (imin)) )
+        zz   = np.vstack ( (np.atleast_1d (jmin), np.atleast_1d (imin)) )
         zz   = np.swapaxes (zz , 0, 1)
         zz   = np.unique ( zz, axis=0)
         jmin = zz[:,-2]
@@ -4198,18 +5023,275 @@ def find_ji (lat_data:xr.DataArray, lon_data:xr.DataArray,
         return np.array (jmin), np.array (imin)
 
     if out in ['xarray', 'xr']         :
-        jmin = xr.DataArray (jmin, dims=('Num',), name='j_index', attrs={'long_name':'j-index'})
-        imin = xr.DataArray (imin, dims=('Num',), name='i_index', attrs={'long_name':'i-index'})
+        jmin = xr.DataArray (np.atleast_1d (jmin), dims=('Num',), name='j_index',
+                             attrs={'long_name':'j-index'})
+        imin = xr.DataArray (np.atleast_1d (imin), dims=('Num',), name='i_index',
+                             attrs={'long_name':'i-index'})
         return jmin, imin
 
     if out=='list'                     :
-        return [jmin.values, imin.values] # pyright: ignore[reportAttributeAccessIssue]
+        return [jmin, imin]
+
+    return jmin, imin
+
+def CheckGridIndex (Debug:bool=False) -> int :
+    '''
+    Check of the GridIndex cache of find_ji : the T, U and V grids of a
+    domain are queried in turn with the cache, and compared to a search
+    with no cache
+
+    Returns the number of mismatches (printed)
+    '''
+    zdom = Domain (cfg_name='ORCA2.3')
+    jpj, jpi = zdom.jpj, zdom.jpi
+    zj, zi = np.meshgrid (np.arange (jpj, dtype=float), np.arange (jpi, dtype=float), indexing='ij')
+    nerror = 0
+    for _ in range (2) :
+        for cd_type, (dj, di) in [ ('T', (0., 0.)), ('U', (0., 0.5)), ('V', (0.5, 0.)) ] :
+            zlon = xr.DataArray (-180. + (zi + di) * 360./(jpi-2), dims=('y', 'x'))
+            zlat = xr.DataArray ( -80. + (zj + dj) * 160./jpj    , dims=('y', 'x'))
+            zlat_data = xr.DataArray ([-33.3, 0.6, 45.2, 71.9])
+            zlon_data = xr.DataArray ([-150.1, 3.3, 44.4, 170.7])
+            zref = find_ji (zlat_data, zlon_data, zlat, zlon, out='np')
+            znew = find_ji (zlat_data, zlon_data, zlat, zlon, out='np', domain=zdom)
+            if not (np.array_equal (zref[0], znew[0]) and np.array_equal (zref[1], znew[1])) :
+                nerror += 1
+                print ( f'CheckGridIndex : {cd_type=} : {znew} instead of {zref}' )
+            elif OPTIONS['Debug'] or Debug :
+                print ( f'CheckGridIndex : {cd_type=} : ok' )
+
+    # Masks differing by one point only must not share an index
+    zmask = xr.DataArray (np.ones ((jpj, jpi)), dims=('y', 'x'))
+    for _ in range (2) :
+        zref = find_ji (zlat_data, zlon_data, zlat, zlon, mask=zmask, out='np')
+        znew = find_ji (zlat_data, zlon_data, zlat, zlon, mask=zmask, out='np', domain=zdom)
+        if not (np.array_equal (zref[0], znew[0]) and np.array_equal (zref[1], znew[1])) :
+            nerror += 1
+            print ( f'CheckGridIndex : mask with {int (zmask.sum ())} points : {znew} instead of {zref}' )
+        zmask = zmask.copy ()
+        zmask[zref[0][0], zref[1][0]] = 0.
+
+    if len (_GRID_INDEX_CACHE) > GRID_INDEX_CACHE_SIZE :
+        nerror += 1
+        print ( f'CheckGridIndex : {len (_GRID_INDEX_CACHE)} indexes in cache' )
+
+    print ( f'CheckGridIndex : {nerror} mismatch(es)' )
+    return nerror
+
+def _bilinear_corners (index:GridIndex, zlat_grid:np.ndarray, zlon_grid:np.ndarray,
+                       zmask:np.ndarray, zlat:np.ndarray, zlon:np.ndarray) \
+                       -> tuple[np.ndarray, np.ndarray, np.ndarray] :
+    '''
+    Corners and weights of bilinear interpolation on a curvilinear grid
+
+    Fractional (j,i) position of each point is found by inverting the local
+    grid vectors around the nearest grid point, in cartesian coordinates.
+    Masked corners get no weight. If all corners are masked, the nearest
+    point is used. Periodicity is not handled : points in the halo get
+    the weights of the border cell.
+
+    Returns j and i indices, and weights, with shape (n, 4)
+    '''
+    ny, nx = index.shape
+    j0, i0 = index.query_ji (zlat, zlon)
+
+    grid = np.stack (latlon2cart (zlat_grid, zlon_grid), axis=-1)
+    pts  = np.stack (latlon2cart (zlat, zlon), axis=-1)
+
+    ip, im = np.minimum (i0+1, nx-1), np.maximum (i0-1, 0)
+    jp, jm = np.minimum (j0+1, ny-1), np.maximum (j0-1, 0)
+    e_i = (grid[j0, ip] - grid[j0, im]) / np.maximum (ip-im, 1)[:, np.newaxis]
+    e_j = (grid[jp, i0] - grid[jm, i0]) / np.maximum (jp-jm, 1)[:, np.newaxis]
+    d   = pts - grid[j0, i0]
+
+    # Least square solution of d = a*e_i + b*e_j
+    m00 = np.sum (e_i*e_i, axis=-1)
+    m01 = np.sum (e_i*e_j, axis=-1)
+    m11 = np.sum (e_j*e_j, axis=-1)
+    r0  = np.sum (e_i*d  , axis=-1)
+    r1  = np.sum (e_j*d  , axis=-1)
+    det = m00*m11 - m01*m01
+    with np.errstate (invalid='ignore', divide='ignore') :
+        za = np.where (det > 0, (m11*r0 - m01*r1)/det, 0.)
+        zb = np.where (det > 0, (m00*r1 - m01*r0)/det, 0.)
+
+    fi = np.clip (i0 + za, 0, nx-1)
+    fj = np.clip (j0 + zb, 0, ny-1)
+    ia = np.clip (np.floor (fi).astype (int), 0, max (nx-2, 0))
+    ja = np.clip (np.floor (fj).astype (int), 0, max (ny-2, 0))
+    wx = np.clip (fi - ia, 0., 1.)
+    wy = np.clip (fj - ja, 0., 1.)
+    ib = np.minimum (ia+1, nx-1)
+    jb = np.minimum (ja+1, ny-1)
+
+    jj = np.stack ( (ja, ja, jb, jb), axis=-1)
+    ii = np.stack ( (ia, ib, ia, ib), axis=-1)
+    ww = np.stack ( ((1-wx)*(1-wy), wx*(1-wy), (1-wx)*wy, wx*wy), axis=-1)
+    ww = ww * (np.broadcast_to (zmask, index.shape)[jj, ii] == 1)
+
+    # Fall back to nearest point
+    dry = ww.sum (axis=-1) <= 0.
+    jj[dry, 0], ii[dry, 0] = j0[dry], i0[dry]
+    ww[dry]    = 0.
+    ww[dry, 0] = 1.
+
+    return jj, ii, ww
+
+def sample_tracks (ptab:xr.DataArray, lat:Any, lon:Any, # pylint: disable=too-many-positional-arguments
+                   lat_grid:xr.DataArray, lon_grid:xr.DataArray,
+                   time:Any=None, depth:Any=None, gdept_0:Any=None,
+                   mask:float|xr.DataArray=1.0,
+                   method:Literal['nearest', 'bilinear']='nearest',
+                   vertical:Literal['nearest', 'linear']='linear',
+                   index:GridIndex|None=None, domain:Any=None, Debug:bool=False) -> xr.Dataset :
+    '''
+    Sample a model field along observations (floats, drifters, stations ...)
+
+    ptab            : model field, with dimensions [time,] [depth,] y, x. May be dask backed
+    lat, lon        : position of the observations (degrees), 1D arrays of the same length
+    lat_grid, lon_grid : grid of ptab
+    time            : time of the observations. The nearest model time is used.
+                      If None, all times are kept
+    depth           : depth of the observations (positive, in meters), needs gdept_0.
+                      Converted to fractional level index with depth2index
+                      If None, all levels are kept (profiles)
+    gdept_0         : 1D reference depth of the levels
+    mask            : horizontal mask. Only non masked grid points (i.e with mask=1) are used
+    method          : horizontal lookup : 'nearest' grid point, or 'bilinear'
+    vertical        : vertical lookup : 'nearest' level, or 'linear' interpolation
+    index, domain   : see find_ji
+
+    Samples are gathered with one vectorized isel per time chunk of ptab,
+    so a dask field is never fully loaded. The result stays lazy until computed.
+
+    Returns a Dataset on dimension 'obs', with the sampled values, the
+    observation positions, the indices and position of the nearest grid
+    point and its distance to the observation (meters)
+    '''
+    push_stack ( f'sample_tracks ( ptab, lat, lon, lat_grid, lon_grid, time, depth, gdept_0,'
+                 f' mask, {method=}, {vertical=} )' )
+
+    zlat = np.atleast_1d (np.asarray (lat, dtype=np.float64)).ravel ()
+    zlon = np.atleast_1d (np.asarray (lon, dtype=np.float64)).ravel ()
+    nobs = zlat.size
+
+    if index is None :
+        index = grid_index (lat_grid, lon_grid, mask, domain=domain)
 
-    if out=='tuple'                    :
-        return jmin.values, imin.values # pyright: ignore[reportAttributeAccessIssue]
+    ay, _ = find_axis (ptab, 'y')
+    ax, _ = find_axis (ptab, 'x')
+    az, _ = find_axis (ptab, 'z')
+    at, _ = find_axis (ptab, 't')
+
+    # Horizontal lookup
+    jimin, dist = index.query (zlat, zlon)
+    jn, in_ = np.unravel_index (jimin, index.shape)
+    if method == 'nearest' :
+        jj, ii, ww = jn[:, np.newaxis], in_[:, np.newaxis], np.ones ((nobs, 1))
+    elif method == 'bilinear' :
+        if lon_grid.ndim == 2 :
+            zlat_grid, zlon_grid = np.asarray (lat_grid.values), np.asarray (lon_grid.values)
+        else :
+            zlon_grid, zlat_grid = np.meshgrid (np.asarray (lon_grid.values),
+                                                np.asarray (lat_grid.values))
+        jj, ii, ww = _bilinear_corners (index, zlat_grid, zlon_grid,
+                                        np.asarray (mask), zlat, zlon)
+    else :
+        raise ValueError ( f'sample_tracks : unknown {method=}. Should be nearest or bilinear' )
+
+    indexers = {}
+    # Vertical lookup : each horizontal corner is combined with one or two levels
+    k_index = None
+    if az is not None and depth is not None :
+        if gdept_0 is None :
+            raise ValueError ( 'sample_tracks : gdept_0 is needed to sample at given depths' )
+        zdep = np.atleast_1d (np.asarray (depth, dtype=np.float64)).ravel ()
+        zgdept = xr.DataArray (np.asarray (gdept_0).ravel (), dims=('z_gdept',))
+        k_index = np.atleast_1d (depth2index (zdep, zgdept))
+        jpk = zgdept.size
+        if vertical == 'nearest' :
+            kk, wz = np.rint (k_index).astype (int)[:, np.newaxis], np.ones ((nobs, 1))
+        elif vertical == 'linear' :
+            k0 = np.clip (np.floor (k_index).astype (int), 0, jpk-1)
+            k1 = np.minimum (k0+1, jpk-1)
+            kk = np.stack ( (k0, k1), axis=-1)
+            wz = np.stack ( (1.0 - (k_index-k0), k_index-k0), axis=-1)
+        else :
+            raise ValueError ( f'sample_tracks : unknown {vertical=}. Should be nearest or linear' )
+        nh, nv = jj.shape[-1], kk.shape[-1]
+        jj = np.repeat (jj, nv, axis=-1)
+        ii = np.repeat (ii, nv, axis=-1)
+        ww = np.repeat (ww, nv, axis=-1) * np.tile (wz, (1, nh))
+        indexers[az] = xr.DataArray (np.tile (kk, (1, nh)), dims=('obs', 'corner'))
+
+    indexers[ay] = xr.DataArray (jj, dims=('obs', 'corner'))
+    indexers[ax] = xr.DataArray (ii, dims=('obs', 'corner'))
+    weights      = xr.DataArray (ww, dims=('obs', 'corner'))
+
+    # Time lookup
+    t_index = None
+    if at is not None and time is not None :
+        ztime   = np.atleast_1d (np.asarray (time)).ravel ()
+        t_index = ptab.indexes[at].get_indexer (ztime, method='nearest')
+
+    # One vectorized isel for each time chunk holding observations
+    if t_index is not None :
+        if ptab.chunks is not None :
+            bounds = np.cumsum ((0,) + ptab.chunks[ptab.get_axis_num (at)])
+        else :
+            bounds = np.array ([0, ptab.sizes[at]])
+        chunk_id = np.searchsorted (bounds, t_index, side='right') - 1
+        parts, order = [], []
+        for ic in np.unique (chunk_id) :
+            iobs = np.flatnonzero (chunk_id == ic)
+            zind = { dim:idx.isel (obs=iobs) for dim, idx in indexers.items () }
+            zind[at] = xr.DataArray (t_index[iobs] - bounds[ic], dims=('obs',))
+            zval = ptab.isel ({at:slice (bounds[ic], bounds[ic+1])}).isel (zind)
+            zwei = weights.isel (obs=iobs)
+            parts.append ( (zval.fillna (0.)*zwei).sum ('corner') /
+                           (zwei*zval.notnull ()).sum ('corner') )
+            order.append (iobs)
+        values = xr.concat (parts, dim='obs').isel (obs=np.argsort (np.concatenate (order)))
+    else :
+        zval   = ptab.isel (indexers)
+        values = (zval.fillna (0.)*weights).sum ('corner') / (weights*zval.notnull ()).sum ('corner')
+
+    # Drop grid coordinates, which are meaningless after the gather
+    values = values.reset_coords (drop=True)
+    values.attrs = ptab.attrs.copy ()
+
+    name  = ptab.name if ptab.name is not None else 'value'
+    d_out = xr.Dataset ( {name:values}, coords={'obs':np.arange (nobs)} )
+    d_out['lat']       = xr.DataArray (zlat, dims=('obs',), attrs={'units':'degrees_north'})
+    d_out['lon']       = xr.DataArray (zlon, dims=('obs',), attrs={'units':'degrees_east' })
+    if time is not None :
+        d_out['time']  = xr.DataArray (np.atleast_1d (np.asarray (time)).ravel (), dims=('obs',))
+    if t_index is not None :
+        d_out['t_index'] = xr.DataArray (t_index, dims=('obs',))
+    if depth is not None :
+        d_out['depth'] = xr.DataArray (np.atleast_1d (np.asarray (depth)).ravel (), dims=('obs',),
+                                       attrs={'units':'m'})
+    if k_index is not None :
+        d_out['k_index'] = xr.DataArray (k_index, dims=('obs',),
+                                         attrs={'long_name':'fractional level index'})
+    d_out['j_index']   = xr.DataArray (jn , dims=('obs',), attrs={'long_name':'j-index of nearest point'})
+    d_out['i_index']   = xr.DataArray (in_, dims=('obs',), attrs={'long_name':'i-index of nearest point'})
+    if lon_grid.ndim == 2 :
+        d_out['model_lat'] = xr.DataArray (np.asarray (lat_grid.values)[jn, in_], dims=('obs',))
+        d_out['model_lon'] = xr.DataArray (np.asarray (lon_grid.values)[jn, in_], dims=('obs',))
+    else :
+        d_out['model_lat'] = xr.DataArray (np.asarray (lat_grid.values)[jn], dims=('obs',))
+        d_out['model_lon'] = xr.DataArray (np.asarray (lon_grid.values)[in_], dims=('obs',))
+    d_out['distance']  = xr.DataArray (dist*RA.values, dims=('obs',),
+                                       attrs={'units':'m', 'long_name':'distance to nearest point'})
+
+    if OPTIONS['Debug'] or Debug :
+        print ( d_out )
 
-    return jmin.values, imin.values # pyright: ignore[reportAttributeAccessIssue]
+    pop_stack ( 'sample_tracks' )
+    return d_out
 
+@traced
 @validate_types
 def curl (tx:xr.DataArray, ty:xr.DataArray, e1u:xr.DataArray, e2v:xr.DataArray,
           e1f:xr.DataArray, e2f:xr.DataArray,
@@ -4220,7 +5302,6 @@ def curl (tx:xr.DataArray, ty:xr.DataArray, e1u:xr.DataArray, e2v:xr.DataArray,
     '''
     Returns curl of a horizontal vector field defined on the C-grid
     '''
-    push_stack ( f'curl ( tx, ty, e1u, e2v, e1f, e2f, {aperio=} )' )
     zdom   = Domain (ptab=tx, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4247,9 +5328,9 @@ def curl (tx:xr.DataArray, ty:xr.DataArray, e1u:xr.DataArray, e2v:xr.DataArray,
 
     zcurl = lbc_todom (zcurl, src_dom=zdom_ext, dst_dom=zdom, cd_type='F', psgn=1)
 
-    pop_stack ( 'curl' )
     return zcurl
 
+@traced
 @validate_types
 def div (ux, uy, e1t, e2t, e1v, e2u, Iperio:bool|None=None, Jperio:bool|None=None,
     NFold:bool|None=None, NFtype:Optional[NFTYPE_LITERAL]=None, Halo:bool|None=None,
@@ -4258,7 +5339,6 @@ def div (ux, uy, e1t, e2t, e1v, e2u, Iperio:bool|None=None, Jperio:bool|None=Non
     '''
     Returns divergence of a horizontal vector field defined on the C-grid
     '''
-    push_stack ( f'div  (ux, uy, e1t, e2t, e1v, e2u, {aperio=}' )
     zdom   = Domain (ptab=ux, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4311,7 +5391,6 @@ def div (ux, uy, e1t, e2t, e1v, e2u, Iperio:bool|None=None, Jperio:bool|None=Non
 
     zdiv = lbc_todom (zdiv, src_dom=zdom_ext, dst_dom=zdom, cd_type='T', psgn=1)
 
-    pop_stack ( 'zdiv' )
     return zdiv
 
 # @validate_types
@@ -4710,6 +5789,7 @@ def angle_full (glamt:xr.DataArray, gphit:xr.DataArray, glamu:xr.DataArray, gphi
     pop_stack ( 'angle_full' )
     return gsint, gcost, gsinu, gcosu, gsinv, gcosv, gsinf, gcosf
 
+@traced
 @validate_types
 def angle (glam:xr.DataArray, gphi:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T',
            Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -4720,7 +5800,6 @@ def angle (glam:xr.DataArray, gphi:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T',
     Computes sinus and cosinus of model line direction with
     respect to east
     '''
-    push_stack ( f'angle (glam, gphi, {aperio=}, {cd_type=} ) ')
     zdom   = Domain (ptab=glam, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4758,9 +5837,9 @@ def angle (glam:xr.DataArray, gphi:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T',
     gsin = gsin.assign_coords (glam.coords)
     gcos = gcos.assign_coords (glam.coords)
 
-    pop_stack ( 'angle' )
     return gsin, gcos
 
+@traced
 @validate_types
 def rot_en2ij ( u_e:xr.DataArray, v_n:xr.DataArray, gsin:xr.DataArray, gcos:xr.DataArray,
                 cd_type:CDTYPE_LITERAL|str='T', Iperio:bool|None=None, Jperio:bool|None=None,
@@ -4774,7 +5853,6 @@ def rot_en2ij ( u_e:xr.DataArray, v_n:xr.DataArray, gsin:xr.DataArray, gcos:xr.D
 
     All components are on the same grid (T, U, V or F)
     '''
-    push_stack ( f'rot_en2ij ( u_e, v_n, gsin, gcos, aperio, {cd_type=} )' )
     zdom   = Domain (ptab=u_e, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4785,9 +5863,9 @@ def rot_en2ij ( u_e:xr.DataArray, v_n:xr.DataArray, gsin:xr.DataArray, gcos:xr.D
     u_i = lbc (u_i, domain=zdom, cd_type=cd_type, psgn=-1.0)
     v_j = lbc (v_j, domain=zdom, cd_type=cd_type, psgn=-1.0)
 
-    pop_stack ( 'rot_en2ij' )
     return u_i, v_j
 
+@traced
 @validate_types
 def rot_ij2en ( u_i:xr.DataArray, v_j:xr.DataArray, gsin:xr.DataArray, gcos:xr.DataArray,
                cd_type:CDTYPE_LITERAL|str|None, Iperio:bool|None=None, Jperio:bool|None=None,
@@ -4800,7 +5878,6 @@ def rot_ij2en ( u_i:xr.DataArray, v_j:xr.DataArray, gsin:xr.DataArray, gcos:xr.D
 
     All components are on the same grid (T, U, V or F)
     '''
-    push_stack ( f'rot_ij2en ( u_i, v_j, gsin, gcos, {aperio=}, {cd_type=} )' )
     zdom   = Domain (ptab=u_i, Iperio=Iperio, Jperio=Jperio, NFold=NFold, NFtype=NFtype,
                     Halo=Halo, Cyclic=Cyclic, aperio=aperio, domain=domain)
 
@@ -4810,9 +5887,9 @@ def rot_ij2en ( u_i:xr.DataArray, v_j:xr.DataArray, gsin:xr.DataArray, gcos:xr.D
     u_e = lbc (u_e, domain=zdom, cd_type=cd_type, psgn=1.0)
     v_n = lbc (v_n, domain=zdom, cd_type=cd_type, psgn=1.0)
 
-    pop_stack ( 'rot_ij2en' )
     return u_e, v_n
 
+@traced
 @validate_types
 def rot_uv2en (uo:xr.DataArray, vo:xr.DataArray, gsint:xr.DataArray, gcost:xr.DataArray,
                 Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -4828,7 +5905,6 @@ def rot_uv2en (uo:xr.DataArray, vo:xr.DataArray, gsint:xr.DataArray, gcost:xr.Da
 
     Returns east-north components on the T grid point
     '''
-    push_stack ( f'rot_uv2en ( uo, vo, gsint, gcost, {aperio=})' )
     zdom   = Domain (ptab=uo, Iperio=Iperio, Jperio=Jperio, NFold=NFold, NFtype=NFtype,
                       Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4852,9 +5928,9 @@ def rot_uv2en (uo:xr.DataArray, vo:xr.DataArray, gsint:xr.DataArray, gcost:xr.Da
     u_e = lbc (u_e, domain=zdom, cd_type='T', psgn=1.0)
     v_n = lbc (v_n, domain=zdom, cd_type='T', psgn=1.0)
 
-    pop_stack ( 'rot_uv2en' )
     return u_e, v_n
 
+@traced
 @validate_types
 def rot_uv2enf (uo:xr.DataArray, vo:xr.DataArray, gsinf:xr.DataArray, gcosf:xr.DataArray,
                 zdim:str|None=None,
@@ -4871,7 +5947,6 @@ def rot_uv2enf (uo:xr.DataArray, vo:xr.DataArray, gsinf:xr.DataArray, gcosf:xr.D
 
     Returns east-north components on the F grid point
     '''
-    push_stack ( f'rot_uv2enf ( uo, vo, gsint, gcost, {aperio=}, {zdim=} )' )
     zdom   = Domain (ptab=uo, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4885,9 +5960,9 @@ def rot_uv2enf (uo:xr.DataArray, vo:xr.DataArray, gsinf:xr.DataArray, gcosf:xr.D
     u_e = lbc (u_e, domain=zdom, cd_type='F', psgn= 1.0)
     v_n = lbc (v_n, domain=zdom, cd_type='F', psgn= 1.0)
 
-    pop_stack ( 'rot_uv2enf' )
     return u_e, v_n
 
+@traced
 @validate_types
 def u2t (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -4897,7 +5972,6 @@ def u2t (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
     '''
     Interpolates an array from U grid to T grid (i-mean)
     '''
-    push_stack ( f'u2t (utab, {psgn=}, {action=} )' )
     zdom   = Domain (ptab=utab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4933,9 +6007,9 @@ def u2t (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
         if az != zdim :
             ttab = ttab.rename( {az:zdim})
 
-    pop_stack ( 'u2t' )
     return ttab
 
+@traced
 @validate_types
 def v2t (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -4945,7 +6019,6 @@ def v2t (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
     '''
     Interpolates an array from V grid to T grid (j-mean)
     '''
-    push_stack ( f'v2t (vtab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=vtab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4977,9 +6050,9 @@ def v2t (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
         if az != zdim :
             ttab = ttab.rename( {az:zdim})
 
-    pop_stack ( 'v2t' )
     return ttab
 
+@traced
 @validate_types
 def f2t (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -4989,7 +6062,6 @@ def f2t (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action='ave',
     '''
     Interpolates an array from F grid to T grid (i- and j- means)
     '''
-    push_stack ( f'f2t (ftab, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=ftab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -4999,9 +6071,9 @@ def f2t (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action='ave',
     ttab = v2t (f2v (ftab_0, domain=zdom, psgn=psgn, zdim=zdim, action=action),
                              domain=zdom, psgn=psgn, zdim=zdim, action=action)
 
-    pop_stack ( 'f2t' )
     return ttab
 
+@traced
 @validate_types
 def t2u (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str|None='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5011,7 +6083,6 @@ def t2u (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str|Non
     '''
     Interpolates an array from T grid to U grid (i-mean)
     '''
-    push_stack ( f't2u (ttab, {psgn=}, {zdim=}, {action=} )' )
 
     zdom   = Domain (ptab=ttab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
@@ -5044,9 +6115,9 @@ def t2u (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str|Non
         if az != zdim :
             utab = utab.rename({az:zdim})
 
-    pop_stack ( 't2u' )
     return utab
 
+@traced
 @validate_types
 def t2v (ttab:xr.DataArray, psgn:int|float=1, zdim=None, action='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5056,7 +6127,6 @@ def t2v (ttab:xr.DataArray, psgn:int|float=1, zdim=None, action='ave',
     '''
     Interpolates an array from T grid to V grid (j-mean)
     '''
-    push_stack ( f't2v (ttab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=ttab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5088,9 +6158,9 @@ def t2v (ttab:xr.DataArray, psgn:int|float=1, zdim=None, action='ave',
         if az != zdim :
             vtab = vtab.rename( {az:zdim})
 
-    pop_stack ( 't2v' )
     return vtab
 
+@traced
 @validate_types
 def v2f (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5100,7 +6170,6 @@ def v2f (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
     '''
     Interpolates an array from V grid to F grid (i-mean)
     '''
-    push_stack ( f'v2f (vtab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=vtab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5132,9 +6201,9 @@ def v2f (vtab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
         if az != zdim :
             ftab = ftab.rename( {az:zdim})
 
-    pop_stack ( 'v2f' )
     return ftab
 
+@traced
 @validate_types
 def u2f (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5144,7 +6213,6 @@ def u2f (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
     '''
     Interpolates an array from U grid to F grid i-mean)
     '''
-    push_stack ( f'u2f (utab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=utab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5176,9 +6244,9 @@ def u2f (utab:xr.DataArray, psgn:int|float=-1, zdim:str|None=None, action:str='a
         if az != zdim :
             ftab = ftab.rename( {az:zdim})
 
-    pop_stack ( 'u2f' )
     return ftab
 
+@traced
 @validate_types
 def t2f (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5188,7 +6256,6 @@ def t2f (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
     '''
     Interpolates an array on T grid to F grid (i- and j- means)
     '''
-    push_stack ( f't2f (utab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=ttab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5198,9 +6265,9 @@ def t2f (ttab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
     ftab = t2u (u2f (ttab, domain=zdom, psgn=psgn, zdim=zdim, action=action),
                            domain=zdom, psgn=psgn, zdim=zdim, action=action)
 
-    pop_stack ( 'v2f' )
     return ftab
 
+@traced
 @validate_types
 def f2u (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5210,7 +6277,6 @@ def f2u (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
     '''
     Interpolates an array on F grid to U grid (j-mean)
     '''
-    push_stack ( f'f2u (utab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=ftab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5240,9 +6306,9 @@ def f2u (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
     if zdim and az and az != zdim :
         utab = utab.rename( {az:zdim})
 
-    pop_stack ( 'f2u' )
     return utab
 
+@traced
 @validate_types
 def f2v (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='ave',
          Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
@@ -5252,7 +6318,6 @@ def f2v (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
     '''
     Interpolates an array from F grid to V grid (i-mean)
     '''
-    push_stack ( f'f2v (ftab, {aperio=}, {psgn=}, {zdim=}, {action=} )' )
     zdom   = Domain (ptab=ftab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
@@ -5285,9 +6350,9 @@ def f2v (ftab:xr.DataArray, psgn:int|float=1, zdim:str|None=None, action:str='av
         if az != zdim :
             vtab = vtab.rename( {az:zdim})
 
-    pop_stack ( 'f2v' )
     return vtab
 
+@traced
 @validate_types
 def w2t (wtab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
          sval:float=np.nan) -> xr.DataArray :
@@ -5295,7 +6360,6 @@ def w2t (wtab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
     Interpolates an array on W grid to T grid (k-mean)
     sval is the bottom value
     '''
-    push_stack ( f'w2t (wtab, {zcoord=}, {zdim=}, {sval=} )' )
     wtab_0 = xr.where ( np.isnan(wtab), 0., wtab)
 
     az, kz = find_axis (wtab_0, 'z')
@@ -5314,9 +6378,9 @@ def w2t (wtab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
     if 'z_f' in wtab.dims :
         ttab = ttab.rename ({'z_f':'z_c'})
 
-    pop_stack ( 'w2t' )
     return ttab
 
+@traced
 @validate_types
 def t2w (ttab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
          sval:float=np.nan, extrap_surf:bool=False) -> xr.DataArray :
@@ -5326,7 +6390,6 @@ def t2w (ttab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
     sval is the surface value
     if extrap_surf==True, surface value is taken from 1st level value.
     '''
-    push_stack ( f't2w (utab, {zcoord=}, {zdim=}, {sval=}, {extrap_surf=} )' )
     ttab_0 = xr.where ( np.isnan(ttab), 0., ttab)
     az, kz = find_axis (ttab_0, 'z')
 
@@ -5346,26 +6409,204 @@ def t2w (ttab:xr.DataArray, zcoord:xr.DataArray|None=None, zdim:str|None=None,
     if 'z_c' in wtab.dims :
         wtab = wtab.rename ({'z_c':'z_f'})
 
-    pop_stack ( 't2w' )
     return wtab
 
+## ============================================================================
+## Fill engines
+##   Filling all the missing points with their nearest valid neighbour (or an
+##   inverse distance mean of the k nearest) is done in one pass, with a
+##   Euclidean distance transform (or a KD-tree) in index space. The grid is
+##   padded east-west by periodicity and northward by the north fold, so that
+##   neighbours are found across the boundaries. The search is done once for
+##   each different mask of the leading dimensions (usually once per level).
+
+def _fill_interior (zdom:Domain) -> tuple[slice, slice] :
+    '''Rows and columns of the grid without the halo points'''
+    zcols = slice (1, -1) if zdom.Iperio and zdom.Halo else slice (None)
+    zrows = slice (None, -1) if zdom.NFold and zdom.Halo else slice (None)
+    return zrows, zcols
+
+def _fill_pad (zv:np.ndarray, npad:int, Iperio:bool, NFold:bool, NFtype:str|None) -> tuple[np.ndarray, int] :
+    '''
+    Pad zv [..., y, x] (without halo) with npad rows beyond the north fold,
+    and npad columns on each side if periodic. The fold is the fold of T
+    points. Returns the padded array and the offset of the first column
+    '''
+    ny, nx = zv.shape[-2:]
+    if NFold and ny > 1 :
+        npy = min (npad, ny-1)
+        zk  = np.arange (1, npy+1)
+        if NFtype == 'F' :
+            zfold = zv[..., ny-zk, :][..., ::-1]
+        else :
+            zfold = zv[..., ny-1-zk, :][..., (-np.arange (nx)) % nx]
+        zv = np.concatenate ((zv, zfold), axis=-2)
+    npx = 0
+    if Iperio :
+        npx = min (npad, nx)
+        zv  = np.concatenate ((zv[..., nx-npx:], zv, zv[..., :npx]), axis=-1)
+    return zv, npx
+
+def _fill_plan (zmiss:np.ndarray, ny:int, nx:int, offset:int, npass:int|None,
+                method:str='nearest', k:int=4) -> tuple[np.ndarray, ...] :
+    '''
+    Destination (in the grid) and sources (in the padded grid) of the
+    missing points of the padded mask zmiss
+
+    Returns dst_j, dst_i, src_j, src_i and the distances (k sources per
+    point with method='idw', src_j == -1 where there is no source)
+    '''
+    zmiss_in = zmiss[:ny, offset:offset+nx]
+    dst_j, dst_i = np.nonzero (zmiss_in)
+    if len (dst_j) == 0 or zmiss.all () :
+        zempty = np.zeros (0, dtype=np.intp)
+        return zempty, zempty, zempty.reshape (0, 1), zempty.reshape (0, 1), np.zeros ((0, 1))
+
+    if method == 'idw' :
+        zwet_j, zwet_i = np.nonzero (~zmiss)
+        zbound = np.inf if npass is None else npass*np.sqrt (2.) + 1.0e-6
+        zdist, zind = cKDTree (np.column_stack ((zwet_j, zwet_i))).query (
+            np.column_stack ((dst_j, dst_i + offset)), k=min (k, len (zwet_j)),
+            distance_upper_bound=zbound)
+        zdist, zind = zdist.reshape (len (dst_j), -1), zind.reshape (len (dst_j), -1)
+        zfound = zind < len (zwet_j)
+        zind   = np.where (zfound, zind, 0)
+        src_j  = np.where (zfound, zwet_j[zind], -1)
+        src_i  = np.where (zfound, zwet_i[zind], -1)
+    else :
+        _, (zjj, zii) = ndimage.distance_transform_edt (zmiss, return_indices=True)
+        src_j = zjj[:ny, offset:offset+nx][zmiss_in][:, np.newaxis]
+        src_i = zii[:ny, offset:offset+nx][zmiss_in][:, np.newaxis]
+        zdist = np.hypot (src_j - dst_j[:, np.newaxis], src_i - dst_i[:, np.newaxis] - offset)
+
+    if npass is not None :
+        # Same reach as npass passes of the 9 points stencil
+        zfar = ( (np.abs (src_j - dst_j[:, np.newaxis]) > npass)
+               | (np.abs (src_i - dst_i[:, np.newaxis] - offset) > npass) )
+        src_j = np.where (zfar, -1, src_j)
+        src_i = np.where (zfar, -1, src_i)
+    return dst_j, dst_i, src_j, src_i, zdist
+
+def _fill_inner (zv:np.ndarray, Iperio:bool, NFold:bool, NFtype:str|None, npass:int|None,
+                 method:str='nearest', k:int=4, power:float=2.) -> np.ndarray :
+    '''Fill the nan values of zv [..., y, x] (without halo)'''
+    ny, nx  = zv.shape[-2:]
+    zshape  = zv.shape
+    zv      = np.array (zv, dtype=np.result_type (zv.dtype, np.float32)).reshape (-1, ny, nx)
+    npad    = max (ny, nx) if npass is None else npass
+    zpad, offset = _fill_pad (zv, npad, Iperio, NFold, NFtype)
+    zmiss   = np.isnan (zpad)
+
+    # Leading indexes sharing the same mask share the same plan
+    zgroups:dict[bytes, list[int]] = {}
+    for jl in range (zv.shape[0]) :
+        zgroups.setdefault (np.packbits (zmiss[jl]).tobytes (), []).append (jl)
+
+    for zlead in zgroups.values () :
+        dst_j, dst_i, src_j, src_i, zdist = _fill_plan (zmiss[zlead[0]], ny, nx, offset,
+                                                        npass, method, k)
+        if len (dst_j) == 0 :
+            continue
+        zlead  = np.array (zlead)[:, np.newaxis, np.newaxis]
+        zfound = src_j >= 0
+        zval   = zpad[zlead, np.where (zfound, src_j, 0), np.where (zfound, src_i, 0)]
+        if method == 'idw' :
+            with np.errstate (divide='ignore') :
+                zwei = np.where (zfound, 1.0/np.maximum (zdist, 1.0e-12)**power, 0.)
+            with np.errstate (invalid='ignore') :
+                zval = (zwei*np.where (zfound, zval, 0.)).sum (axis=-1) / zwei.sum (axis=-1)
+        else :
+            zval = np.where (zfound, zval, np.nan)[..., 0]
+        zv[zlead[..., 0], dst_j, dst_i] = zval
+
+    return zv.reshape (zshape)
+
+def _fill_numpy (zv:np.ndarray, rows:slice, cols:slice, kernel:LbcKernel|None,
+                 **kwargs:Any) -> np.ndarray :
+    '''Fill the grid without halo, then the halo with the lbc kernel'''
+    zv = np.array (zv, dtype=np.result_type (zv.dtype, np.float32))
+    zv[..., rows, cols] = _fill_inner (zv[..., rows, cols], **kwargs)
+    if kernel is not None :
+        kernel.apply (zv)
+    return zv
+
+def fill_engine (ptab:xr.DataArray, domain:Domain, cd_type:CDTYPE_LITERAL|str='T',
+                 npass:int|None=None, method:Literal['nearest', 'idw']='nearest',
+                 k:int=4, power:float=2.) -> xr.DataArray :
+    '''
+    Fill the nan values of ptab in one pass
+
+    method : 'nearest' : value of the nearest valid point (distance transform)
+             'idw'     : mean of the k nearest valid points, weighted by
+                         the inverse of the distance to the power power
+    npass  : only fill the points closer than npass points (in i and j) from
+             a valid point, as npass passes of the 'smooth' method. None
+             fills all points
+
+    Works on dask arrays chunked along the non-horizontal dimensions
+    '''
+    push_stack ( f'fill_engine (ptab, {cd_type=}, {npass=}, {method=}, {k=}, {power=})' )
+    if method not in ['nearest', 'idw'] :
+        raise ValueError ( f'fill_engine : unknown {method=}' )
+    ax, _ = find_axis (ptab, 'x')
+    ay, _ = find_axis (ptab, 'y')
+    zrows, zcols = _fill_interior (domain)
+
+    zkernel = None
+    if domain.Halo :
+        zkernel = _lbc_kernel ( (ptab.sizes[ay], ptab.sizes[ax]), int (domain.jpi), cd_type,
+                                bool (domain.Iperio), bool (domain.Halo), bool (domain.NFold),
+                                domain.NFtype )
+    ztab = ptab
+    if ztab.chunks is not None :
+        ztab = ztab.chunk ({ay:-1, ax:-1})
+    ztab = xr.apply_ufunc (
+        _fill_numpy, ztab, input_core_dims=[[ay, ax]], output_core_dims=[[ay, ax]],
+        kwargs={'rows':zrows, 'cols':zcols, 'kernel':zkernel,
+                'Iperio':bool (domain.Iperio), 'NFold':bool (domain.NFold), 'NFtype':domain.NFtype,
+                'npass':npass, 'method':method, 'k':k, 'power':power},
+        dask='parallelized', output_dtypes=[np.result_type (ptab.dtype, np.float32)],
+        keep_attrs=True ).transpose (*ptab.dims)
+
+    pop_stack ( 'fill_engine' )
+    return ztab
+
 @validate_types
-def fill (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T', npass:int=1, sval=np.nan,
+def fill (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T', npass:int|None=1, sval=np.nan,
           Iperio:bool|None=None, Jperio:bool|None=None, NFold:bool|None=None,
           NFtype:NFTYPE_LITERAL|str|None=None,
           Halo:bool|None=None, Cyclic:bool|None=None, aperio:int|float|None=None,
-          nperio:int|None=None, domain:Domain|None=None ) -> xr.DataArray :
+          nperio:int|None=None, domain:Domain|None=None,
+          method:Literal['smooth', 'nearest', 'idw']='smooth',
+          k:int=4, power:float=2. ) -> xr.DataArray :
     '''
     Fills np.nan values with mean of neighbours
 
     Inputs :
        ptab : input field to fill
        aperio, cd_type : periodicity characteristics
+       method : 'smooth' (default) : npass passes of a 9 points mean
+                'nearest', 'idw' : one pass, see fill_engine. npass then
+                limits the distance of filling, npass=None fills all points
     '''
-    push_stack ( f'fill (ptab, {aperio=}, {cd_type=}, {npass=}, {sval=} ) ')
+    push_stack ( f'fill (ptab, {aperio=}, {cd_type=}, {npass=}, {sval=}, {method=} ) ')
     zdom   = Domain (ptab=ptab, Iperio=Iperio, Jperio=Jperio, NFold=NFold,
                      NFtype=NFtype, Halo=Halo, Cyclic=Cyclic,
                      aperio=aperio, nperio=nperio, domain=domain)
+
+    if method != 'smooth' :
+        if np.isnan (sval) :
+            ztab = fill_engine (ptab, zdom, cd_type=cd_type, npass=npass, method=method,
+                                k=k, power=power)
+        else :
+            ztab = fill_engine (ptab.where (ptab != sval), zdom, cd_type=cd_type, npass=npass,
+                                method=method, k=k, power=power)
+            ztab = ztab.fillna (sval)
+        pop_stack ( 'fill' )
+        return ztab
+
+    if npass is None :
+        raise ValueError ( 'fill : npass=None needs method nearest or idw' )
     zdom_ext = add_halo (zdom)
     ax, _ = find_axis (ptab, 'x')
     ay, _ = find_axis (ptab, 'y')
@@ -5419,6 +6660,7 @@ def fill (ptab:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T', npass:int=1, sval=n
     pop_stack ( 'fill' )
     return ztab
 
+@traced
 @validate_types
 def correct_uv (u:xr.DataArray, v:xr.DataArray,
                 lat:xr.DataArray) -> tuple[xr.DataArray, xr.DataArray] :
@@ -5439,7 +6681,6 @@ def correct_uv (u:xr.DataArray, v:xr.DataArray,
     Outputs :
        modified eastward/nothward components to have correct polar projections in cartopy
     '''
-    push_stack (' correct_uv (u, v, lat)')
     uv = np.sqrt (u*u + v*v)           # Original modulus
     zu = u
     zv = v * np.cos (RAD*lat)
@@ -5447,38 +6688,39 @@ def correct_uv (u:xr.DataArray, v:xr.DataArray,
     uc = zu*uv/zz
     vc = zv*uv/zz      # Final corrected values
 
-    pop_stack ( 'correct_uv' )
     return uc, vc
 
+@traced
 @validate_types
 def norm_uv (u:xr.DataArray, v:xr.DataArray) -> xr.DataArray :
     '''
     Returns norm of a 2 components vector
     '''
-    push_stack ( 'norm_uv (u, v)' )
     zz = (u*u + v*v).astype(float) ** 0.5
-    pop_stack ('norm_uv' )
     return zz
 
+@traced
 @validate_types
 def normalize_uv (u:xr.DataArray, v:xr.DataArray) -> tuple[xr.DataArray, xr.DataArray] :
     '''Normalizes 2 components vector
     '''
-    push_stack ( 'normalize_uv (u, v)' )
     uv = norm_uv (u, v)
     uu = u/uv
     vv = v/uv
-    pop_stack ( 'normalize_uv' )
     return uu, vv
 
 @validate_types
 def zonmean (var:xr.DataArray, bb:xr.DataArray, plat1d:xr.DataArray,
-             Debug:bool=False) -> xr.DataArray :
+             pack:Optional['OceanPack']=None, Debug:bool=False) -> xr.DataArray :
     '''
     Computes the meridonal stream function
 
-    var : var
-    bb  : volume
+    var  : var
+    bb   : volume
+    pack : OceanPack. var and bb may then be packed (only wet points), and
+           the zonal sums are done on the packed arrays. The volume of a row
+           is summed on the grid when bb is not packed, land points included,
+           as without pack
     '''
     push_stack ( 'zonmean (vv, bb, plat1d)' )
 
@@ -5486,32 +6728,39 @@ def zonmean (var:xr.DataArray, bb:xr.DataArray, plat1d:xr.DataArray,
         print ( f'{bb.dims = } {bb.shape=}' )
         print ( f'{var.dims = } {var.shape}' )
 
-    ax, _ = find_axis (var, 'x')
-    ay, _ = find_axis (var, 'y')
-    az, _ = find_axis (var, 'z')
+    if pack is not None :
+        ldims = { 'y':pack.dims[-2] }
+        zbb     = pack.pack (bb)
+        zon_bb  = pack.grid_zonal_sum (bb)
+        zon_bb  = zon_bb.where (zon_bb>0., np.nan)
+        zon_var = pack.zonal_sum (pack.pack (var) * zbb) / zon_bb
+    else :
+        ax, _ = find_axis (var, 'x')
+        ay, _ = find_axis (var, 'y')
+        az, _ = find_axis (var, 'z')
 
-    ldims = UDIMS.copy()
-    if ax :
-        ldims.update ({'x':ax})
-    if ay :
-        ldims.update ({'y':ay})
-    if az :
-        ldims.update ({'z':az})
+        ldims = UDIMS.copy()
+        if ax :
+            ldims.update ({'x':ax})
+        if ay :
+            ldims.update ({'y':ay})
+        if az :
+            ldims.update ({'z':az})
 
-    if OPTIONS['Debug'] or Debug :
-        print ( f'zonmean : {ldims=}' )
+        if OPTIONS['Debug'] or Debug :
+            print ( f'zonmean : {ldims=}' )
 
-    if OPTIONS['Debug'] or Debug :
-        print ('zonmean : zonal mean of volume')
-    zon_bb  = unify_dims (bb, **ldims).sum(dim=ldims['x'], min_count=1, keep_attrs=True)
-    zon_bb  = zon_bb.where (zon_bb>0., np.nan)
+        if OPTIONS['Debug'] or Debug :
+            print ('zonmean : zonal mean of volume')
+        zon_bb  = unify_dims (bb, **ldims).sum(dim=ldims['x'], min_count=1, keep_attrs=True)
+        zon_bb  = zon_bb.where (zon_bb>0., np.nan)
 
-    if OPTIONS['Debug'] or Debug :
-        print ( f'zonmean : {zon_bb.dims = }' )
-    if OPTIONS['Debug'] or Debug :
-        print ('zonmean : zonal mean of variable')
-    zon_var = (var * unify_dims (bb, **ldims)).sum(dim=ldims['x'],
-                                                   min_count=1, keep_attrs=True) / zon_bb
+        if OPTIONS['Debug'] or Debug :
+            print ( f'zonmean : {zon_bb.dims = }' )
+        if OPTIONS['Debug'] or Debug :
+            print ('zonmean : zonal mean of variable')
+        zon_var = (var * unify_dims (bb, **ldims)).sum(dim=ldims['x'],
+                                                       min_count=1, keep_attrs=True) / zon_bb
     zon_var = zon_var.where ( np.logical_not(np.isnan(zon_bb)), np.nan)
     zon_var = zon_var.where ( zon_bb>0, np.nan)
 
@@ -5533,28 +6782,41 @@ def zonmean (var:xr.DataArray, bb:xr.DataArray, plat1d:xr.DataArray,
 
 @validate_types
 def msf (vv:xr.DataArray, e1v_e3v:xr.DataArray, plat1d:xr.DataArray,
-         south:bool=False, Debug:bool=True) -> xr.DataArray :
+         south:bool=False, pack:Optional['OceanPack']=None, Debug:bool=True) -> xr.DataArray :
     '''
     Computes the meridonal stream function
 
     vv : meridional_velocity
     e1v_e3v : product of scale factors e1v*e3v
+    pack : OceanPack on V points. vv and e1v_e3v may then be packed (only
+           wet points), and the zonal sums are done on the packed arrays.
+           The mask of the result is built from the sum of e1v_e3v on the
+           grid, as without pack, when e1v_e3v is not packed
     '''
     push_stack ( 'msf (vv, e1v_e3v, plat1d, depthw)' )
 
-    ax, _ = find_axis (vv, 'x')
-    ay, _ = find_axis (vv, 'y')
-    az, _ = find_axis (vv, 'z')
+    if pack is not None :
+        v_e1v_e3v = pack.pack (vv) * pack.pack (e1v_e3v)
+        v_e1v_e3v.attrs = vv.attrs
+
+        mm    = pack.grid_zonal_sum (e1v_e3v)
+        zomsf = -pack.zonal_sum (v_e1v_e3v).fillna (0.)
+        az, _ = find_axis (zomsf, 'z')
+        zomsf = zomsf.cumsum (dim=az, keep_attrs=True)
+    else :
+        ax, _ = find_axis (vv, 'x')
+        ay, _ = find_axis (vv, 'y')
+        az, _ = find_axis (vv, 'z')
 
-    ldims = UDIMS.copy()
-    ldims.update ({'x':ax, 'y':ay, 'z':az})
+        ldims = UDIMS.copy()
+        ldims.update ({'x':ax, 'y':ay, 'z':az})
 
-    v_e1v_e3v = vv * unify_dims (e1v_e3v, **ldims)
-    v_e1v_e3v.attrs = vv.attrs
+        v_e1v_e3v = vv * unify_dims (e1v_e3v, **ldims)
+        v_e1v_e3v.attrs = vv.attrs
 
-    mm = e1v_e3v.sum (dim=ax, keep_attrs=True, min_count=1)
+        mm = e1v_e3v.sum (dim=ax, keep_attrs=True, min_count=1)
 
-    zomsf = -v_e1v_e3v.cumsum(dim=az, keep_attrs=True).sum(dim=ax, min_count=1, keep_attrs=True)
+        zomsf = -v_e1v_e3v.cumsum(dim=az, keep_attrs=True).sum(dim=ax, min_count=1, keep_attrs=True)
     zomsf = zomsf - zomsf.isel ({az:-1})
     zomsf = zomsf.where (mm>0, np.nan)
 
@@ -5578,6 +6840,232 @@ def msf (vv:xr.DataArray, e1v_e3v:xr.DataArray, plat1d:xr.DataArray,
     pop_stack ( 'msf' )
     return zomsf
 
+def CheckPackedMsf (Debug:bool=False) -> int :
+    '''
+    Check of msf and zonmean with an OceanPack : results are compared to the
+    computation on the grid, for a field with nan values on land, and scale
+    factors defined on land
+
+    Returns the number of mismatches (printed)
+    '''
+    zrng  = np.random.default_rng (0)
+    zdims = ('time_counter', 'depthv', 'y', 'x')
+    nt, nz, ny, nx = 2, 7, 9, 12
+    zmask = xr.DataArray ((zrng.random ((nz, ny, nx)) > 0.3).astype (float), dims=zdims[1:])
+    zmask[:, 4, :] = 0.     # A row with no ocean point
+    zmask[5:, :, :6] = 0.   # A shallow part
+    zpack = OceanPack (zmask, cd_type='V')
+    zvv   = xr.DataArray (zrng.standard_normal ((nt, nz, ny, nx)), dims=zdims).where (zmask > 0)
+    ze    = xr.DataArray (1.0 + zrng.random ((nz, ny, nx)), dims=zdims[1:])
+    zlat  = xr.DataArray (np.linspace (-60., 60., ny), dims=('y',))
+
+    nerror = 0
+    for zname, zref, znews in [
+            ('msf'    , msf (zvv, ze, zlat, Debug=False),
+                        [ msf (zvv, ze, zlat, pack=zpack, Debug=False),
+                          msf (zpack.pack (zvv), ze, zlat, pack=zpack, Debug=False) ]),
+            ('zonmean', zonmean (zvv, ze, zlat),
+                        [ zonmean (zvv, ze, zlat, pack=zpack),
+                          zonmean (zpack.pack (zvv), ze, zlat, pack=zpack) ]) ] :
+        for znew in znews :
+            znew = znew.transpose (*zref.dims)
+            if not np.allclose (zref.values, znew.values, equal_nan=True) :
+                nerror += 1
+                print ( f'CheckPackedMsf : {zname} differs with pack' )
+            elif OPTIONS['Debug'] or Debug :
+                print ( f'CheckPackedMsf : {zname} : ok' )
+
+    print ( f'CheckPackedMsf : {nerror} mismatch(es)' )
+    return nerror
+
+def _msf_basins_numpy (zv:np.ndarray, ze:np.ndarray, zb:np.ndarray) -> np.ndarray :
+    '''
+    Overturning of all basins : zv, ze [..., z, y, x], zb [basin, y, x]
+    Returns [..., basin, z, y]
+    '''
+    ztrp = np.nan_to_num (zv * ze)
+    zmsf = -np.einsum ('...zyx,byx->...bzy', ztrp, np.nan_to_num (zb), optimize=True)
+    zmsf = np.cumsum (zmsf, axis=-2)
+    return zmsf - zmsf[..., -1:, :]
+
+@validate_types
+def msf_basins (vv:xr.DataArray, e1v_e3v:xr.DataArray, basins:xr.DataArray,
+                plat1d:xr.DataArray, south:bool=False, Debug:bool=False) -> xr.DataArray :
+    '''
+    Meridional overturning stream function of several basins in one pass
+
+    vv      : meridional velocity [..., z, y, x]
+    e1v_e3v : product of scale factors e1v*e3v
+    basins  : basin masks stacked along a 'basin' dimension [basin, y, x],
+              see GridMask.basins
+
+    The transport is reduced along x with all basin masks at once (einsum),
+    then summed along depth. Dask chunks of vv (e.g. along time) are processed
+    independently : long series stream through in bounded memory
+    '''
+    push_stack ( 'msf_basins (vv, e1v_e3v, basins, plat1d)' )
+
+    ax, _ = find_axis (vv, 'x')
+    ay, _ = find_axis (vv, 'y')
+    az, _ = find_axis (vv, 'z')
+    zbasins = like_axes (basins, vv)
+    ze      = like_axes (e1v_e3v, vv)
+
+    # Core dimensions of apply_ufunc should be in a single dask chunk
+    if vv.chunks is not None :
+        vv = vv.chunk ({az:-1, ay:-1, ax:-1})
+    if ze.chunks is not None :
+        ze = ze.chunk ({az:-1, ay:-1, ax:-1})
+    if zbasins.chunks is not None :
+        zbasins = zbasins.chunk ({'basin':-1, ay:-1, ax:-1})
+    zomsf = xr.apply_ufunc (
+        _msf_basins_numpy, vv, ze, zbasins,
+        input_core_dims=[[az, ay, ax], [az, ay, ax], ['basin', ay, ax]],
+        output_core_dims=[['basin', az, ay]],
+        dask='parallelized', output_dtypes=[np.result_type (vv.dtype, np.float32)] )
+
+    # Basins and rows without ocean points
+    mm    = xr.dot (ze.fillna (0.), zbasins.fillna (0.), dim=ax)
+    zomsf = zomsf.where (mm>0, np.nan)
+
+    zomsf = zomsf.assign_coords ({ay:plat1d.values, 'basin':zbasins['basin'].values})
+    zomsf = zomsf.rename ({ay:'lat'})
+
+    zomsf.attrs ['standard_name'] = 'stfmmcgo'
+    zomsf.attrs ['long_name']     = 'ocean_meridional_overturning_streamfunction'
+    zomsf.attrs ['units']         = 'm3s-1'
+    zomsf.lat.attrs = plat1d.attrs
+
+    if south :
+        if OPTIONS['Debug'] or Debug :
+            print ( 'Mask south of -30' )
+        zomsf = zomsf.where (zomsf.lat > -30, np.nan)
+
+    pop_stack ( 'msf_basins' )
+    return zomsf
+
+def _msf_sigma_numpy (zv:np.ndarray, ze:np.ndarray, zr:np.ndarray, zb:np.ndarray,
+                      bins:np.ndarray) -> np.ndarray :
+    '''
+    Overturning of all basins in density classes : zv, ze, zr [..., z, y, x],
+    zb [basin, y, x], bins [nsig+1]. Returns [..., basin, sig, y]
+
+    Transports are accumulated with np.bincount on (leading, y, class)
+    indexes : no array with both depth and density dimensions is built
+    '''
+    ztrp  = zv * ze
+    zlead = ztrp.shape[:-3]
+    nz, ny, nx = ztrp.shape[-3:]
+    nb, nsig   = zb.shape[0], len (bins) - 1
+    nlead      = int (np.prod (zlead))
+
+    ztrp = ztrp.reshape (nlead, nz, ny, nx)
+    zr   = np.broadcast_to (zr, zlead + (nz, ny, nx)).reshape (nlead, nz, ny, nx)
+    zok  = np.isfinite (ztrp) & np.isfinite (zr)
+
+    # Class index, out of range densities go to the first or last class
+    zk   = np.clip (np.searchsorted (bins, zr[zok], side='right') - 1, 0, nsig-1)
+    zrow = np.arange (nlead)[:, None, None, None] * ny + np.arange (ny)[None, None, :, None]
+    zidx = np.broadcast_to (zrow, zok.shape)[zok] * nsig + zk
+    ztrp = ztrp[zok]
+    zb   = np.nan_to_num (zb)
+
+    zmsf = np.empty ( (nb, nlead, ny, nsig), dtype=np.result_type (ztrp.dtype, np.float32) )
+    for jb in range (nb) :
+        zw = ztrp * np.broadcast_to (zb[jb], zok.shape)[zok]
+        zmsf[jb] = np.bincount (zidx, weights=zw, minlength=nlead*ny*nsig).reshape (nlead, ny, nsig)
+
+    zmsf = -np.cumsum (zmsf, axis=-1)
+    zmsf = zmsf - zmsf[..., -1:]
+    return zmsf.transpose (1, 0, 3, 2).reshape (zlead + (nb, nsig, ny))
+
+@validate_types
+def msf_sigma (vv:xr.DataArray, e1v_e3v:xr.DataArray, ptemp:xr.DataArray, psal:xr.DataArray,
+               basins:xr.DataArray, plat1d:xr.DataArray, sigma_bins:Iterable[float]|np.ndarray,
+               pref:int|float|None=None, tpoints:bool=True, south:bool=False,
+               Debug:bool=False) -> xr.DataArray :
+    '''
+    Meridional overturning stream function in density coordinates, for
+    several basins in one pass
+
+    vv         : meridional velocity [..., z, y, x]
+    e1v_e3v    : product of scale factors e1v*e3v
+    ptemp      : temperature, psal : salinity [..., z, y, x]
+    basins     : basin masks stacked along a 'basin' dimension, see GridMask.basins
+    sigma_bins : edges of the density classes (density - 1000, kg/m3)
+    pref       : reference depth (m) of the density. None for rhop (sigma0),
+                 e.g. 2000 for sigma2
+    tpoints    : ptemp and psal are on T points. Density is then averaged
+                 on V points
+
+    Density is computed lazily with rhop or rho, on the dask chunks of ptemp
+    and psal. For each chunk, transports v.e1v.e3v are accumulated in
+    density classes per latitude row (np.bincount), then summed from light
+    to dense classes. The result is given at the dense edge of each class
+    '''
+    push_stack ( f'msf_sigma (vv, e1v_e3v, ptemp, psal, basins, plat1d, sigma_bins, {pref=})' )
+
+    zbins = np.asarray (sigma_bins, dtype=float)
+    if zbins.ndim != 1 or zbins.size < 2 or np.any (np.diff (zbins) <= 0) :
+        raise ValueError ( 'msf_sigma : sigma_bins should be increasing, with at least two values' )
+
+    ax, _ = find_axis (vv, 'x')
+    ay, _ = find_axis (vv, 'y')
+    az, _ = find_axis (vv, 'z')
+
+    if pref is None :
+        zrho = rhop (ptemp, psal) - 1000.
+    else :
+        zrho = rho (xr.full_like (ptemp, float (pref)), ptemp, psal) - 1000.
+    zrho = like_axes (zrho, vv)
+    zrho = zrho.drop_vars ([zc for zc in (ax, ay, az) if zc in zrho.coords])
+    if tpoints :
+        zrho = xr.concat ([zrho, zrho.shift ({ay:-1})], dim='zave').mean (dim='zave')
+    zrho = zrho.where (np.isfinite (vv))
+
+    zbasins = like_axes (basins, vv)
+    ze      = like_axes (e1v_e3v, vv)
+
+    # Core dimensions of apply_ufunc should be in a single dask chunk
+    if vv.chunks is not None :
+        vv   = vv.chunk   ({az:-1, ay:-1, ax:-1})
+    if ze.chunks is not None :
+        ze   = ze.chunk   ({az:-1, ay:-1, ax:-1})
+    if zrho.chunks is not None :
+        zrho = zrho.chunk ({az:-1, ay:-1, ax:-1})
+    if zbasins.chunks is not None :
+        zbasins = zbasins.chunk ({'basin':-1, ay:-1, ax:-1})
+    zomsf = xr.apply_ufunc (
+        _msf_sigma_numpy, vv, ze, zrho, zbasins,
+        input_core_dims=[[az, ay, ax], [az, ay, ax], [az, ay, ax], ['basin', ay, ax]],
+        output_core_dims=[['basin', 'sigma', ay]], kwargs={'bins':zbins},
+        dask='parallelized', output_dtypes=[np.result_type (vv.dtype, np.float32)],
+        dask_gufunc_kwargs={'output_sizes':{'sigma':zbins.size-1}} )
+
+    # Basins and rows without ocean points
+    mm    = xr.dot (ze.fillna (0.), zbasins.fillna (0.), dim=[az, ax])
+    zomsf = zomsf.where (mm>0, np.nan)
+
+    zomsf = zomsf.assign_coords ({ay:plat1d.values, 'basin':zbasins['basin'].values,
+                                  'sigma':zbins[1:]})
+    zomsf = zomsf.rename ({ay:'lat'})
+
+    zomsf.attrs ['standard_name'] = 'stfmmcgo'
+    zomsf.attrs ['long_name']     = 'ocean_meridional_overturning_streamfunction'
+    zomsf.attrs ['units']         = 'm3s-1'
+    zomsf.lat.attrs = plat1d.attrs
+    zomsf.sigma.attrs = { 'long_name':'potential density anomaly (upper edge of class)',
+                          'units':'kg/m3', 'positive':'down' }
+    zomsf.sigma.attrs ['reference_depth'] = 0. if pref is None else float (pref)
+
+    if south :
+        if OPTIONS['Debug'] or Debug :
+            print ( 'Mask south of -30' )
+        zomsf = zomsf.where (zomsf.lat > -30, np.nan)
+
+    pop_stack ( 'msf_sigma' )
+    return zomsf
+
 @validate_types
 def zmsf_index (zmsf:xr.DataArray, bname:Literal['nadw', 'aabw', 'npdw', 'deacon']='nadw',
                 latname:str='nav_lat', lat:xr.DataArray|None=None,
@@ -5805,6 +7293,389 @@ def fill_closed_seas (imask:xr.DataArray, cd_type:CDTYPE_LITERAL|str='T',
     pop_stack ( 'fill_closed_seas' )
     return imask_filled
 
+## ============================================================================
+## Region statistics
+##   The index boxes of Regions are rasterised once per configuration and grid
+##   shape into integer label layers : each point holds the number of a region
+##   or -1. Overlapping regions are put in different layers. Weighted sums,
+##   extrema and variances of all regions are then computed with np.bincount
+##   (and np.minimum.at/np.maximum.at) on these labels, for all time steps at
+##   once, blockwise on dask arrays.
+## ============================================================================
+
+class RegionLabels (NamedTuple) :
+    '''
+    Regions rasterised on a grid, as built by region_labels
+
+    labels[layer, y, x] is the index of a region in names, or -1
+    '''
+    names  : tuple[str, ...]
+    labels : np.ndarray
+
+@functools.lru_cache (maxsize=32)
+def _region_labels (CFG_name:str, shape:tuple[int, int], names:tuple[str, ...]) -> RegionLabels :
+    '''Rasterise regions in label layers (cached)'''
+    zlayers:list[np.ndarray] = []
+    for jr, name in enumerate (names) :
+        zbox = np.zeros (shape, dtype=bool)
+        zbox[Regions[CFG_name][name]['idyx']['y'], Regions[CFG_name][name]['idyx']['x']] = True
+        for zlab in zlayers :
+            if not (zlab[zbox] >= 0).any () :
+                break
+        else :
+            zlab = np.full (shape, -1, dtype=np.int32)
+            zlayers.append (zlab)
+        zlab[zbox] = jr
+    if not zlayers :
+        zlayers.append (np.full (shape, -1, dtype=np.int32))
+    zlabels = np.stack (zlayers)
+    zlabels.flags.writeable = False
+    return RegionLabels (names, zlabels)
+
+def clear_region_cache () -> None :
+    '''Clear the cache of region labels'''
+    _region_labels.cache_clear ()
+
+def region_labels (domain:Domain, shape:tuple[int, ...],
+                   names:Iterable[str]|None=None) -> RegionLabels :
+    '''
+    Label layers of the regions of a domain (see Regions)
+
+    shape : horizontal shape (jpj, jpi) of the arrays
+    names : regions to rasterise. Default is all regions of the configuration
+    '''
+    if domain.CFG_name not in Regions :
+        raise ValueError ( f'region_labels : no regions defined for {domain.CFG_name=}' )
+    if names is None :
+        names = Regions[domain.CFG_name].keys ()
+    names = tuple (names)
+    for name in names :
+        if name not in Regions[domain.CFG_name] :
+            raise ValueError ( f'region_labels : unknown region {name} for {domain.CFG_name}' )
+    return _region_labels (domain.CFG_name, (int (shape[-2]), int (shape[-1])), names)
+
+REGION_STATS:tuple[str, ...] = ('mean', 'min', 'max', 'sum', 'var')
+
+def _region_stats_numpy (zv:np.ndarray, zw:np.ndarray, zlab:np.ndarray,
+                         nreg:int, ndim:int) -> np.ndarray :
+    '''
+    Statistics of all regions : zv, zw [..., (z), y, x], zlab [layer, y, x]
+    ndim is the number of reduced dimensions. Returns [..., stat, region]
+    '''
+    zcore = zv.shape[-ndim:]
+    zlead = zv.shape[:-ndim]
+    nlead = int (np.prod (zlead))
+    zv    = zv.reshape (nlead, -1)
+    zw    = np.broadcast_to (zw, zlead + zcore).reshape (nlead, -1)
+    zlab  = np.broadcast_to (zlab.reshape ((zlab.shape[0],) + (1,)*(ndim-2) + zlab.shape[-2:]),
+                             (zlab.shape[0],) + zcore).reshape (zlab.shape[0], -1)
+    zok   = np.isfinite (zv) & np.isfinite (zw) & (zw > 0)
+    zrow  = np.arange (nlead)[:, None] * nreg
+
+    nout = nlead * nreg
+    zsw  = np.zeros (nout)
+    zswv = np.zeros (nout)
+    zmin = np.full  (nout,  np.inf)
+    zmax = np.full  (nout, -np.inf)
+    zpts = []
+    for zl in zlab :
+        zsel = zok & (zl >= 0)[None, :]
+        zidx = (zrow + zl[None, :])[zsel]
+        zval, zwgt = zv[zsel], zw[zsel]
+        zsw  += np.bincount (zidx, weights=zwgt     , minlength=nout)
+        zswv += np.bincount (zidx, weights=zwgt*zval, minlength=nout)
+        np.minimum.at (zmin, zidx, zval)
+        np.maximum.at (zmax, zidx, zval)
+        zpts.append ( (zidx, zval, zwgt) )
+
+    with np.errstate (invalid='ignore', divide='ignore') :
+        zmean = zswv / zsw
+        # Variance around the mean, with the same indexes
+        zsq   = np.zeros (nout)
+        for zidx, zval, zwgt in zpts :
+            zsq += np.bincount (zidx, weights=zwgt*(zval - zmean[zidx])**2, minlength=nout)
+        zvar  = zsq / zsw
+    zempty = zsw == 0
+    zswv[zempty], zmin[zempty], zmax[zempty] = np.nan, np.nan, np.nan
+
+    zstats = np.stack ([zmean, zmin, zmax, zswv, zvar], axis=0).reshape (len (REGION_STATS), nlead, nreg)
+    return np.moveaxis (zstats, 0, 1).reshape (zlead + (len (REGION_STATS), nreg))
+
+@validate_types
+def region_stats (ptab:xr.DataArray, weights:xr.DataArray, names:Iterable[str]|None=None,
+                  domain:Domain|None=None, Debug:bool=False) -> xr.Dataset :
+    '''
+    Weighted statistics of a field over all regions of the configuration (see Regions)
+
+    ptab    : field [..., y, x] or [..., z, y, x]
+    weights : area (e.g. e1t*e2t) or volume (e.g. e1t*e2t*e3t) of the cells.
+              Points with a nul or missing weight or value are not used
+    names   : regions. Default is all regions of the configuration
+
+    Returns a Dataset with mean, min, max, sum (weighted integral) and var
+    (weighted variance) along the leading dimensions of ptab (e.g. time) and
+    a 'region' dimension. With a z dimension, statistics are over the volume
+    of the regions
+    '''
+    push_stack ( f'region_stats (ptab, weights, {names=}, domain)' )
+    zdom = Domain (ptab=ptab, domain=domain)
+    ax, _ = find_axis (ptab, 'x')
+    ay, _ = find_axis (ptab, 'y')
+    az, _ = find_axis (ptab, 'z')
+    zcore = [zd for zd in (az, ay, ax) if zd is not None and zd in ptab.dims]
+
+    zregions = region_labels (zdom, (ptab.sizes[ay], ptab.sizes[ax]), names)
+    if OPTIONS['Debug'] or Debug :
+        print ( f'region_stats : {len (zregions.names)} regions in {zregions.labels.shape[0]} layers' )
+
+    zlab = xr.DataArray (zregions.labels, dims=('layer', ay, ax))
+    zw   = like_axes (weights, ptab)
+    zw   = zw.drop_vars ([zc for zc in zcore if zc in zw.coords])
+    for zd in zcore :
+        if zd not in zw.dims :
+            zw = zw.expand_dims ({zd:ptab.sizes[zd]})
+    # Core dimensions must be a single chunk, for the field and the weights
+    if ptab.chunks is not None :
+        ptab = ptab.chunk ({zd:-1 for zd in zcore})
+    if zw.chunks is not None :
+        zw = zw.chunk ({zd:-1 for zd in zcore})
+
+    zstats = xr.apply_ufunc (
+        _region_stats_numpy, ptab, zw, zlab,
+        input_core_dims=[zcore, zcore, ['layer', ay, ax]],
+        output_core_dims=[['stat', 'region']],
+        kwargs={'nreg':len (zregions.names), 'ndim':len (zcore)},
+        dask='parallelized', output_dtypes=[np.float64],
+        dask_gufunc_kwargs={'output_sizes':{'stat':len (REGION_STATS),
+                                            'region':len (zregions.names)}} )
+
+    zlong = [ Regions['region'].get (name, {}).get ('Basin', name) for name in zregions.names ]
+    zstats = zstats.assign_coords ({'region':list (zregions.names), 'stat':list (REGION_STATS)})
+    zstats = zstats.assign_coords (region_name=('region', zlong))
+    zds = zstats.to_dataset (dim='stat')
+
+    for stat in REGION_STATS :
+        zds[stat].attrs = ptab.attrs.copy ()
+        if 'long_name' in ptab.attrs :
+            zds[stat].attrs ['long_name'] = f'{ptab.attrs["long_name"]} - region {stat}'
+    zds['sum'].attrs.pop ('units', None)
+    zds['var'].attrs.pop ('units', None)
+
+    pop_stack ( 'region_stats' )
+    return zds
+
+## ============================================================================
+## Strait transports
+##   The sections of Straits are lines of U faces (one column : zonal
+##   transport) or of V faces (one row : meridional transport). A
+##   StraitOperator keeps, for all the points of all sections, the flat index
+##   of the velocity point, the two T points on each side of the face, the
+##   sign and the metric (e2u*e3u or e1v*e3v), and a sparse matrix summing the
+##   points of each section. Transports of all sections and all time steps
+##   are one gather and one sparse product per chunk.
+## ============================================================================
+
+class StraitOperator (NamedTuple) :
+    '''
+    Section operator of a set of straits, as built by strait_operator
+
+    Points are the U points of all sections, then the V points. nu is the
+    number of U points. idx is the flat index of the point in the (z, y, x)
+    velocity array of its grid, ia and ib the flat index of the T points on
+    both sides in the (z, y, x) T array. weight is sign*e2u*e3u or
+    sign*e1v*e3v. matrix[strait, point] is 1 when the point belongs to the
+    section
+    '''
+    names  : tuple[str, ...]
+    shape  : tuple[int, int, int]
+    nu     : int
+    idx    : np.ndarray
+    ia     : np.ndarray
+    ib     : np.ndarray
+    weight : np.ndarray
+    matrix : sparse.csr_matrix
+
+@functools.lru_cache (maxsize=32)
+def _strait_faces (CFG_name:str, shape:tuple[int, int], names:tuple[str, ...]) -> tuple :
+    '''
+    Faces of the sections (cached) : for U then V faces, (strait, j, i) of
+    the velocity points
+    '''
+    zfaces:dict[str, list] = { 'U':[], 'V':[] }
+    for js, name in enumerate (names) :
+        zbox = np.zeros (shape, dtype=bool)
+        zbox[Straits[CFG_name][name]['idyx']['y'], Straits[CFG_name][name]['idyx']['x']] = True
+        zj, zi = np.nonzero (zbox)
+        if zj.size == 0 :
+            raise ValueError ( f'strait_operator : empty section for {name} in {CFG_name}' )
+        # One column : flow across x (U faces). Otherwise one row : flow across y (V faces)
+        cd_type = 'U' if np.unique (zi).size == 1 and np.unique (zj).size > 1 else 'V'
+        zfaces[cd_type].append ( (np.full (zj.size, js), zj, zi) )
+    zres = []
+    for cd_type in ('U', 'V') :
+        if zfaces[cd_type] :
+            zres.append (tuple (np.concatenate (zarr) for zarr in zip (*zfaces[cd_type])))
+        else :
+            zres.append (tuple (np.zeros (0, dtype=int) for _ in range (3)))
+    for zarrs in zres :
+        for zarr in zarrs :
+            zarr.flags.writeable = False
+    return tuple (zres)
+
+def clear_strait_cache () -> None :
+    '''Clear the cache of strait sections'''
+    _strait_faces.cache_clear ()
+
+def strait_operator (domain:Domain, e2u_e3u:xr.DataArray, e1v_e3v:xr.DataArray,
+                     names:Iterable[str]|None=None,
+                     signs:dict[str, int|float]|None=None) -> StraitOperator :
+    '''
+    Section operator of the straits of a domain (see Straits)
+
+    e2u_e3u : e2u*e3u [z, y, x] on U points
+    e1v_e3v : e1v*e3v [z, y, x] on V points
+    names   : straits. Default is all straits of the configuration
+    signs   : sign of the transport of each strait. Default is 1 :
+              eastward for zonal sections, northward for meridional ones
+
+    Build it once, and use it for all calls of strait_transports
+    '''
+    if domain.CFG_name not in Straits :
+        raise ValueError ( f'strait_operator : no straits defined for {domain.CFG_name=}' )
+    if names is None :
+        names = Straits[domain.CFG_name].keys ()
+    names = tuple (names)
+    for name in names :
+        if name not in Straits[domain.CFG_name] :
+            raise ValueError ( f'strait_operator : unknown strait {name} for {domain.CFG_name}' )
+    zsign = np.array ([ (signs or {}).get (name, 1) for name in names ], dtype=float)
+
+    zmetrics = {}
+    for cd_type, zmet in (('U', e2u_e3u), ('V', e1v_e3v)) :
+        zaxes = find_axes (zmet)
+        zmetrics[cd_type] = zmet.transpose (*[zaxes.get (kind)[0] for kind in ('z', 'y', 'x')]).values
+    if zmetrics['U'].shape != zmetrics['V'].shape :
+        raise ValueError ( 'strait_operator : e2u_e3u and e1v_e3v should have the same shape' )
+    nz, ny, nx = zmetrics['U'].shape
+    zfaces = _strait_faces (domain.CFG_name, (ny, nx), names)
+
+    zstr, zidx, zia, zib, zwgt = [], [], [], [], []
+    zk = np.arange (nz)[:, None]
+    for cd_type, (js, jj, ji) in zip (('U', 'V'), zfaces) :
+        # T points on both sides of the face
+        if cd_type == 'U' :
+            jjb, jib = jj, (ji + 1) % nx
+        else :
+            jjb, jib = np.minimum (jj + 1, ny-1), ji
+        zstr.append (np.broadcast_to (js, (nz, js.size)).ravel ())
+        zidx.append ( ((zk*ny + jj)*nx + ji  ).ravel () )
+        zia.append  ( ((zk*ny + jj)*nx + ji  ).ravel () )
+        zib.append  ( ((zk*ny + jjb)*nx + jib).ravel () )
+        zwgt.append ( (zmetrics[cd_type][:, jj, ji] * zsign[js][None, :]).ravel () )
+    nu = zidx[0].size
+    zstr, zidx, zia, zib, zwgt = (np.concatenate (zarr) for zarr in (zstr, zidx, zia, zib, zwgt))
+    zwgt = np.nan_to_num (zwgt)
+
+    zmatrix = sparse.csr_matrix ( (np.ones (zstr.size), (zstr, np.arange (zstr.size))),
+                                  shape=(len (names), zstr.size) )
+    return StraitOperator (names, (nz, ny, nx), nu, zidx, zia, zib, zwgt, zmatrix)
+
+def _strait_transports_numpy (zu:np.ndarray, zv:np.ndarray, *ztracers:np.ndarray,
+                              operator:StraitOperator) -> np.ndarray :
+    '''
+    Transports through all sections : zu, zv, tracers [..., z, y, x]
+    Returns [..., transport, strait], with net, positive and negative
+    transports of volume, then of each tracer
+    '''
+    zlead = np.broadcast_shapes (zu.shape[:-3], zv.shape[:-3], *(zt.shape[:-3] for zt in ztracers))
+    nlead = int (np.prod (zlead))
+    zop   = operator
+    zu = np.broadcast_to (zu, zlead + zu.shape[-3:]).reshape (nlead, -1)
+    zv = np.broadcast_to (zv, zlead + zv.shape[-3:]).reshape (nlead, -1)
+
+    ztrp = np.concatenate ([zu[:, zop.idx[:zop.nu]], zv[:, zop.idx[zop.nu:]]], axis=1)
+    ztrp = np.nan_to_num (ztrp * zop.weight)
+    zfluxes = [ztrp]
+    for zt in ztracers :
+        zt = np.broadcast_to (zt, zlead + zt.shape[-3:]).reshape (nlead, -1)
+        za, zb = zt[:, zop.ia], zt[:, zop.ib]
+        zface  = ( (np.nan_to_num (za) + np.nan_to_num (zb))
+                   / np.maximum (np.isfinite (za).astype (int) + np.isfinite (zb), 1) )
+        zfluxes.append (np.nan_to_num (ztrp * zface))
+
+    zres = []
+    for zf in zfluxes :
+        zres += [ zf, np.maximum (zf, 0.), np.minimum (zf, 0.) ]
+    # One sparse product for all transports and time steps
+    zres = zop.matrix @ np.concatenate (zres, axis=0).T
+    zres = zres.reshape (len (zop.names), len (zfluxes)*3, nlead)
+    return np.moveaxis (zres, -1, 0).transpose (0, 2, 1).reshape (zlead + (len (zfluxes)*3, len (zop.names)))
+
+@validate_types
+def strait_transports (uu:xr.DataArray, vv:xr.DataArray, operator:StraitOperator,
+                       ptemp:xr.DataArray|None=None, psal:xr.DataArray|None=None,
+                       Debug:bool=False) -> xr.Dataset :
+    '''
+    Volume, heat and salt transports through all straits of an operator
+
+    uu, vv   : velocities [..., z, y, x] on U and V points
+    operator : StraitOperator, see strait_operator
+    ptemp, psal : temperature and salinity [..., z, y, x] on T points. Values
+               on the faces are the mean of the T points on both sides
+
+    Returns a Dataset along the leading dimensions of uu (e.g. time) and a
+    'strait' dimension, with net, positive and negative transports :
+    vol, vol_pos, vol_neg (Sv), and heat_* (PW), salt_* (1e6 kg/s) when
+    ptemp and psal are given
+    '''
+    push_stack ( 'strait_transports (uu, vv, operator, ptemp, psal)' )
+
+    zinputs = [uu, vv]
+    zkinds  = ['vol']
+    zfacts  = [1.e-6]
+    if ptemp is not None :
+        zinputs.append (ptemp)
+        zkinds.append  ('heat')
+        zfacts.append  (float (RAU0) * float (RCP) * 1.e-15)
+    if psal is not None :
+        zinputs.append (psal)
+        zkinds.append  ('salt')
+        zfacts.append  (float (RAU0) * 1.e-3 * 1.e-6)
+    zunits = { 'vol':'Sv', 'heat':'PW', 'salt':'1e6 kg/s' }
+
+    zcores = []
+    for ztab in zinputs :
+        zaxes = find_axes (ztab)
+        zcore = [zaxes.get (kind)[0] for kind in ('z', 'y', 'x')]
+        if None in zcore or tuple (ztab.sizes[zd] for zd in zcore) != operator.shape :
+            raise ValueError ( f'strait_transports : arrays should be [..., z, y, x] of shape {operator.shape}' )
+        zcores.append (zcore)
+    if OPTIONS['Debug'] or Debug :
+        print ( f'strait_transports : {len (operator.names)} straits, {operator.idx.size} points, {zkinds=}' )
+    zinputs = [ ztab.chunk ({zd:-1 for zd in zcore}) if ztab.chunks is not None else ztab
+                for ztab, zcore in zip (zinputs, zcores) ]
+
+    ntrp = 3*len (zkinds)
+    ztrp = xr.apply_ufunc (
+        _strait_transports_numpy, *zinputs,
+        input_core_dims=zcores, output_core_dims=[['transport', 'strait']],
+        kwargs={'operator':operator}, dask='parallelized', output_dtypes=[np.float64],
+        dask_gufunc_kwargs={'output_sizes':{'transport':ntrp, 'strait':len (operator.names)}} )
+
+    znames = [ f'{kind}{suffix}' for kind in zkinds for suffix in ('', '_pos', '_neg') ]
+    zfact  = xr.DataArray (np.repeat (zfacts, 3), dims=('transport',))
+    ztrp   = (ztrp * zfact).assign_coords ({'transport':znames, 'strait':list (operator.names)})
+    zlong  = [ Straits['strait'].get (name, {}).get ('Strait', name) for name in operator.names ]
+    ztrp   = ztrp.assign_coords (strait_name=('strait', zlong))
+    zds    = ztrp.to_dataset (dim='transport')
+    for kind in zkinds :
+        for suffix, zlong in (('', 'net'), ('_pos', 'positive'), ('_neg', 'negative')) :
+            zds[f'{kind}{suffix}'].attrs = { 'units':zunits[kind],
+                                             'long_name':f'{zlong} {kind} transport' }
+
+    pop_stack ( 'strait_transports' )
+    return zds
+
 # ======================================================
 # Sea water state function parameters from NEMO code
 
@@ -22,11 +22,16 @@ the usage of his software by incorrectly or partially configured
 personal.
 '''
 
+import os
+import glob
 import time
-from typing import Tuple, List, Dict
+import hashlib
+from collections import OrderedDict
+from typing import Tuple, List, Dict, Literal, Any
 
 import numpy as np
 import xarray as xr
+from scipy import sparse
 
 from plotIGCM.options import OPTIONS
 from plotIGCM.options import push_stack
@@ -95,27 +100,28 @@ def compute_links (remap_matrix:np.ndarray|xr.DataArray, # pylint: disable=too-m
                              np.ndarray|xr.DataArray,np.ndarray|xr.DataArray] :
     '''
     Compute link information for remapping by aggregating source and destination grid weights.
+
+    Returns number of links and sum of weights on each source and destination point.
+    Addresses should be in python/C convention : starting at 0
     '''
     push_stack ( f'compute_links ( remap_matrix, src_address, dst_address,'
                  f' {src_grid_size=}, {dst_grid_size=}, {num_links=} )' )
 
-    src_grid_target     = np.zeros ((src_grid_size,), dtype=int)
-    src_grid_weight     = np.zeros ((src_grid_size,))
+    src_address  = np.asarray (src_address )[:num_links]
+    dst_address  = np.asarray (dst_address )[:num_links]
+    remap_matrix = np.asarray (remap_matrix)[:num_links]
 
-    dst_grid_target     = np.zeros ((dst_grid_size,), dtype=int)
-    dst_grid_weight     = np.zeros ((dst_grid_size,))
-    for link in range (num_links) :
-        if link%1000 == 0 :
-            print ( link, end=' ' )
-        src_grid_target[src_address[link]] += 1
-        src_grid_weight[src_address[link]] += remap_matrix [link]
-        dst_grid_target[dst_address[link]] += 1
-        dst_grid_weight[dst_address[link]] += remap_matrix [link]
+    src_grid_target = np.bincount (src_address,                       minlength=src_grid_size)
+    src_grid_weight = np.bincount (src_address, weights=remap_matrix, minlength=src_grid_size)
+    dst_grid_target = np.bincount (dst_address,                       minlength=dst_grid_size)
+    dst_grid_weight = np.bincount (dst_address, weights=remap_matrix, minlength=dst_grid_size)
 
     pop_stack ( 'compute_links')
     return src_grid_target, src_grid_weight, dst_grid_target, dst_grid_weight
 
-def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset, Debug:bool=False # pylint: disable=too-many-locals,too-many-statements
+def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset|str, # pylint: disable=too-many-locals,too-many-statements
+               engine:Literal['sparse', 'loop']='sparse', cache:bool=True,
+               lazy:bool|None=None, Debug:bool=False
                ) -> Tuple[xr.DataArray, xr.DataArray, xr.DataArray] :
     '''
     Remap a field using OASIS rmpfile
@@ -125,28 +131,63 @@ def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset, Debug:bool=False # pylint: d
           ptab dimensions are [...., y, x]
           y, x are geographical positions
 
-      d_rmp : an xarray dataset corresponding to a rmp file
+      d_rmp : an xarray dataset corresponding to a rmp file, or the name of the file
           Weight files are at OASIS-MCT format (matching ESMF or CDO weights files format)
 
-      sval : value of destinations points with no value assigned by the interpolation
+      engine : 'sparse' (default) applies a compressed sparse row operator built
+          once from the rmp file. 'loop' walks the links one by one : slow,
+          kept as a reference to check the sparse engine
+
+      cache : with the sparse engine, reuse the operator compiled in a previous call
+          (or a previous session if OPTIONS['CacheDir'] is set). See rmp_operator
+
+      lazy : keep ptab as a dask array and remap it block by block over the
+          non spatial dimensions. The result is a lazy DataArray, computed on demand.
+          Default : lazy if ptab is chunked. Only with the sparse engine
     '''
 
-    push_stack ( 'rmp_remap :  Read rmp file')
+    if lazy is None :
+        lazy = ptab.chunks is not None
+
+    push_stack ( f'rmp_remap :  Read rmp file, {engine=}, {cache=}, {lazy=}')
+
+    if lazy and engine != 'sparse' :
+        raise ValueError ( f'rmp_remap : lazy mode needs the sparse engine, got {engine=}' )
+
+    rmp_opened = isinstance (d_rmp, str)
+    if rmp_opened :
+        d_rmp = xr.open_dataset (d_rmp, decode_times=False)
+
+    if engine == 'sparse' :
+        rmp_op = rmp_operator (d_rmp, cache=cache, Debug=Debug)
+        src_ny, src_nx = rmp_op['src_grid_dims']
+        dst_ny, dst_nx = rmp_op['dst_grid_dims']
+        dst_lon        = rmp_op['dst_lon']
+        dst_lat        = rmp_op['dst_lat']
+    else :
+        num_links      = d_rmp.sizes ['num_links']
+        src_grid_size  = d_rmp.sizes ['src_grid_size']
+        dst_grid_size  = d_rmp.sizes ['dst_grid_size']
+        # Address in rmp file are in Fortran convention : starting a 1
+        # Here we shift to python/C convention : starting at 0
+        src_address    = d_rmp ['src_address'].values - 1
+        dst_address    = d_rmp ['dst_address'].values - 1
+        remap_matrix   = d_rmp ['remap_matrix'][:,0].values
+        dst_lon        = d_rmp ['dst_grid_center_lon'].values
+        dst_lat        = d_rmp ['dst_grid_center_lat'].values
+
+        # Get dimensions of source and destination field
+        src_ny, src_nx = d_rmp ['src_grid_dims'].values
+        dst_ny, dst_nx = d_rmp ['dst_grid_dims'].values
 
-    num_links      = d_rmp.sizes ['num_links']
-    src_grid_size  = d_rmp.sizes ['src_grid_size']
-    dst_grid_size  = d_rmp.sizes ['dst_grid_size']
-    # Address in rmp file are in Fortran convention : starting a 1
-    # Here we shift to python/C convention : starting at 0
-    src_address    = d_rmp ['src_address'].values - 1
-    dst_address    = d_rmp ['dst_address'].values - 1
-    remap_matrix   = d_rmp ['remap_matrix'][:,0].values
-    dst_lon        = d_rmp['dst_grid_center_lon']
-    dst_lat        = d_rmp['dst_grid_center_lat']
+        if OPTIONS['Debug'] or Debug :
+            print ('grid sizes      : ', src_grid_size, dst_grid_size)
+            print ('num_links       : ', num_links)
+            print ('address sizes   : ', src_address.shape, dst_address.shape, remap_matrix.shape)
 
-    # Get dimensions of source and destination field
-    src_ny, src_nx = d_rmp ['src_grid_dims'].values
-    dst_ny, dst_nx = d_rmp ['dst_grid_dims'].values
+    # All needed values are read : close the file if opened here
+    if rmp_opened :
+        d_rmp.close ()
 
     if ptab.shape[-2:] != (src_ny, src_nx) :
         print ('ptab dimensions : ', ptab.shape[-2:])
@@ -156,9 +197,6 @@ def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset, Debug:bool=False # pylint: d
             f"Error in module: {__name__}, file: {__file__}, function: {rmp_remap.__name__}")
 
     if OPTIONS['Debug'] or Debug :
-        print ('grid sizes      : ', src_grid_size, dst_grid_size)
-        print ('num_links       : ', num_links)
-        print ('address sizes   : ', src_address.shape, dst_address.shape, remap_matrix.shape)
         print ('src dimensions  : ', src_ny, src_nx)
         print ('dst dimensions  : ', dst_ny, dst_nx)
 
@@ -190,28 +228,41 @@ def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset, Debug:bool=False # pylint: d
         dst_coords_2D.append (src_coords_2D[dim])
     dst_coords_2D = dst_coords_2D + [np.arange(dst_ny), np.arange(dst_nx)]
 
-    src_field_1D = ptab.stack (xy=src_dims_2D[-2:]).values
-    dst_field_1D = np.zeros (dst_shape_1D)
+    if lazy :
+        # Spatial dimensions should be in one chunk : blocks are split along
+        # the other dimensions only
+        ptab_chunked = ptab.chunk ({src_dims_2D[-2]:-1, src_dims_2D[-1]:-1})
+        dst_field_2D = xr.apply_ufunc (
+            _remap_block, ptab_chunked,
+            kwargs={'operator':rmp_op['operator'], 'dst_valid':rmp_op['dst_valid'],
+                    'dst_grid_dims':(dst_ny, dst_nx), 'sval':np.nan},
+            input_core_dims=[src_dims_2D[-2:]], output_core_dims=[['y_dst', 'x_dst']],
+            dask='parallelized', output_dtypes=[np.float64],
+            dask_gufunc_kwargs={'output_sizes':{'y_dst':dst_ny, 'x_dst':dst_nx}} )
+        dst_field_2D = xr.DataArray (dst_field_2D.data, dims=dst_dims_2D, coords=dst_coords_2D)
+
+    else :
+        src_field_1D = ptab.stack (xy=src_dims_2D[-2:]).values
 
-    ## Creates an array to mask destinations points with no value assigned by the interpolation
-    dst_mask_1D = np.full (dst_shape_1D, np.nan)
-
-    if OPTIONS['Debug'] or Debug :
-        print ("shape fields 1D : ", src_field_1D.shape, dst_field_1D.shape, dst_mask_1D.shape)
-        print ("shape fields 1D : ", np.prod(src_field_1D.shape),
-               np.prod(dst_field_1D.shape), np.prod(dst_mask_1D.shape) )
+        if OPTIONS['Debug'] or Debug :
+            print ("shape fields 1D : ", src_field_1D.shape, dst_shape_1D)
+            print ("shape fields 1D : ", np.prod(src_field_1D.shape), np.prod(dst_shape_1D) )
 
-    # Interpolate
-    dst_field_1D = remap ( src_field_1D, src_grid_size, dst_grid_size,
-                           num_links, src_address, dst_address,
-                           remap_matrix, sval = np.nan )
+        # Interpolate
+        if engine == 'sparse' :
+            dst_field_1D = remap_apply ( src_field_1D, rmp_op['operator'], rmp_op['dst_valid'],
+                                         sval=np.nan )
+        else :
+            dst_field_1D = remap ( src_field_1D, src_grid_size, dst_grid_size,
+                                   num_links, src_address, dst_address,
+                                   remap_matrix, sval = np.nan, engine=engine, Debug=Debug )
 
-    dst_field_2D = np.reshape   (dst_field_1D, dst_shape_2D)
-    dst_field_2D = xr.DataArray (dst_field_2D, dims=dst_dims_2D, coords=dst_coords_2D)
+        dst_field_2D = np.reshape   (dst_field_1D, dst_shape_2D)
+        dst_field_2D = xr.DataArray (dst_field_2D, dims=dst_dims_2D, coords=dst_coords_2D)
 
     # Set lon/lat values of the interpolate field
-    dst_lon_2D = np.reshape   (dst_lon.values, dst_shape_2D[-2:])
-    dst_lat_2D = np.reshape   (dst_lat.values, dst_shape_2D[-2:])
+    dst_lon_2D = np.reshape   (dst_lon, dst_shape_2D[-2:])
+    dst_lat_2D = np.reshape   (dst_lat, dst_shape_2D[-2:])
 
     dst_lon_2D = xr.DataArray (
         dst_lon_2D, dims=dst_dims_2D[-2:], coords=dst_coords_2D[-2:], name='longitude',
@@ -227,6 +278,94 @@ def rmp_remap (ptab:xr.DataArray, d_rmp:xr.Dataset, Debug:bool=False # pylint: d
     pop_stack ( "rmp_remap")
     return dst_field_2D, dst_lon_2D, dst_lat_2D
 
+def coupling_rmp_map (o2a_rmp:xr.Dataset|str|None=None,
+                      a2o_rmp:xr.Dataset|str|None=None) -> Dict[str, xr.Dataset|str] :
+    '''
+    Mapping of coupled variables to rmp files, built from the o2a and a2o tables
+
+    Inputs :
+      o2a_rmp : rmp file (or dataset) from ocean to atmosphere, for the variables of o2a
+      a2o_rmp : rmp file (or dataset) from atmosphere to ocean, for the variables of a2o
+    '''
+    rmp_map:Dict[str, xr.Dataset|str] = {}
+    if o2a_rmp is not None :
+        for ovar, _ in o2a :
+            rmp_map[ovar] = o2a_rmp
+    if a2o_rmp is not None :
+        for avar, _ in a2o :
+            rmp_map[avar] = a2o_rmp
+    return rmp_map
+
+def remap_fields (d_fields:xr.Dataset, rmp_map:Dict[str, xr.Dataset|str], # pylint: disable=too-many-locals
+                  rename:bool=False, cache:bool=True, lazy:bool|None=None,
+                  Debug:bool=False) -> Dict[str, xr.Dataset] :
+    '''
+    Remap several variables of a dataset, one pass per weight file
+
+    Inputs :
+      d_fields : a dataset of coupler fields (restart or output files)
+      rmp_map  : a dictionnary giving for each variable to remap the rmp file
+                 (or dataset). See coupling_rmp_map for the coupled variables.
+                 Variables of d_fields not in rmp_map are ignored
+      rename   : rename variables to the name on the other side of the
+                 coupler, using a2o_d and o2a_d
+      cache, lazy : see rmp_remap
+
+    Variables sharing the same rmp file and the same dimensions are stacked
+    along a temporary dimension and remapped by a single application of the operator.
+
+    Returns a dictionnary of datasets, one for each rmp file, holding the
+    remapped variables with longitude and latitude as coordinates
+    '''
+    push_stack ( f'remap_fields ( d_fields, rmp_map, {rename=}, {cache=}, {lazy=} )' )
+
+    # Group variables by weight file and dimensions
+    rmp_names:Dict[str, xr.Dataset|str] = {}
+    rmp_opened:List[xr.Dataset] = []
+    groups:Dict[Tuple[str, Tuple], List[str]] = {}
+    for var, rmp in rmp_map.items () :
+        if var not in d_fields :
+            continue
+        if isinstance (rmp, str) :
+            rmp_name = rmp
+        else :
+            rmp_name = rmp.encoding.get ('source', f'rmp_{id (rmp)}')
+        rmp_names[rmp_name] = rmp
+        groups.setdefault ((rmp_name, d_fields[var].dims), []).append (var)
+
+    d_out:Dict[str, xr.Dataset] = {}
+    for (rmp_name, dims), var_list in groups.items () :
+        if OPTIONS['Debug'] or Debug :
+            print ( f'remap_fields : {rmp_name} {dims} : {var_list}' )
+
+        rmp = rmp_names[rmp_name]
+        if isinstance (rmp, str) :
+            rmp = xr.open_dataset (rmp, decode_times=False)
+            rmp_names[rmp_name] = rmp
+            rmp_opened.append (rmp)
+
+        ptab = xr.concat ([d_fields[var] for var in var_list], dim='remap_var',
+                          coords='minimal', compat='override')
+        ptab = ptab.assign_coords (remap_var=var_list).transpose ('remap_var', *dims)
+
+        dst_field, dst_lon, dst_lat = rmp_remap (ptab, rmp, cache=cache, lazy=lazy, Debug=Debug)
+
+        if rmp_name not in d_out :
+            d_out[rmp_name] = xr.Dataset (coords={'longitude':dst_lon, 'latitude':dst_lat})
+
+        for var in var_list :
+            dst_var = dst_field.sel (remap_var=var, drop=True)
+            dst_var.attrs = d_fields[var].attrs.copy ()
+            if rename :
+                var = a2o_d.get (var, o2a_d.get (var, var))
+            d_out[rmp_name][var] = dst_var
+
+    for rmp in rmp_opened :
+        rmp.close ()
+
+    pop_stack ( 'remap_fields' )
+    return d_out
+
 def progress (percent=0, width=30) :
     '''Display a progress bar.'''
     left  = (width * percent) // 100
@@ -234,9 +373,221 @@ def progress (percent=0, width=30) :
     print ( '\r[', '#' * left, ' ' * right, f'] {percent:4d}%',
             sep='', end='', flush=True)
 
+## ============================================================================
+## Cache of compiled remapping operators
+##   In memory for the current session, and as .npz files in OPTIONS['CacheDir']
+##   (if set) for later sessions. The memory cache keeps the OPERATOR_CACHE_SIZE
+##   operators most recently used.
+OPERATOR_CACHE_SIZE:int = 16
+_OPERATOR_CACHE:OrderedDict[str, Dict[str, Any]] = OrderedDict ()
+
+def rmp_key (d_rmp:xr.Dataset) -> str|None :
+    '''
+    Hash key identifying a rmp file : its path, mtime, num_links and grid dims
+
+    Returns None if d_rmp is not backed by a file (no caching possible)
+    '''
+    rmp_file = d_rmp.encoding.get ('source', None)
+    if rmp_file is None or not os.path.isfile (rmp_file) :
+        return None
+
+    key = ( f'{os.path.abspath (rmp_file)}'
+            f':{os.stat (rmp_file).st_mtime_ns}'
+            f':{d_rmp.sizes ["num_links"]}'
+            f':{d_rmp.sizes ["src_grid_size"]}:{d_rmp.sizes ["dst_grid_size"]}'
+            f':{list (d_rmp ["src_grid_dims"].values)}:{list (d_rmp ["dst_grid_dims"].values)}' )
+
+    return hashlib.sha1 (key.encode ()).hexdigest ()
+
+def rmp_operator (d_rmp:xr.Dataset, cache:bool=True, Debug:bool=False) -> Dict[str, Any] :
+    '''
+    Compiled remapping operator of a rmp file, with the information
+    needed to build the destination field
+
+    Inputs :
+      d_rmp : an xarray dataset corresponding to a rmp file,
+          or the name of the rmp file
+      cache : look for the operator in the in-memory cache, then in
+          OPTIONS['CacheDir'], before building it from the links
+
+    Returns a dictionnary with keys :
+      operator  : scipy.sparse CSR matrix, see remap_operator
+      dst_valid : mask of destination points reached by the interpolation
+      dst_lon, dst_lat : numpy arrays of destination longitude and latitude
+      src_grid_dims, dst_grid_dims : (ny, nx) of source and destination grids
+    '''
+    if isinstance (d_rmp, str) :
+        with xr.open_dataset (d_rmp, decode_times=False) as z_rmp :
+            return rmp_operator (z_rmp, cache=cache, Debug=Debug)
+
+    push_stack ( f'rmp_operator ( d_rmp, {cache=} )' )
+
+    key = rmp_key (d_rmp) if cache else None
+    cache_file = None
+    if key and OPTIONS['CacheDir'] :
+        cache_file = os.path.join (OPTIONS['CacheDir'], f'rmp_{key}.npz')
+
+    rmp_op = None
+    if key in _OPERATOR_CACHE :
+        if OPTIONS['Debug'] or Debug :
+            print ( f'rmp_operator : {key} found in memory' )
+        rmp_op = _OPERATOR_CACHE[key]
+        _OPERATOR_CACHE.move_to_end (key)
+
+    elif cache_file and os.path.isfile (cache_file) :
+        if OPTIONS['Debug'] or Debug :
+            print ( f'rmp_operator : reading {cache_file}' )
+        with np.load (cache_file) as npz :
+            rmp_op = {
+                'operator'      : sparse.csr_matrix (
+                    (npz['data'], npz['indices'], npz['indptr']), shape=tuple (npz['shape']) ),
+                'dst_valid'     : npz['dst_valid'],
+                'dst_lon'       : npz['dst_lon'],
+                'dst_lat'       : npz['dst_lat'],
+                'src_grid_dims' : tuple (npz['src_grid_dims']),
+                'dst_grid_dims' : tuple (npz['dst_grid_dims']),
+                }
+
+    if rmp_op is None :
+        if OPTIONS['Debug'] or Debug :
+            print ( 'rmp_operator : building operator from links' )
+        # Address in rmp file are in Fortran convention : starting a 1
+        operator, dst_valid = remap_operator (
+            d_rmp['src_address'].values - 1, d_rmp['dst_address'].values - 1,
+            d_rmp['remap_matrix'][:,0].values,
+            d_rmp.sizes['src_grid_size'], d_rmp.sizes['dst_grid_size'] )
+        rmp_op = {
+            'operator'      : operator,
+            'dst_valid'     : dst_valid,
+            'dst_lon'       : d_rmp['dst_grid_center_lon'].values,
+            'dst_lat'       : d_rmp['dst_grid_center_lat'].values,
+            'src_grid_dims' : tuple (d_rmp['src_grid_dims'].values),
+            'dst_grid_dims' : tuple (d_rmp['dst_grid_dims'].values),
+            }
+
+        if cache_file :
+            os.makedirs (OPTIONS['CacheDir'], exist_ok=True)
+            # Write to a temporary file then rename, so that a concurrent
+            # session never reads a partial file
+            tmp_file = f'{cache_file[:-4]}.{os.getpid ()}.npz'
+            np.savez ( tmp_file,
+                       data=operator.data, indices=operator.indices,
+                       indptr=operator.indptr, shape=np.array (operator.shape),
+                       dst_valid=dst_valid,
+                       dst_lon=rmp_op['dst_lon'], dst_lat=rmp_op['dst_lat'],
+                       src_grid_dims=np.array (rmp_op['src_grid_dims']),
+                       dst_grid_dims=np.array (rmp_op['dst_grid_dims']) )
+            os.replace (tmp_file, cache_file)
+            if OPTIONS['Debug'] or Debug :
+                print ( f'rmp_operator : operator saved in {cache_file}' )
+
+    if key :
+        _OPERATOR_CACHE[key] = rmp_op
+        while len (_OPERATOR_CACHE) > OPERATOR_CACHE_SIZE :
+            _OPERATOR_CACHE.popitem (last=False)
+
+    pop_stack ( 'rmp_operator' )
+    return rmp_op
+
+def clear_operator_cache (disk:bool=False) -> None :
+    '''
+    Empty the in-memory cache of remapping operators.
+    With disk=True, also removes the cached files in OPTIONS['CacheDir']
+    '''
+    _OPERATOR_CACHE.clear ()
+    if disk and OPTIONS['CacheDir'] and os.path.isdir (OPTIONS['CacheDir']) :
+        for cache_file in os.listdir (OPTIONS['CacheDir']) :
+            if cache_file.startswith ('rmp_') and cache_file.endswith ('.npz') :
+                os.remove (os.path.join (OPTIONS['CacheDir'], cache_file))
+
+def remap_operator (src_address:np.ndarray, dst_address:np.ndarray, remap_matrix:np.ndarray,
+                    src_grid_size:int, dst_grid_size:int) -> Tuple[sparse.csr_matrix, np.ndarray] :
+    '''
+    Build the sparse remapping operator from the links of a rmp file
+
+    Inputs :
+      src_address   : address of source point for each link
+      dst_address   : address of destination point for each link
+      remap_matrix  : interpolation weights
+      src_grid_size : input grid size
+      dst_grid_size : output grid size
+
+      All addresses should be in python/C convention : starting at 0
+
+    Outputs :
+      operator  : scipy.sparse CSR matrix of shape (dst_grid_size, src_grid_size).
+                  Weights of duplicated links are summed.
+      dst_valid : boolean array of size dst_grid_size, True for destination
+                  points reached by at least one link
+    '''
+    push_stack ( f'remap_operator ( src_address, dst_address, remap_matrix, '
+                 f'{src_grid_size=}, {dst_grid_size=} )' )
+
+    operator = sparse.coo_matrix (
+        (np.asarray (remap_matrix, dtype=np.float64),
+         (np.asarray (dst_address), np.asarray (src_address))),
+        shape=(dst_grid_size, src_grid_size) ).tocsr ()
+
+    # A destination point is valid if its row holds at least one link
+    dst_valid = np.diff (operator.indptr) > 0
+
+    pop_stack ( 'remap_operator' )
+    return operator, dst_valid
+
+def remap_apply (src_field:np.ndarray, operator:sparse.csr_matrix, dst_valid:np.ndarray,
+                 sval:float=np.nan) -> np.ndarray :
+    '''
+    Apply a sparse remapping operator to a field
+
+    Inputs :
+      src_field : field to interpolate
+          ptab dimensions are [...., x]
+          x is the geographical positions
+      operator  : sparse operator, as given by remap_operator
+      dst_valid : mask of destination points reached by the interpolation
+      sval      : value of non reached point on the destination grid
+
+    All leading dimensions are flattened and remapped with one
+    sparse-dense product.
+    '''
+    push_stack ( f'remap_apply ( src_field, operator, dst_valid, {sval=} )' )
+
+    _, src_grid_size = operator.shape
+    src_shape = src_field.shape
+
+    if src_shape[-1] != src_grid_size :
+        raise ValueError ( f'remap_apply : last dimension of src_field {src_shape[-1]} '
+                           f'does not match operator source size {src_grid_size}' )
+
+    dst_field = _apply_operator (src_field, operator, dst_valid, sval)
+
+    pop_stack ( 'remap_apply' )
+    return dst_field
+
+def _apply_operator (src_field:np.ndarray, operator:sparse.csr_matrix, dst_valid:np.ndarray,
+                     sval:float=np.nan) -> np.ndarray :
+    '''
+    Core of remap_apply, without checks nor tracing : safe to call from dask workers
+    '''
+    dst_grid_size, src_grid_size = operator.shape
+    src_field_2D = np.reshape (src_field, (-1, src_grid_size))
+    dst_field_2D = np.asarray (operator @ src_field_2D.T).T
+
+    dst_field = np.reshape (dst_field_2D, (*src_field.shape[:-1], dst_grid_size))
+    return np.where (dst_valid, dst_field, sval)
+
+def _remap_block (src_block:np.ndarray, operator:sparse.csr_matrix, dst_valid:np.ndarray,
+                  dst_grid_dims:Tuple[int, int], sval:float=np.nan) -> np.ndarray :
+    '''
+    Remap one block [...., y, x] of a field. Used by rmp_remap in lazy mode
+    '''
+    src_field = np.reshape (src_block, (*src_block.shape[:-2], -1))
+    dst_field = _apply_operator (src_field, operator, dst_valid, sval)
+    return np.reshape (dst_field, (*src_block.shape[:-2], *dst_grid_dims))
+
 def remap (src_field, src_grid_size, dst_grid_size, # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
            num_links, src_address, dst_address,
-           remap_matrix, sval=np.nan, Debug=False) :
+           remap_matrix, sval=np.nan, engine:Literal['sparse', 'loop']='sparse', Debug=False) :
     '''
     Remap a field using interpolation weights and addresses
 
@@ -252,45 +603,59 @@ def remap (src_field, src_grid_size, dst_grid_size, # pylint: disable=too-many-a
       dst_address   : address of destination point for each link
       remap_matrix  : interpolation weights
       sval          : value of non reached point on te destiantion grid
+      engine        : 'sparse' (default) or 'loop'.
+          'loop' is the original link by link algorithm, only kept as a
+          reference to check the results of the sparse engine
 
       All addresses should be in python/C convention : starting at 0
 
     '''
     push_stack ( f'remap ( src_field, {src_grid_size=}, {dst_grid_size=},'
-                 f' {num_links=}, src_address, dst_address, remap_matrix, {sval=}' )
-    width=80
+                 f' {num_links=}, src_address, dst_address, remap_matrix, {sval=}, {engine=}' )
 
-    src_shape = src_field.shape
-    dst_shape = (*src_shape[:1], dst_grid_size)
+    if engine == 'sparse' :
+        operator, dst_valid = remap_operator (src_address[:num_links], dst_address[:num_links],
+                                              remap_matrix[:num_links],
+                                              src_grid_size, dst_grid_size)
+        dst_field = remap_apply (src_field, operator, dst_valid, sval=sval)
 
-    dst_field = np.zeros ( (dst_shape) )
-    dst_mask  = np.full  ( (dst_shape), np.nan)
+    elif engine == 'loop' :
+        width=80
 
-    if OPTIONS['Debug'] or Debug :
-        print ("\nStarting interpolation")
-    t_start = time.time ()
-    t_0     = t_start
+        src_shape = src_field.shape
+        dst_shape = (*src_shape[:-1], dst_grid_size)
+
+        dst_field = np.zeros ( (dst_shape) )
+        dst_mask  = np.full  ( (dst_shape), np.nan)
 
-    for link in range (num_links) :
         if OPTIONS['Debug'] or Debug :
-            if link%(num_links//100) == 0 :
-                t_1 = time.time ()
-                if t_1 > t_0 + 0.6 :
-                    progress (
-                        percent = np.minimum ( 100, int(link/num_links*100) ), width=width)
-                    t_0 = t_1
-        dst_mask  [..., dst_address [link]] = 1.0
-        dst_field [..., dst_address [link]] += \
-            remap_matrix[link] * src_field[..., src_address[link]]
-    t_end = time.time ()
-    if OPTIONS['Debug'] or Debug :
-        progress (percent=100, width=width)
+            print ("\nStarting interpolation")
+        t_start = time.time ()
+        t_0     = t_start
+
+        for link in range (num_links) :
+            if OPTIONS['Debug'] or Debug :
+                if link%max(1, num_links//100) == 0 :
+                    t_1 = time.time ()
+                    if t_1 > t_0 + 0.6 :
+                        progress (
+                            percent = np.minimum ( 100, int(link/num_links*100) ), width=width)
+                        t_0 = t_1
+            dst_mask  [..., dst_address [link]] = 1.0
+            dst_field [..., dst_address [link]] += \
+                remap_matrix[link] * src_field[..., src_address[link]]
+        t_end = time.time ()
+        if OPTIONS['Debug'] or Debug :
+            progress (percent=100, width=width)
 
-    if OPTIONS['Debug'] or Debug :
-        print (f"\nInterpolation time : {t_end-t_start:5.3f}s")
-        print (" ")
+        if OPTIONS['Debug'] or Debug :
+            print (f"\nInterpolation time : {t_end-t_start:5.3f}s")
+            print (" ")
 
-    dst_field = np.where (np.isnan(dst_mask), sval, dst_field)
+        dst_field = np.where (np.isnan(dst_mask), sval, dst_field)
+
+    else :
+        raise ValueError ( f'remap : unknown {engine=}. Should be sparse or loop' )
 
     pop_stack ( 'remap' )
     return dst_field
@@ -305,17 +670,104 @@ def sum_matrix (rmp) :
     '''
     push_stack ( 'sum_matrix (rmp)' )
 
-    src_sum_matrix = np.zeros ( (rmp.dims['src_grid_size'],) )
-    dst_sum_matrix = np.zeros ( (rmp.dims['dst_grid_size'],) )
-    for n in rmp['num_links'].values :
-        src_a = rmp['src_address'][n]
-        dst_a = rmp['dst_address'][n]
-        src_sum_matrix[src_a-1] += rmp['remap_matrix'][n]
-        dst_sum_matrix[dst_a-1] += rmp['remap_matrix'][n]
+    _, src_sum_matrix, _, dst_sum_matrix = compute_links (
+        rmp['remap_matrix'][:,0].values,
+        rmp['src_address'].values - 1, rmp['dst_address'].values - 1,
+        rmp.sizes['src_grid_size'], rmp.sizes['dst_grid_size'], rmp.sizes['num_links'] )
 
     pop_stack ( 'sum_matrix' )
     return src_sum_matrix, dst_sum_matrix
 
+def rmp_report (rmp:xr.Dataset|str, tolerance:float=1.0e-6, nsigma:float=5.0,
+                Debug:bool=False) -> Dict[str, Any] :
+    '''
+    Quality check of a rmp file
+
+    Inputs :
+      rmp       : an xarray dataset corresponding to a rmp file, or the name of the file
+      tolerance : allowed departure from 1 of the sum of weights on a destination point
+      nsigma    : a destination weight sum further than nsigma standard deviations
+                  from the mean is counted as an outlier
+
+    Returns a dictionnary with :
+      num_links, src_grid_size, dst_grid_size
+      dst_unreached      : number of destination points without link
+      dst_nonconservative: number of reached destination points with a sum of weights not equal to 1
+      src_orphans        : number of source points used by no link
+      dst_outliers       : number of destination points with an outlier sum of weights
+      weight_min, weight_max     : extreme link weights
+      dst_sum_min, dst_sum_max   : extreme sum of weights on reached destination points
+    '''
+    push_stack ( f'rmp_report ( rmp, {tolerance=}, {nsigma=} )' )
+
+    rmp_opened = isinstance (rmp, str)
+    if rmp_opened :
+        rmp_name = rmp
+        rmp      = xr.open_dataset (rmp, decode_times=False)
+    else :
+        rmp_name = rmp.encoding.get ('source', None)
+
+    remap_matrix = rmp['remap_matrix'][:,0].values
+    src_count, _, dst_count, dst_sum = compute_links (
+        remap_matrix, rmp['src_address'].values - 1, rmp['dst_address'].values - 1,
+        rmp.sizes['src_grid_size'], rmp.sizes['dst_grid_size'], rmp.sizes['num_links'] )
+
+    dst_reached = dst_count > 0
+    dst_sum_r   = dst_sum[dst_reached]
+
+    if dst_sum_r.size > 0 :
+        dst_mean = dst_sum_r.mean ()
+        dst_std  = dst_sum_r.std  ()
+        dst_outliers = int (np.count_nonzero (np.abs (dst_sum_r - dst_mean) > nsigma*dst_std)) \
+            if dst_std > 0 else 0
+        dst_sum_min, dst_sum_max = float (dst_sum_r.min ()), float (dst_sum_r.max ())
+    else :
+        dst_outliers, dst_sum_min, dst_sum_max = 0, np.nan, np.nan
+
+    report = {
+        'file'                : rmp_name,
+        'num_links'           : rmp.sizes['num_links'],
+        'src_grid_size'       : rmp.sizes['src_grid_size'],
+        'dst_grid_size'       : rmp.sizes['dst_grid_size'],
+        'dst_unreached'       : int (np.count_nonzero (~dst_reached)),
+        'dst_nonconservative' : int (np.count_nonzero (np.abs (dst_sum_r - 1.0) > tolerance)),
+        'src_orphans'         : int (np.count_nonzero (src_count == 0)),
+        'dst_outliers'        : dst_outliers,
+        'weight_min'          : float (remap_matrix.min ()) if remap_matrix.size > 0 else np.nan,
+        'weight_max'          : float (remap_matrix.max ()) if remap_matrix.size > 0 else np.nan,
+        'dst_sum_min'         : dst_sum_min,
+        'dst_sum_max'         : dst_sum_max,
+        }
+
+    # All needed values are read : close the file if opened here
+    if rmp_opened :
+        rmp.close ()
+
+    if OPTIONS['Debug'] or Debug :
+        for key, val in report.items () :
+            print ( f'{key:20s} : {val}' )
+
+    pop_stack ( 'rmp_report' )
+    return report
+
+def rmp_report_dir (directory:str, pattern:str='rmp_*.nc', tolerance:float=1.0e-6,
+                    nsigma:float=5.0, Debug:bool=False) -> Dict[str, Dict[str, Any]] :
+    '''
+    Quality check of all rmp files of a directory. See rmp_report
+
+    Returns a dictionnary of reports, with file names as keys
+    '''
+    push_stack ( f'rmp_report_dir ( {directory=}, {pattern=}, {tolerance=}, {nsigma=} )' )
+
+    reports = {}
+    for rmp_file in sorted (glob.glob (os.path.join (directory, pattern))) :
+        with xr.open_dataset (rmp_file, decode_times=False) as rmp :
+            reports[os.path.basename (rmp_file)] = rmp_report (
+                rmp, tolerance=tolerance, nsigma=nsigma, Debug=Debug)
+
+    pop_stack ( 'rmp_report_dir' )
+    return reports
+
 ## ============================================================================
 ##
 ##                               That's all folk's !!!
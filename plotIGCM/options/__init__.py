@@ -22,15 +22,22 @@ data loss, or any other consequences caused directly or indirectly by
 the usage of his software by incorrectly or partially configured
 personal. Be warned that the author himself may not respect the prerequisites.
 '''
-import time
-import copy
 from typing import Self, Any
 
+from options_base import Options
+from options_base import Tracer
+from options_base import profile_reset
+from options_base import profile_stats
+from options_base import profile_report
+from options_base import profile_events
+from options_base import profile_export
+
 ## ============================================================================
 DEFAULT_OPTIONS = {
     'Debug'                : False,
     'Trace'                : False,
     'Timing'               : None,
+    'TimingMemory'         : False,
     't0'                   : None,
     'Depth'                : 0,
     'Stack'                : [],
@@ -50,9 +57,11 @@ DEFAULT_OPTIONS = {
     'ThreddsPrefix'        : None,
     'IGCM_Catalog'         : None,
     'IGCM_Catalog_list'    : [ 'IGCM_catalog.json', ],
+    'CacheDir'             : None,
 }
 
-OPTIONS: dict[str, Any] = copy.deepcopy(DEFAULT_OPTIONS)
+## Call stack, depth and timers are context-local, see options_base.Options
+OPTIONS: Options = Options (DEFAULT_OPTIONS, __name__)
 
 class set_options : # pylint: disable=invalid-name
     '''
@@ -117,66 +126,12 @@ def return_stack() -> Any :
     '''
     return OPTIONS['Stack']
 
-def push_stack (string:str) -> None :
-    '''
-    Push a string onto the stack and handle tracing and timing.
-
-    Parameters
-    ----------
-    string : str
-        The function name or identifier to push onto the stack
-
-    See Also
-    --------
-    pop_stack, return_stack
-    '''
-    OPTIONS['Depth'] += 1
-    OPTIONS['Stack'].append (string)
-
-    if OPTIONS['Trace'] :
-        #print ( '  '*(OPTIONS['Depth']-1), f'-->{__name__}.{string}' )
-        print ( f"-->{OPTIONS['Stack']}" )
-    #
-    if OPTIONS['Timing'] :
-        if OPTIONS['t0'] :
-            OPTIONS['t0'].append (time.time())
-        else :
-            OPTIONS['t0'] = [time.time(),]
-
-def pop_stack (string:str) -> None :
-    '''
-    Pop a string from the stack and handle tracing and timing.
-
-    Parameters
-    ----------
-    string : str
-        The function name or identifier to pop from the stack
-
-    See Also
-    --------
-    push_stack, return_stack
-    '''
-    if OPTIONS['Timing'] :
-        dt = time.time() - OPTIONS['t0'][-1]
-        OPTIONS['t0'].pop()
-    else :
-        dt = None
-    if OPTIONS['Trace'] or dt :
-        if dt :
-            if dt < 1e-3 :
-                print ( '  '*(OPTIONS['Depth']-1),
-                        f'<--{__name__}.{string} : time: {dt*1e6:5.1f} micro s')
-            else :
-                if dt < 1 :
-                    print ( '  '*(OPTIONS['Depth']-1),
-                            f'<--{__name__}.{string} : time: {dt*1e3:5.1f} milli s')
-                else :
-                    print ( '  '*(OPTIONS['Depth']-1),
-                            f'<--{__name__}.{string} : time: {dt*1:5.1f} second')
-        else :
-            #print ( '  '*(OPTIONS['Depth']-1), f'<--{__name__}.{string}')
-            print ( f"<--{OPTIONS['Stack']}")
-    #
-    OPTIONS['Depth'] -= 1
-    OPTIONS['Stack'].pop ()
-    #
+## ============================================================================
+## Call stack and tracing decorator : options_base.Tracer. Timing goes to
+## the profiler of options_base (profile_report, profile_export, ...),
+## shared by all modules, so that call paths form a single call tree.
+_TRACER = Tracer (OPTIONS, __name__, trace_stack=True)
+push_stack      = _TRACER.push_stack
+pop_stack       = _TRACER.pop_stack
+traced          = _TRACER.traced
+trace_benchmark = _TRACER.benchmark
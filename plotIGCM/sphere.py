@@ -27,8 +27,7 @@ import numpy as np
 import xarray as xr
 
 from plotIGCM.options import OPTIONS
-from plotIGCM.options import push_stack
-from plotIGCM.options import pop_stack
+from plotIGCM.options import traced
 from plotIGCM.utils import validate_types
 
 
@@ -39,13 +38,13 @@ full_name = {'tos':{'standard_name':'sea_surface_temperature', 'Title':'Sea surf
      }
 
 @validate_types
+@traced
 def clo_lon (lon:xr.DataArray, lon0:float|xr.DataArray=0., rad:bool=False,
              deg:bool=True) -> xr.DataArray :
     '''
     Choose closest to lon0 longitude, adding/substacting 360.
     if needed
     '''
-    push_stack ( f'clo_lon (lon, {lon0=}, {rad=}, {deg=} )' )
     if rad and deg :
         raise RuntimeError ('Error in nemo.en2geo: rad and deg can not be both True')
     if rad :
@@ -62,10 +61,10 @@ def clo_lon (lon:xr.DataArray, lon0:float|xr.DataArray=0., rad:bool=False,
     if 'attrs' in dir(lon) and 'attrs' in dir(c_lon) :
         c_lon.attrs.update (lon.attrs)
 
-    pop_stack ( 'clo_lon' )
     return c_lon
 
 @validate_types
+@traced
 def geo2en (pxx:xr.DataArray, pyy:xr.DataArray, pzz:xr.DataArray,
     glam:xr.DataArray, gphi:xr.DataArray) -> tuple[xr.DataArray, xr.DataArray] :
     '''
@@ -75,7 +74,6 @@ def geo2en (pxx:xr.DataArray, pyy:xr.DataArray, pzz:xr.DataArray,
         pxx, pyy, pzz : components on the geocentric system
         glam, gphi : longitude and latitude of the points
     '''
-    push_stack ( 'geo2en (pxx, pyy, pzz, glam, gphi)' )
     gsinlon = np.sin (RAD*glam)
     gcoslon = np.cos (RAD*glam)
     gsinlat = np.sin (RAD*gphi)
@@ -84,7 +82,6 @@ def geo2en (pxx:xr.DataArray, pyy:xr.DataArray, pzz:xr.DataArray,
     pte = - pxx * gsinlon            + pyy * gcoslon
     ptn = - pxx * gcoslon * gsinlat  - pyy * gsinlon * gsinlat + pzz * gcoslat
 
-    pop_stack ( 'geo2en' )
     return pte, ptn
 
 @validate_types
@@ -104,13 +101,13 @@ def latlon2cart (lat_deg:np.ndarray|xr.DataArray|float, lon_deg:np.ndarray|xr.Da
     return x, y, z
 
 @validate_types
+@traced
 def distance (lat1:float|np.ndarray|xr.DataArray, lon1:float|np.ndarray|xr.DataArray,
               lat2:float|np.ndarray|xr.DataArray, lon2:float|np.ndarray|xr.DataArray,
               radius:float|xr.DataArray=1.0, Debug:bool=False) -> float|np.ndarray|xr.DataArray :
     '''
     Compute distance on the sphere
     '''
-    push_stack ( 'distance' )
     zlat1 = lat1.values if isinstance(lat1, xr.DataArray) else lat1
     zlon1 = lon1.values if isinstance(lon1, xr.DataArray) else lon1
     zlat2 = lat2.values if isinstance(lat2, xr.DataArray) else lat2
@@ -133,10 +130,10 @@ def distance (lat1:float|np.ndarray|xr.DataArray, lon1:float|np.ndarray|xr.DataA
     if isinstance(lat1, xr.DataArray) :
         zdistance = xr.DataArray (zdistance, dims=lat1.dims, coords=lat1.coords)
 
-    pop_stack ('distance')
     return zdistance
 
 @validate_types
+@traced
 def aire_triangle (lat0: float|np.ndarray|xr.DataArray, lon0: float|np.ndarray|xr.DataArray,
                    lat1: float|np.ndarray|xr.DataArray, lon1: float|np.ndarray|xr.DataArray,
                    lat2: float|np.ndarray|xr.DataArray, lon2: float|np.ndarray|xr.DataArray,
@@ -146,7 +143,6 @@ def aire_triangle (lat0: float|np.ndarray|xr.DataArray, lon0: float|np.ndarray|x
     Area of a triangle on the sphere
     Girard's formula
     '''
-    push_stack ('aire_triangle')
 
     zlat0 = lat0.values if isinstance(lat0, xr.DataArray) else lat0
     zlon0 = lon0.values if isinstance(lon0, xr.DataArray) else lon0
@@ -181,10 +177,10 @@ def aire_triangle (lat0: float|np.ndarray|xr.DataArray, lon0: float|np.ndarray|x
     if isinstance(lat1, xr.DataArray) :
         Saire = xr.DataArray (Saire, dims=lat1.dims, coords=lat1.coords)
 
-    pop_stack ('aire_triangle')
     return Saire
 
 @validate_types
+@traced
 def aire_quadri (lat0:float|np.ndarray|xr.DataArray, lon0:float|np.ndarray|xr.DataArray,
                  lat1:float|np.ndarray|xr.DataArray, lon1:float|np.ndarray|xr.DataArray,
                  lat2:float|np.ndarray|xr.DataArray, lon2:float|np.ndarray|xr.DataArray,
@@ -194,14 +190,13 @@ def aire_quadri (lat0:float|np.ndarray|xr.DataArray, lon0:float|np.ndarray|xr.Da
     Area of a quadrilatere on the sphere
     Girard's formula
     '''
-    push_stack ('aire_quadri')
     Saire = aire_triangle (lat0, lon0, lat1, lon1, lat2, lon2, radius ) \
          + aire_triangle (lat2, lon2, lat3, lon3, lat0, lon0, radius )
 
-    pop_stack ( 'aire_quadri')
     return Saire
 
 @validate_types
+@traced
 def angle (latA:float|np.ndarray|xr.DataArray, lonA:float|np.ndarray|xr.DataArray,
            latB:float|np.ndarray|xr.DataArray, lonB:float|np.ndarray|xr.DataArray,
            latC:float|np.ndarray|xr.DataArray, lonC:float|np.ndarray|xr.DataArray,
@@ -209,7 +204,6 @@ def angle (latA:float|np.ndarray|xr.DataArray, lonA:float|np.ndarray|xr.DataArra
     '''
     Angle between AB and AC
     '''
-    push_stack ('angle')
 
     zlatA = latA.values if isinstance(latA, xr.DataArray) else latA
     zlonA = lonA.values if isinstance(lonA, xr.DataArray) else lonA
@@ -232,10 +226,10 @@ def angle (latA:float|np.ndarray|xr.DataArray, lonA:float|np.ndarray|xr.DataArra
     if isinstance (latA, xr.DataArray) :
         zA = xr.DataArray (zA, dims=latA.dims, coords=latA.coords)
 
-    pop_stack ('angle')
     return zA
 
 @validate_types
+@traced
 def somme_4angles (lat0:float|np.ndarray|xr.DataArray, lon0:float|np.ndarray|xr.DataArray,
                    latA:float|np.ndarray|xr.DataArray, lonA:float|np.ndarray|xr.DataArray,
                    latB:float|np.ndarray|xr.DataArray, lonB:float|np.ndarray|xr.DataArray,
@@ -249,7 +243,6 @@ def somme_4angles (lat0:float|np.ndarray|xr.DataArray, lon0:float|np.ndarray|xr.
            (slightly less on the sphere)
            if 0 is outside, it is close to 0.
     '''
-    push_stack ( 'somme_4angles')
     zA = angle (lat0, lon0, latA, lonA, latB, lonB)
     zB = angle (lat0, lon0, latB, lonB, latC, lonC)
     zC = angle (lat0, lon0, latC, lonC, latD, lonD)
@@ -257,10 +250,10 @@ def somme_4angles (lat0:float|np.ndarray|xr.DataArray, lon0:float|np.ndarray|xr.
 
     zz = zA + zB + zC + zD
 
-    pop_stack ('somme_4angles')
     return zz
 
 @validate_types
+@traced
 def en2geo (pte:xr.DataArray, ptn:xr.DataArray, glam:xr.DataArray, gphi:xr.DataArray
             ) -> tuple[xr.DataArray, xr.DataArray, xr.DataArray] :
     '''
@@ -270,7 +263,6 @@ def en2geo (pte:xr.DataArray, ptn:xr.DataArray, glam:xr.DataArray, gphi:xr.DataA
         pte, ptn   : eastward/northward components
         glam, gphi : longitude and latitude of the points
     '''
-    push_stack ( 'en2geo ( pte, ptn, glam, gphi )' )
 
     gsinlon = np.sin (RAD*glam)
     gcoslon = np.cos (RAD*glam)
@@ -281,7 +273,6 @@ def en2geo (pte:xr.DataArray, ptn:xr.DataArray, glam:xr.DataArray, gphi:xr.DataA
     pyy =   pte * gcoslon - ptn * gsinlon * gsinlat
     pzz =   ptn * gcoslat
 
-    pop_stack ( 'en2geo' )
     return pxx, pyy, pzz
 
 @validate_types
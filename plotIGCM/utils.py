@@ -23,6 +23,8 @@ the usage of his software by incorrectly or partially configured
 personal. Be warned that the author himself may not respect the prerequisites.
 '''
 import os
+import inspect
+import functools
 from typing import (Callable, Any, Self, Literal,
                     _LiteralGenericAlias # pyright: ignore[reportAttributeAccessIssue]
                     )
@@ -130,34 +132,75 @@ def add_year (ptime:xr.DataArray, year_shift:int=0, Debug=False) -> xr.DataArray
 
     return time_counter
 
+def _is_testable (ptype:Any) -> bool :
+    '''
+    True if an annotation can be checked with isinstance
+    (Any, Self, Literal, strings and subscripted generics can not)
+    '''
+    if ptype in (Any, Self, Literal) or isinstance (ptype, _LiteralGenericAlias) :
+        return False
+    try :
+        isinstance (None, ptype)
+    except TypeError :
+        return False
+    return True
+
+def _type_checks (func:Callable) -> tuple[list, dict, Any] :
+    '''
+    Precompute the checks of validate_types from the signature of func
+
+    Returns
+      positional checks : list of (position, name, type)
+      keyword checks    : dictionary name : type
+      return type       : type, or None if not checked
+    '''
+    zannot = func.__annotations__
+    zpos_checks = []
+    zkey_checks = {}
+    for zpos, (zname, zpar) in enumerate (inspect.signature (func).parameters.items ()) :
+        ztype = zannot.get (zname, Any)
+        if not _is_testable (ztype) :
+            continue
+        zkey_checks[zname] = ztype
+        if zpar.kind in (zpar.POSITIONAL_ONLY, zpar.POSITIONAL_OR_KEYWORD) :
+            zpos_checks.append ((zpos, zname, ztype))
+    zreturn = zannot.get ('return', None)
+    if not zreturn or not _is_testable (zreturn) :
+        zreturn = None
+    return zpos_checks, zkey_checks, zreturn
+
 def validate_types (func: Callable) -> Callable :
     '''
-    Decorator to check arguments and return types of a function deduced from annotations
+    Decorator to check arguments types of a function deduced from annotations
+
+    OPTIONS['Check'] is read at each call, so checks can be switched on or
+    off at run time. When it is False, the wrapper only calls the function.
+    Checks are computed from the signature at the first checked call. The
+    wrapper keeps the function metadata (functools.wraps), so decorated
+    functions can be pickled.
     '''
+    zchecks: list[tuple] = []
+
+    @functools.wraps (func)
     def wrapper (*args: Any, **kwargs: Any) -> Any :
-        if OPTIONS['Check'] :
-            ## Validate arguments
-            for (name, param_type), value in zip (func.__annotations__.items (), args) :
-                if param_type not in [Any, Self, Literal, _LiteralGenericAlias] :
-                    if not param_type in [Any,] and not isinstance (value, param_type) :
-                        raise TypeError (
-                            f"Argument {name} should be of type {param_type}, got {type(value)}")
-                if OPTIONS['Debug'] :
-                    print ( '==')
-
-            for key, value in kwargs.items () :
-                param_type = func.__annotations__.get (key, Any)
-                if isinstance(param_type, _LiteralGenericAlias) :
-                    if OPTIONS['Debug'] :
-                        print ( f"kwarg non testable : {param_type = }")
-                else :
-                    if not param_type in  [Any,] and not isinstance (value, param_type) :
-                        raise TypeError (
-                            f"k-Argument '{key}' should be of type {param_type}, got {type(value)}")
-
-        ## Validate return type
-        result = func (*args, **kwargs)
-        return result
+        if not OPTIONS['Check'] :
+            return func (*args, **kwargs)
+        if not zchecks :
+            zchecks.append (_type_checks (func))
+        zpos_checks, zkey_checks, _ = zchecks[0]
+
+        ## Validate arguments
+        for zpos, name, param_type in zpos_checks :
+            if zpos < len (args) and not isinstance (args[zpos], param_type) :
+                raise TypeError (
+                    f"Argument {name} should be of type {param_type}, got {type(args[zpos])}")
+        for key, value in kwargs.items () :
+            param_type = zkey_checks.get (key)
+            if param_type is not None and not isinstance (value, param_type) :
+                raise TypeError (
+                    f"k-Argument '{key}' should be of type {param_type}, got {type(value)}")
+
+        return func (*args, **kwargs)
     return wrapper
 
 def copy_attrs (ptab:xr.DataArray, pref:xr.DataArray, Debug:bool=False) -> xr.DataArray :
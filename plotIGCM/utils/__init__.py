@@ -22,7 +22,8 @@ the usage of his software by incorrectly or partially configured
 personal. Be warned that the author himself may not respect the prerequisites.                                                               
 '''
 from typing import Callable, Any, Self, Literal, _LiteralGenericAlias
-import typing
+import inspect
+import functools
 from urllib.request import urlretrieve
 from pathlib import Path
     
@@ -87,50 +88,78 @@ def join_series (ptab1, ptab2, dim='time_counter', Debug=False) :
     ptab3 =  xr.concat ( [ ptab1.sel( {dim:slice(T1,T2)} ), ptab2.sel ( {dim:slice(T3,T4)} ) ], dim=dim )
     return ptab3
 
+def _is_testable (ptype:Any) -> bool :
+    '''
+    True if an annotation can be checked with isinstance
+    (Any, Self, Literal, strings and subscripted generics can not)
+    '''
+    if ptype in (Any, Self, Literal) or isinstance (ptype, _LiteralGenericAlias) :
+        return False
+    try :
+        isinstance (None, ptype)
+    except TypeError :
+        return False
+    return True
+
+def _type_checks (func:Callable) -> tuple[list, dict, Any] :
+    '''
+    Precompute the checks of validate_types from the signature of func
+
+    Returns
+      positional checks : list of (position, name, type)
+      keyword checks    : dictionary name : type
+      return type       : type, or None if not checked
+    '''
+    zannot = func.__annotations__
+    zpos_checks = []
+    zkey_checks = {}
+    for zpos, (zname, zpar) in enumerate (inspect.signature (func).parameters.items ()) :
+        ztype = zannot.get (zname, Any)
+        if not _is_testable (ztype) :
+            continue
+        zkey_checks[zname] = ztype
+        if zpar.kind in (zpar.POSITIONAL_ONLY, zpar.POSITIONAL_OR_KEYWORD) :
+            zpos_checks.append ((zpos, zname, ztype))
+    zreturn = zannot.get ('return', None)
+    if not zreturn or not _is_testable (zreturn) :
+        zreturn = None
+    return zpos_checks, zkey_checks, zreturn
+
 def validate_types (func: Callable) -> Callable :
     '''
     Decorator to check arguments and return types of a function deduced from annotations
+
+    Check and OPTIONS['Check'] are read at each call, so checks can be
+    switched on or off at run time. When both are False, the wrapper only
+    calls the function. Checks are computed from the signature at the first
+    checked call. The wrapper keeps the function metadata (functools.wraps),
+    so decorated functions can be pickled.
     '''
+    zchecks: list[tuple] = []
+
+    @functools.wraps (func)
     def wrapper (*args: Any, **kwargs: Any) -> Any :
-        if Check :
-            ## Validate arguments
-            for (name, param_type), value in zip (func.__annotations__.items (), args) :
-                if Debug :
-                    print ( 'arg --')
-                    print ( f'{name=}, {param_type=}, {value=}, {type(value)=}' )
-                    print ( f'{param_type in [Literal,] =}' )
-                if param_type not in [Any, Self, Literal, _LiteralGenericAlias] :
-                    if Debug :
-                        print ( 'Checking arg' )
-                    if not param_type in [Any,] and not isinstance (value, param_type) :
-                       raise TypeError (f"Argument {name} should be of type {param_type}, got {type(value)}")
-                if Debug :
-                    print ( '==')
-
-            for key, value in kwargs.items () :
-                param_type = func.__annotations__.get (key, Any)
-                if Debug :
-                    print ( 'kwarg --')
-                    print ( f"{key}, {param_type=}, {value=}, {type(value)=} {type(param_type)=}" )
-                if type(param_type) == typing._LiteralGenericAlias :
-                    if Debug :
-                        print ( f"kwarg non testable : {param_type = }")
-                else : 
-                    if Debug :
-                        print ( 'Checking kwarg' )
-                    if not param_type in  [Any,] and not isinstance (value, param_type) :
-                        raise TypeError (f"k-Argument '{key}' should be of type {param_type}, got {type(value)}")
+        if not (Check or OPTIONS['Check']) :
+            return func (*args, **kwargs)
+        if not zchecks :
+            zchecks.append (_type_checks (func))
+        zpos_checks, zkey_checks, zreturn = zchecks[0]
+
+        ## Validate arguments
+        for zpos, name, param_type in zpos_checks :
+            if zpos < len (args) and not isinstance (args[zpos], param_type) :
+                raise TypeError (
+                    f"Argument {name} should be of type {param_type}, got {type(args[zpos])}")
+        for key, value in kwargs.items () :
+            param_type = zkey_checks.get (key)
+            if param_type is not None and not isinstance (value, param_type) :
+                raise TypeError (
+                    f"k-Argument '{key}' should be of type {param_type}, got {type(value)}")
 
         ## Validate return type
         result = func (*args, **kwargs)
-        if Check :
-            return_type = func.__annotations__.get("return", Any)
-            if Debug :
-                print ( 'return --')
-                print ( f"{return_type=}, {result=}, {type(result)=} {type(return_type)=}" )
-            if return_type and return_type not in  [Any,] and not isinstance (result, return_type):
-                raise TypeError (f"Return value should be of type {return_type}, got {type(result)}")
-
+        if zreturn is not None and not isinstance (result, zreturn) :
+            raise TypeError (f"Return value should be of type {zreturn}, got {type(result)}")
         return result
     return wrapper
 